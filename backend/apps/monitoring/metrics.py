@@ -1,11 +1,20 @@
+import json
+import time
 import psutil
+import redis
 from apps.tasks_app.models import Task
+from apps.tasks_app.utils import get_redis_connection
+from apps.tasks_app.worker_runtime import get_worker_runtime_states
 from django.utils import timezone
 from datetime import timedelta
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models import Count, Q
 import socket
 
+MONITORING_SNAPSHOT_KEY = "lu:monitoring:snapshot"
+MONITORING_SERIES_KEY = "lu:monitoring:series"
+
 def get_system_metrics():
     cpu_percent = psutil.cpu_percent(interval=None)
     memory = psutil.virtual_memory()
@@ -23,25 +32,110 @@ def get_system_metrics():
     }
 
 def get_task_metrics():
-    active_tasks = Task.objects.filter(status__in=[Task.Status.RUNNING, Task.Status.QUEUED]).count()
-    completed_last_24h = Task.objects.filter(
-        status=Task.Status.COMPLETED,
-        completed_at__gte=timezone.now() - timedelta(days=1)
-    ).count()
-    failed_last_24h = Task.objects.filter(
-        status=Task.Status.FAILED,
-        completed_at__gte=timezone.now() - timedelta(days=1)
-    ).count()
-
-    return {
-        "active_tasks": active_tasks,
-        "completed_last_24h": completed_last_24h,
-        "failed_last_24h": failed_last_24h,
-    }
+    since = timezone.now() - timedelta(days=1)
+    return Task.objects.aggregate(
+        active_tasks=Count('id', filter=Q(status__in=[Task.Status.RUNNING, Task.Status.QUEUED])),
+        completed_last_24h=Count('id', filter=Q(status=Task.Status.COMPLETED, completed_at__gte=since)),
+        failed_last_24h=Count('id', filter=Q(status=Task.Status.FAILED, completed_at__gte=since)),
+    )
     
 def get_user_metrics():
     User = get_user_model()
     total_users = User.objects.count()
     return {
         "total_users": total_users,
-    }
\ No newline at end of file
+    }
+
+def get_task_status_counts():
+    counts = dict(Task.objects.values_list('status').annotate(total=Count('id')).order_by())
+    return {status: counts.get(status, 0) for status in Task.Status.values}
+
+def get_worker_runtime_metrics():
+    try:
+        states = get_worker_runtime_states()
+    except Exception as e:
+        print(f"Error reading worker runtime states: {e}")
+        return {"ready_processes": 0, "processes": []}
+    ready = [state for state in states if state.get("ready") == "1"]
+    return {
+        "ready_processes": len(ready),
+        "processes": sorted(states, key=lambda state: state["worker"]),
+    }
+
+def get_queue_depths():
+    queues = {settings.CELERY_TASK_DEFAULT_QUEUE, *settings.SOLVE_QUEUE_LIMITS}
+    queues.update(route['queue'] for route in settings.CELERY_TASK_ROUTES.values())
+    broker = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+    pipe = broker.pipeline(transaction=False)
+    for queue in sorted(queues):
+        pipe.llen(queue)
+    return dict(zip(sorted(queues), pipe.execute()))
+
+def get_cluster_system_metrics(processes):
+    """Зводить CPU/RAM хостів воркерів з їхніх heartbeat (останнє значення на хост)."""
+    hosts = {}
+    for state in processes:
+        if 'host' in state:
+            hosts[state['host']] = state
+    if not hosts:
+        return get_system_metrics()
+    ram_total_mb = sum(float(h.get('host_ram_total_mb', 0)) for h in hosts.values())
+    ram_used_mb = sum(float(h.get('host_ram_used_mb', 0)) for h in hosts.values())
+    return {
+        "hostname": ", ".join(sorted(hosts)),
+        "hosts": len(hosts),
+        "cpu_percent": sum(float(h.get('host_cpu_percent', 0)) for h in hosts.values()) / len(hosts),
+        "ram_total_mb": ram_total_mb,
+        "ram_used_mb": ram_used_mb,
+        "ram_percent": ram_used_mb / ram_total_mb * 100 if ram_total_mb else 0.0,
+    }
+
+def build_monitoring_snapshot():
+    runtime = get_worker_runtime_metrics()
+    try:
+        queue_depths = get_queue_depths()
+    except Exception as e:
+        print(f"Error reading queue depths: {e}")
+        queue_depths = {}
+    return {
+        "collected_at": time.time(),
+        "system": get_cluster_system_metrics(runtime["processes"]),
+        "tasks": {**get_task_metrics(), "by_status": get_task_status_counts()},
+        "users": get_user_metrics(),
+        "queues": queue_depths,
+        "workers": {
+            "count": len({state.get('host', state['worker'].split(':')[0]) for state in runtime["processes"]}),
+            "max_replicas": settings.MAX_WORKER_REPLICAS,
+            "runtime": runtime,
+        },
+    }
+
+def store_monitoring_snapshot(snapshot):
+    point = {
+        "ts": snapshot["collected_at"],
+        "cpu_percent": snapshot["system"]["cpu_percent"],
+        "ram_percent": snapshot["system"]["ram_percent"],
+        "active_tasks": snapshot["tasks"]["active_tasks"],
+        "workers": snapshot["workers"]["count"],
+        "queued": sum(snapshot["queues"].values()),
+    }
+    r = get_redis_connection()
+    pipe = r.pipeline()
+    pipe.set(MONITORING_SNAPSHOT_KEY, json.dumps(snapshot), ex=settings.MONITORING_SNAPSHOT_TTL)
+    pipe.rpush(MONITORING_SERIES_KEY, json.dumps(point))
+    pipe.ltrim(MONITORING_SERIES_KEY, -settings.MONITORING_SERIES_LENGTH, -1)
+    pipe.execute()
+
+def load_monitoring_snapshot(with_series=False):
+    r = get_redis_connection()
+    pipe = r.pipeline(transaction=False)
+    pipe.get(MONITORING_SNAPSHOT_KEY)
+    if with_series:
+        pipe.lrange(MONITORING_SERIES_KEY, 0, -1)
+    results = pipe.execute()
+    if not results[0]:
+        return None
+    snapshot = json.loads(results[0])
+    if with_series:
+        snapshot["series"] = [json.loads(point) for point in results[1]]
+    return snapshot
\ No newline at end of file
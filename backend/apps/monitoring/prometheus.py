@@ -0,0 +1,135 @@
+import logging
+import threading
+import time
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+METRIC_KEY_PREFIX = "lu:prom:"
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+GFLOPS_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100)
+SIZE_BUCKETS = (100, 500, 1000, 2000, 5000)
+
+HISTOGRAMS = {
+    "lu_parse_seconds": ("Parse time of task input data.", DURATION_BUCKETS),
+    "lu_factorization_seconds": ("Matrix factorization time.", DURATION_BUCKETS),
+    "lu_solve_seconds": ("Triangular solve time after factorization.", DURATION_BUCKETS),
+    "lu_queue_wait_seconds": ("Time between QUEUED and RUNNING.", DURATION_BUCKETS),
+    "lu_progress_publish_seconds": ("Latency of a single progress/WebSocket publish.", DURATION_BUCKETS),
+    "lu_task_db_seconds": ("Database time spent per task execution.", DURATION_BUCKETS),
+    "lu_task_gflops": ("Achieved factorization GFLOP/s per task.", GFLOPS_BUCKETS),
+}
+
+_local = threading.local()
+
+
+def size_bucket(n):
+    if n is None:
+        return "unknown"
+    for limit in SIZE_BUCKETS:
+        if n <= limit:
+            return f"le{limit}"
+    return f"gt{SIZE_BUCKETS[-1]}"
+
+
+# Кількість операцій розкладу — множник при n³.
+FACTORIZATION_FLOP_FACTORS = {"lu": 2.0 / 3.0, "cholesky": 1.0 / 3.0}
+
+
+def factorization_gflops(n, seconds, method="lu"):
+    if not n or seconds <= 0:
+        return 0.0
+    return FACTORIZATION_FLOP_FACTORS[method] * n ** 3 / seconds / 1e9
+
+
+def _format_labels(labels):
+    return ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+
+
+def _bucket_label(value, buckets):
+    for bound in buckets:
+        if value <= bound:
+            return str(bound)
+    return "+Inf"
+
+
+def record_observations(observations, labels):
+    """Одним pipeline додає спостереження до гістограм у Redis (спільних для всіх воркерів)."""
+    if not observations:
+        return
+    from apps.tasks_app.utils import get_redis_connection
+    label_str = _format_labels(labels)
+    pipe = get_redis_connection().pipeline(transaction=False)
+    for name, value in observations:
+        key = METRIC_KEY_PREFIX + name
+        pipe.hincrby(key, f"{label_str}|{_bucket_label(value, HISTOGRAMS[name][1])}", 1)
+        pipe.hincrbyfloat(key, f"{label_str}|sum", value)
+        pipe.hincrby(key, f"{label_str}|count", 1)
+    try:
+        pipe.execute()
+    except Exception as e:
+        logger.warning("Could not record metrics: %s", e)
+
+
+class TaskMetrics:
+    """Накопичує метрики однієї задачі в пам'яті воркера й скидає їх у Redis один раз наприкінці."""
+
+    def __init__(self, engine="lu", matrix_size=None):
+        self.labels = {"engine": engine, "size": size_bucket(matrix_size)}
+        self.db_seconds = 0.0
+        self._observations = []
+
+    def observe(self, name, value):
+        self._observations.append((name, float(value)))
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+
+    def start(self):
+        _local.current = self
+        connection.execute_wrappers.append(self.db_wrapper)
+        return self
+
+    def finish(self):
+        if self.db_wrapper in connection.execute_wrappers:
+            connection.execute_wrappers.remove(self.db_wrapper)
+        if getattr(_local, "current", None) is self:
+            _local.current = None
+        self.observe("lu_task_db_seconds", self.db_seconds)
+        record_observations(self._observations, self.labels)
+        self._observations = []
+
+
+def observe_current(name, value):
+    current = getattr(_local, "current", None)
+    if current is not None:
+        current.observe(name, value)
+
+
+def render_histograms():
+    from apps.tasks_app.utils import get_redis_connection
+    r = get_redis_connection()
+    pipe = r.pipeline(transaction=False)
+    for name in HISTOGRAMS:
+        pipe.hgetall(METRIC_KEY_PREFIX + name)
+    lines = []
+    for (name, (help_text, buckets)), data in zip(HISTOGRAMS.items(), pipe.execute()):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        series = {}
+        for field, value in data.items():
+            label_str, part = field.decode().rsplit("|", 1)
+            series.setdefault(label_str, {})[part] = float(value)
+        for label_str, values in sorted(series.items()):
+            cumulative = 0
+            for bound in [*map(str, buckets), "+Inf"]:
+                cumulative += values.get(bound, 0)
+                lines.append(f'{name}_bucket{{{label_str},le="{bound}"}} {int(cumulative)}')
+            lines.append(f"{name}_sum{{{label_str}}} {values.get('sum', 0.0)}")
+            lines.append(f"{name}_count{{{label_str}}} {int(values.get('count', 0))}")
+    return lines
@@ -0,0 +1,11 @@
+from celery import shared_task
+
+from .metrics import build_monitoring_snapshot, store_monitoring_snapshot
+
+
+@shared_task(ignore_result=True)
+def collect_monitoring_snapshot():
+    try:
+        store_monitoring_snapshot(build_monitoring_snapshot())
+    except Exception as e:
+        print(f"Error collecting monitoring snapshot: {e}")
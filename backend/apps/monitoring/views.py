@@ -3,37 +3,76 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser
 from django.conf import settings 
 from rest_framework import generics
-from .metrics import get_system_metrics, get_task_metrics, get_user_metrics
+from django.http import HttpResponse
+from django.views import View
+from .metrics import (
+    get_worker_runtime_metrics, get_task_status_counts,
+    build_monitoring_snapshot, store_monitoring_snapshot, load_monitoring_snapshot
+)
+from .prometheus import render_histograms
 from apps.tasks_app.models import Task 
 from apps.tasks_app.serializers import TaskListSerializer
-from config.celery import app as celery_app
-import socket 
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 class MonitoringMetricsView(APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request, *args, **kwargs):
-        system_metrics = get_system_metrics() 
-        task_metrics = get_task_metrics()
-        user_metrics = get_user_metrics()
-        active_workers_count = 0
+        # Знімок збирає periodic-задача collect_monitoring_snapshot; тут лише читаємо його з Redis.
+        with_series = request.query_params.get('series') in ('1', 'true')
         try:
-            inspector = celery_app.control.inspect()
-            ping_result = inspector.ping()
-            if ping_result:
-                active_workers_count = len(ping_result)
+            snapshot = load_monitoring_snapshot(with_series=with_series)
         except Exception as e:
-            print(f"Помилка отримання кількості воркерів Celery: {e}")
-            active_workers_count = 0
-        return Response({
-            "system": system_metrics,
-            "tasks": task_metrics,
-            "users": user_metrics,
-            "workers": {
-                "count": active_workers_count,
-                "max_replicas": settings.MAX_WORKER_REPLICAS,
-            }
-        })
+            print(f"Error loading monitoring snapshot: {e}")
+            snapshot = None
+        if snapshot is None:
+            snapshot = build_monitoring_snapshot()
+            try:
+                store_monitoring_snapshot(snapshot)
+            except Exception as e:
+                print(f"Error storing monitoring snapshot: {e}")
+            if with_series:
+                snapshot["series"] = []
+        snapshot["age_sec"] = round(time.time() - snapshot["collected_at"], 1)
+        return Response(snapshot)
+
+class PrometheusMetricsView(View):
+    def get(self, request, *args, **kwargs):
+        token = settings.PROMETHEUS_METRICS_TOKEN
+        if not token:
+            # Без токена метрики віддаються лише в режимі розробки.
+            if not settings.DEBUG:
+                logger.warning("Refusing to serve /metrics: PROMETHEUS_METRICS_TOKEN is not set.")
+                return HttpResponse(status=403)
+        elif request.headers.get('Authorization') != f"Bearer {token}":
+            return HttpResponse(status=401)
+        lines = []
+        try:
+            lines += render_histograms()
+        except Exception:
+            logger.exception("Error rendering metric histograms")
+        try:
+            snapshot = load_monitoring_snapshot()
+        except Exception:
+            logger.exception("Error loading monitoring snapshot")
+            snapshot = None
+        if snapshot:
+            status_counts, runtime, queues = snapshot["tasks"]["by_status"], snapshot["workers"]["runtime"], snapshot["queues"]
+        else:
+            status_counts, runtime, queues = get_task_status_counts(), get_worker_runtime_metrics(), {}
+        lines += ["# HELP lu_tasks Number of tasks by status.", "# TYPE lu_tasks gauge"]
+        for task_status, count in status_counts.items():
+            lines.append(f'lu_tasks{{status="{task_status}"}} {count}')
+        lines += ["# HELP lu_worker_processes_ready Warm worker processes reporting readiness.", "# TYPE lu_worker_processes_ready gauge"]
+        lines.append(f"lu_worker_processes_ready {runtime['ready_processes']}")
+        if queues:
+            lines += ["# HELP lu_queue_depth Messages waiting in a Celery queue.", "# TYPE lu_queue_depth gauge"]
+            for queue_name, depth in sorted(queues.items()):
+                lines.append(f'lu_queue_depth{{queue="{queue_name}"}} {depth}')
+        return HttpResponse("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4; charset=utf-8")
 
 class AdminTaskListView(generics.ListAPIView):
     permission_classes = [IsAdminUser]
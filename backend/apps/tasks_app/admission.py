@@ -0,0 +1,132 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Task, SolverSession
+from .worker_runtime import buffer_pool_cap_mb, get_worker_runtime_states
+
+MB = 1024 * 1024
+# Скільки матриць n x n float64 одночасно тримає рушій: A, робоча копія, L, U, P і тимчасові буфери loadtxt.
+ENGINE_MEMORY_FACTORS = {
+    "lu": 6.0,
+    "lu_batch": 3.0,
+}
+
+
+def estimate_memory_mb(n, engine="lu", count=1):
+    if not n:
+        return 0.0
+    return count * ENGINE_MEMORY_FACTORS[engine] * 8 * n * n / MB
+
+
+def estimate_cpu_cost(n, count=1):
+    return count * float(n) ** 3 if n else 0.0
+
+
+def job_engine(count):
+    return "lu_batch" if count > 1 else "lu"
+
+
+class AdmissionPlanner:
+    """Розміщує задачі на вузлах Celery за оцінкою пам'яті (c·8n²) і обчислювальної вартості (n³)
+    відносно ємності, яку вузли повідомляють у heartbeat."""
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    @classmethod
+    def from_workers(cls):
+        nodes = {}
+        for state in get_worker_runtime_states():
+            node = state.get("node")
+            if not node or state.get("ready") != "1" or "memory_limit_mb" not in state:
+                continue
+            info = nodes.setdefault(node, {
+                "queues": set(filter(None, state.get("queues", "").split(","))),
+                "memory_limit_mb": float(state["memory_limit_mb"]),
+                "processes": 0,
+                "jobs": 0,
+                "reserved_mb": 0.0,
+                "cpu_cost": 0.0,
+                "buffer_pool_mb": 0.0,
+                "unreported_pools": 0,
+                "rss_mb": 0.0,
+            })
+            info["processes"] += 1
+            info["rss_mb"] += float(state.get("rss_mb", 0.0))
+            # Вільні буфери пулу процес тримає між задачами — ця пам'ять задачам недоступна.
+            if "buffer_pool_max_bytes" in state:
+                info["buffer_pool_mb"] += float(state["buffer_pool_max_bytes"]) / MB
+            else:
+                info["unreported_pools"] += 1
+        for info in nodes.values():
+            info["buffer_pool_mb"] += info.pop("unreported_pools") * buffer_pool_cap_mb(info["memory_limit_mb"], info["processes"])
+            info["memory_mb"] = (
+                info["memory_limit_mb"] * settings.ADMISSION_MEMORY_FRACTION
+                - info["processes"] * settings.ADMISSION_WORKER_BASE_MB
+                - info["buffer_pool_mb"]
+            )
+        planner = cls(nodes)
+        planner.load_reservations()
+        return planner
+
+    def load_reservations(self):
+        jobs = {}
+        rows = Task.objects.filter(
+            worker_node__in=list(self.nodes), status__in=[Task.Status.QUEUED, Task.Status.RUNNING]
+        ).values_list('worker_node', 'celery_task_id', 'matrix_size')
+        for node, celery_task_id, n in rows:
+            jobs.setdefault((node, celery_task_id), []).append(n)
+        for (node, _), sizes in jobs.items():
+            self.reserve(node, estimate_memory_mb(max(sizes), job_engine(len(sizes)), len(sizes)), estimate_cpu_cost(max(sizes), len(sizes)))
+        # Резидентна сесія займає процес і пам'ять, але не навантажує CPU, поки чекає на запити.
+        sessions = SolverSession.objects.filter(
+            worker_node__in=list(self.nodes), status__in=SolverSession.ACTIVE_STATUSES
+        ).values_list('worker_node', 'matrix_size')
+        for node, n in sessions:
+            self.reserve(node, estimate_memory_mb(n), 0.0)
+
+    def reserve(self, node, memory_mb, cpu_cost):
+        info = self.nodes[node]
+        info["jobs"] += 1
+        info["reserved_mb"] += memory_mb
+        info["cpu_cost"] += cpu_cost
+
+    def handles(self, queue):
+        return any(queue in info["queues"] for info in self.nodes.values())
+
+    def headroom_mb(self, node):
+        """Вільна пам'ять вузла з урахуванням того, що його процеси займають уже зараз (RSS з heartbeat):
+        для вузла парсингу це і поточні парсинги, і memmap паралельного розбору."""
+        info = self.nodes[node]
+        used_mb = max(info["rss_mb"], info["processes"] * settings.ADMISSION_WORKER_BASE_MB)
+        return info["memory_limit_mb"] * settings.ADMISSION_MEMORY_FRACTION - info["buffer_pool_mb"] - used_mb - info["reserved_mb"]
+
+    def queue_processes(self, queue):
+        return sum(info["processes"] for info in self.nodes.values() if queue in info["queues"])
+
+    def max_memory_mb(self, queue):
+        return max((info["memory_mb"] for info in self.nodes.values() if queue in info["queues"]), default=0.0)
+
+    def place(self, queue, memory_mb, cpu_cost):
+        """Повертає вузол з вільним процесом і достатньою пам'яттю (найменш завантажений за n³) або None."""
+        candidates = [
+            (info["cpu_cost"] / info["processes"], info["memory_mb"] - info["reserved_mb"], node)
+            for node, info in self.nodes.items()
+            if queue in info["queues"] and info["jobs"] < info["processes"]
+            and info["memory_mb"] - info["reserved_mb"] >= memory_mb
+        ]
+        if not candidates:
+            return None
+        node = min(candidates)[2]
+        self.reserve(node, memory_mb, cpu_cost)
+        return node
+
+
+def release_stale_dispatches():
+    """Повертає диспетчеру задачі, які надіслано (вузлу чи в загальну чергу), але так і не почали виконуватися."""
+    cutoff = timezone.now() - timedelta(seconds=settings.ADMISSION_DISPATCH_TIMEOUT_SEC)
+    return Task.objects.filter(
+        status=Task.Status.QUEUED, dispatched_at__lt=cutoff
+    ).update(worker_node=None, dispatched_at=None, celery_task_id=None)
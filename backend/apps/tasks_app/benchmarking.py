@@ -0,0 +1,316 @@
+import gzip
+import io
+import lzma
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .lu_solver import (
+    lu_decomposition, lu_solve, batched_lu_factor, batched_lu_solve,
+    cholesky_decomposition, cholesky_solve, NotPositiveDefiniteError,
+)
+from .krylov_solver import krylov_solve
+from .parsing import open_decompressed, parse_augmented_matrix
+from apps.monitoring.prometheus import factorization_gflops
+
+MATRIX_CLASSES = ("dense", "diag_dominant", "banded", "near_singular", "spd")
+BANDWIDTH = 5
+
+
+def make_system(matrix_class, n, rng):
+    if matrix_class == "dense":
+        A = rng.standard_normal((n, n))
+    elif matrix_class == "diag_dominant":
+        A = rng.random((n, n)) + n * np.eye(n)
+    elif matrix_class == "banded":
+        A = np.triu(np.tril(rng.random((n, n)), BANDWIDTH), -BANDWIDTH) + 2 * BANDWIDTH * np.eye(n)
+    elif matrix_class == "near_singular":
+        A = rng.standard_normal((n, n))
+        A[-1] = A[0] + 1e-10 * rng.standard_normal(n)
+    elif matrix_class == "spd":
+        M = rng.standard_normal((n, n))
+        A = M @ M.T + n * np.eye(n)
+    else:
+        raise ValueError(f"Unknown matrix class: {matrix_class}")
+    return A, rng.standard_normal(n)
+
+
+def _solve_lu(A, b):
+    L, U, P = lu_decomposition(A, lambda percentage: None, pivot_tol=settings.LU_PIVOT_TOLERANCE)
+    return lu_solve(L, U, P, b)
+
+
+def _solve_lu_batch(A, b):
+    LU, perm, singular = batched_lu_factor(A[None], pivot_tol=settings.LU_PIVOT_TOLERANCE)
+    if singular[0]:
+        raise np.linalg.LinAlgError("singular")
+    return batched_lu_solve(LU, perm, b[None])[0]
+
+
+def _solve_cholesky(A, b):
+    # Як у воркері: Холецький для симетричних матриць, LU — якщо розклад не вдався.
+    if not np.array_equal(A, A.T):
+        return _solve_lu(A, b)
+    try:
+        L = cholesky_decomposition(A, lambda percentage: None, pivot_tol=settings.LU_PIVOT_TOLERANCE)
+    except NotPositiveDefiniteError:
+        return _solve_lu(A, b)
+    return cholesky_solve(L, b)
+
+
+def _krylov_engine(method, preconditioner):
+    def solve(A, b):
+        x, info = krylov_solve(A, b, {"method": method, "preconditioner": preconditioner}, symmetric=np.array_equal(A, A.T))
+        if not info["converged"]:
+            raise np.linalg.LinAlgError(info["reason"])
+        return x
+    return solve
+
+
+SOLVER_ENGINES = {
+    "lu": _solve_lu,
+    "lu_batch": _solve_lu_batch,
+    "cholesky": _solve_cholesky,
+    "gmres_jacobi": _krylov_engine("gmres", "jacobi"),
+    "gmres_ilu0": _krylov_engine("gmres", "ilu0"),
+    "bicgstab_jacobi": _krylov_engine("bicgstab", "jacobi"),
+    "cg_jacobi": _krylov_engine("cg", "jacobi"),
+    "numpy": np.linalg.solve,
+}
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    values = np.asarray(samples, dtype=np.float64)
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p99": float(np.percentile(values, 99)),
+        "mean": float(values.mean()),
+        "max": float(values.max()),
+    }
+
+
+def run_solver_suite(engines, matrix_classes, sizes, repeat, seed=0):
+    results = []
+    for n in sizes:
+        for matrix_class in matrix_classes:
+            A, b = make_system(matrix_class, n, np.random.default_rng(seed))
+            for engine in engines:
+                row = {"engine": engine, "matrix_class": matrix_class, "n": n}
+                samples = []
+                try:
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        x = SOLVER_ENGINES[engine](A, b)
+                        samples.append(time.perf_counter() - started)
+                except np.linalg.LinAlgError as e:
+                    row["error"] = str(e)
+                    results.append(row)
+                    continue
+                seconds = float(np.median(samples))
+                row.update(
+                    seconds_median=seconds,
+                    seconds_min=float(min(samples)),
+                    gflops=factorization_gflops(n, seconds),
+                    residual=float(np.linalg.norm(A @ x - b) / (np.linalg.norm(b) or 1.0)),
+                )
+                results.append(row)
+    return results
+
+
+def _compressors():
+    compressors = {"txt": lambda data: data, "gzip": gzip.compress, "xz": lzma.compress}
+    try:
+        import zstandard
+        compressors["zstd"] = zstandard.ZstdCompressor().compress
+    except ImportError:
+        pass
+    return compressors
+
+
+def run_io_suite(sizes, repeat, seed=0):
+    results = []
+    rng = np.random.default_rng(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            A, b = make_system("diag_dominant", n, rng)
+            augmented = np.column_stack([A, b])
+            for name, compress in _compressors().items():
+                serialize_samples, parse_samples = [], []
+                path = os.path.join(tmp, f"input_{n}.{name}")
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    buffer = io.BytesIO()
+                    np.savetxt(buffer, augmented, fmt='%.18e')
+                    raw = buffer.getvalue()
+                    data = compress(raw)
+                    with open(path, 'wb') as f:
+                        f.write(data)
+                    serialize_samples.append(time.perf_counter() - started)
+                    started = time.perf_counter()
+                    with open_decompressed(path) as stream:
+                        parse_augmented_matrix(stream, n)
+                    parse_samples.append(time.perf_counter() - started)
+                megabytes = len(raw) / (1024 * 1024)
+                results.append({
+                    "format": name,
+                    "n": n,
+                    "text_bytes": len(raw),
+                    "file_bytes": len(data),
+                    "serialize_mb_s": megabytes / float(np.median(serialize_samples)),
+                    "parse_mb_s": megabytes / float(np.median(parse_samples)),
+                })
+    return results
+
+
+def environment_info():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, cwd=settings.BASE_DIR
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+# Напрям «кращого» значення для кожної метрики, за яким порівнюються прогони.
+HIGHER_IS_BETTER = ("gflops", "mb_s", "tasks_per_sec")
+
+
+def flatten_metrics(report):
+    metrics = {}
+    for row in report.get("solver", []):
+        prefix = f"solver.{row['engine']}.{row['matrix_class']}.{row['n']}"
+        for key in ("seconds_median", "gflops"):
+            if key in row:
+                metrics[f"{prefix}.{key}"] = row[key]
+    for row in report.get("io", []):
+        for key in ("serialize_mb_s", "parse_mb_s"):
+            metrics[f"io.{row['format']}.{row['n']}.{key}"] = row[key]
+    e2e = report.get("e2e")
+    if e2e:
+        metrics["e2e.throughput_tasks_per_sec"] = e2e["throughput_tasks_per_sec"]
+        for group in ("latency_sec", "queue_wait_sec", "service_sec"):
+            if e2e.get(group):
+                metrics[f"e2e.{group}.p50"] = e2e[group]["p50"]
+                metrics[f"e2e.{group}.p90"] = e2e[group]["p90"]
+    return metrics
+
+
+def compare_reports(baseline, current, threshold):
+    """Повертає метрики, що погіршились більш ніж на threshold (відносно) порівняно з базовим прогоном."""
+    old, new = flatten_metrics(baseline), flatten_metrics(current)
+    regressions = []
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+        if not before:
+            continue
+        change = (after - before) / before
+        if key.endswith(HIGHER_IS_BETTER):
+            change = -change
+        if change > threshold:
+            regressions.append({"metric": key, "baseline": before, "current": after, "change": round(change, 3)})
+    return regressions
+
+
+def _augmented_text(n, rng):
+    A, b = make_system("diag_dominant", n, rng)
+    buffer = io.StringIO()
+    np.savetxt(buffer, np.column_stack([A, b]), fmt='%.18e')
+    return buffer.getvalue()
+
+
+async def _submit_and_follow(user, client, sizes, count, timeout, seed):
+    """Надсилає задачі через REST і стежить за ними через один WebSocket-потік підписок."""
+    import asyncio
+    from asgiref.sync import sync_to_async
+    from channels.routing import URLRouter
+    from channels.testing import WebsocketCommunicator
+    from .models import Task
+    from .routing import websocket_urlpatterns
+
+    terminal = {Task.Status.COMPLETED, Task.Status.FAILED, Task.Status.CANCELLED}
+    rng = np.random.default_rng(seed)
+    submitted, finished = {}, {}
+    communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), "/ws/tasks/updates/")
+    communicator.scope["user"] = user
+    connected, _ = await communicator.connect()
+    if not connected:
+        raise RuntimeError("WebSocket connection was rejected.")
+
+    def submit(i):
+        n = sizes[i % len(sizes)]
+        response = client.post('/api/tasks/', {
+            'name': f"benchmark n={n} #{i}",
+            'matrix_text': _augmented_text(n, rng),
+            'max_n': n,
+        }, format='json', HTTP_HOST='localhost')
+        if response.status_code != 201:
+            raise RuntimeError(f"Task submission failed with HTTP {response.status_code}: {response.content[:200]}")
+        return str(response.data['uuid'])
+
+    async def sender():
+        for i in range(count):
+            started = time.perf_counter()
+            task_uuid = await sync_to_async(submit)(i)
+            submitted[task_uuid] = started
+            await communicator.send_json_to({"action": "subscribe", "tasks": [task_uuid]})
+
+    async def reader(deadline):
+        while len(finished) < count and time.perf_counter() < deadline:
+            try:
+                frame = await communicator.receive_json_from(timeout=max(0.1, deadline - time.perf_counter()))
+            except asyncio.TimeoutError:
+                break
+            observed = time.perf_counter()
+            for task_uuid, state in (frame.get('tasks') or {}).items():
+                if state.get('status') in terminal and task_uuid not in finished:
+                    finished[task_uuid] = (observed, state['status'])
+
+    started = time.perf_counter()
+    await asyncio.gather(sender(), reader(started + timeout))
+    wall_seconds = time.perf_counter() - started
+    await communicator.disconnect()
+    return submitted, finished, wall_seconds
+
+
+def run_e2e_suite(user, sizes, count, timeout, seed=0):
+    from asgiref.sync import async_to_sync
+    from rest_framework.test import APIClient
+    from .models import Task
+
+    client = APIClient()
+    client.force_authenticate(user)
+    submitted, finished, wall_seconds = async_to_sync(_submit_and_follow)(user, client, sizes, count, timeout, seed)
+    queue_waits, service_times = [], []
+    for task in Task.objects.filter(uuid__in=list(submitted)):
+        if task.started_at:
+            queue_waits.append((task.started_at - (task.queued_at or task.created_at)).total_seconds())
+            if task.completed_at:
+                service_times.append((task.completed_at - task.started_at).total_seconds())
+    completed = sum(1 for _, status in finished.values() if status == Task.Status.COMPLETED)
+    return {
+        "tasks": count,
+        "sizes": list(sizes),
+        "wall_seconds": wall_seconds,
+        "completed": completed,
+        "failed": len(finished) - completed,
+        "timed_out": len(submitted) - len(finished),
+        "throughput_tasks_per_sec": completed / wall_seconds if wall_seconds else 0.0,
+        "latency_sec": percentiles([observed - submitted[task_uuid] for task_uuid, (observed, _) in finished.items()]),
+        "queue_wait_sec": percentiles(queue_waits),
+        "service_sec": percentiles(service_times),
+    }
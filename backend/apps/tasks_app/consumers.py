@@ -1,7 +1,16 @@
+import asyncio
+import bisect
 import json
+import time
+import uuid
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
 from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
 from asgiref.sync import sync_to_async
-from .models import Task
+from .models import ALL_TASKS_GROUP, Task, TaskProgress, SolverSession
+from .events import register_all_tasks_subscriber, unregister_all_tasks_subscriber
+from .sessions import parse_rhs, submit_request
 
 class TaskProgressConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -46,7 +55,7 @@ class TaskProgressConsumer(AsyncWebsocketConsumer):
             'estimated_wait_time_sec': event.get('estimated_wait_time_sec'),
         }))
 
-    @sync_to_async
+    @database_sync_to_async
     def check_task_permission(self):
         try:
             if self.user.is_staff:
@@ -58,7 +67,7 @@ class TaskProgressConsumer(AsyncWebsocketConsumer):
             print(f"Error in check_task_permission for {self.task_uuid}: {e}")
             return False
 
-    @sync_to_async
+    @database_sync_to_async
     def get_task_state(self):
         try:
             task = Task.objects.get(uuid=self.task_uuid)
@@ -86,4 +95,292 @@ class TaskProgressConsumer(AsyncWebsocketConsumer):
                 **state
             }))
         else:
-            await self.close(code=4004)
\ No newline at end of file
+            await self.close(code=4004)
+
+class TaskSubscriptionConsumer(AsyncWebsocketConsumer):
+    """Один сокет на користувача: підписка на багато задач, дельти станів, пакетні кадри."""
+    STATE_FIELDS = ('status', 'stage', 'percentage', 'result_message', 'matrix_size', 'queue_position', 'estimated_wait_time_sec')
+    TERMINAL_STATUSES = (Task.Status.COMPLETED, Task.Status.FAILED, Task.Status.CANCELLED)
+
+    async def connect(self):
+        self.user = self.scope['user']
+        if not self.user or not self.user.is_authenticated:
+            await self.close(code=4001)
+            return
+        self.subscriptions = set()
+        self.all_tasks = False
+        self.last_sent = {}
+        self.pending = {}
+        self.pending_logs = {}
+        self.flush_task = None
+        self.last_flush = 0.0
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if getattr(self, 'flush_task', None):
+            self.flush_task.cancel()
+        for task_id in getattr(self, 'subscriptions', ()):
+            await self.channel_layer.group_discard(f"task_{task_id}", self.channel_name)
+        if getattr(self, 'all_tasks', False):
+            await self.channel_layer.group_discard(ALL_TASKS_GROUP, self.channel_name)
+            await sync_to_async(unregister_all_tasks_subscriber)(self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            message = json.loads(text_data or '')
+        except ValueError:
+            await self.send_error("Некоректний JSON.")
+            return
+        if not isinstance(message, dict):
+            await self.send_error("Очікується JSON-об'єкт.")
+            return
+        action = message.get('action')
+        task_ids = message.get('tasks') or []
+        if action == 'subscribe':
+            await self.subscribe(task_ids)
+        elif action == 'unsubscribe':
+            await self.unsubscribe(task_ids)
+        elif action == 'subscribe_all':
+            await self.subscribe_all()
+        elif action == 'unsubscribe_all':
+            await self.unsubscribe_all()
+        else:
+            await self.send_error(f"Невідома дія: {action}")
+
+    async def send_error(self, message):
+        await self.send(text_data=json.dumps({'type': 'error', 'message': message}))
+
+    @staticmethod
+    def normalize_task_ids(task_ids):
+        if not isinstance(task_ids, list):
+            return set(), []
+        valid, invalid = set(), []
+        for task_id in task_ids:
+            try:
+                valid.add(str(uuid.UUID(str(task_id))))
+            except ValueError:
+                invalid.append(task_id)
+        return valid, invalid
+
+    async def subscribe(self, task_ids):
+        requested, invalid = self.normalize_task_ids(task_ids)
+        requested -= self.subscriptions
+        free_slots = settings.WS_MAX_SUBSCRIPTIONS - len(self.subscriptions)
+        if len(requested) > free_slots:
+            await self.send_error(f"Перевищено ліміт підписок ({settings.WS_MAX_SUBSCRIPTIONS}).")
+            requested = set(sorted(requested)[:max(free_slots, 0)])
+        states = await self.get_task_states(requested) if requested else {}
+        if not self.all_tasks:
+            for task_id in states:
+                await self.channel_layer.group_add(f"task_{task_id}", self.channel_name)
+        self.subscriptions.update(states)
+        self.last_sent.update(states)
+        denied = sorted(requested - set(states)) + [str(task_id) for task_id in invalid]
+        await self.send(text_data=json.dumps({'type': 'snapshot', 'tasks': states, 'denied': denied}))
+
+    async def unsubscribe(self, task_ids):
+        requested, _ = self.normalize_task_ids(task_ids)
+        for task_id in requested & self.subscriptions:
+            self.subscriptions.discard(task_id)
+            if not self.all_tasks:
+                await self.channel_layer.group_discard(f"task_{task_id}", self.channel_name)
+                self.forget(task_id)
+
+    async def subscribe_all(self):
+        if not self.user.is_staff:
+            await self.send_error("Потік усіх задач доступний лише адміністраторам.")
+            return
+        if not self.all_tasks:
+            await self.channel_layer.group_add(ALL_TASKS_GROUP, self.channel_name)
+            await sync_to_async(register_all_tasks_subscriber)(self.channel_name)
+            # Події окремих задач і так приходять через загальну групу — не дублюємо їх.
+            for task_id in self.subscriptions:
+                await self.channel_layer.group_discard(f"task_{task_id}", self.channel_name)
+            self.all_tasks = True
+        states = await self.get_task_states(None)
+        self.last_sent.update(states)
+        await self.send(text_data=json.dumps({'type': 'snapshot', 'tasks': states, 'denied': [], 'all': True}))
+
+    async def unsubscribe_all(self):
+        if not self.all_tasks:
+            return
+        for task_id in self.subscriptions:
+            await self.channel_layer.group_add(f"task_{task_id}", self.channel_name)
+        await self.channel_layer.group_discard(ALL_TASKS_GROUP, self.channel_name)
+        await sync_to_async(unregister_all_tasks_subscriber)(self.channel_name)
+        self.all_tasks = False
+        for task_id in list(self.last_sent):
+            if task_id not in self.subscriptions:
+                self.forget(task_id)
+
+    def forget(self, task_id):
+        self.last_sent.pop(task_id, None)
+        self.pending.pop(task_id, None)
+        self.pending_logs.pop(task_id, None)
+
+    async def task_update(self, event):
+        task_id = event['task_id']
+        if not self.all_tasks and task_id not in self.subscriptions:
+            return
+        previous = {**self.last_sent.get(task_id, {}), **self.pending.get(task_id, {})}
+        changes = {
+            field: event.get(field) for field in self.STATE_FIELDS
+            if field in event and (field not in previous or event.get(field) != previous[field])
+        }
+        if changes:
+            self.pending.setdefault(task_id, {}).update(changes)
+        if event.get('log_message'):
+            self.pending_logs.setdefault(task_id, []).append(event['log_message'])
+        if changes or event.get('log_message'):
+            self.schedule_flush()
+
+    def schedule_flush(self):
+        if self.flush_task is not None:
+            return
+        delay = max(0.0, self.last_flush + settings.WS_UPDATE_MIN_INTERVAL - time.monotonic())
+        self.flush_task = asyncio.ensure_future(self.flush_after(delay))
+
+    async def flush_after(self, delay):
+        if delay:
+            await asyncio.sleep(delay)
+        self.flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        if not self.pending and not self.pending_logs:
+            return
+        frame = {'type': 'updates', 'tasks': self.pending}
+        if self.pending_logs:
+            frame['logs'] = self.pending_logs
+        for task_id, changes in self.pending.items():
+            self.last_sent.setdefault(task_id, {}).update(changes)
+            # У загальному потоці завершені задачі більше не змінюються — не тримаємо їх стан.
+            if changes.get('status') in self.TERMINAL_STATUSES and task_id not in self.subscriptions:
+                self.last_sent.pop(task_id, None)
+        self.pending = {}
+        self.pending_logs = {}
+        self.last_flush = time.monotonic()
+        await self.send(text_data=json.dumps(frame))
+
+    @database_sync_to_async
+    def get_task_states(self, task_ids):
+        latest_progress = TaskProgress.objects.filter(task=OuterRef('pk')).order_by('-timestamp', '-id')
+        waiting_statuses = [Task.Status.QUEUED, Task.Status.PENDING]
+        if task_ids is None:
+            tasks = Task.objects.exclude(status__in=self.TERMINAL_STATUSES)
+        else:
+            tasks = Task.objects.filter(uuid__in=task_ids)
+            if not self.user.is_staff:
+                tasks = tasks.filter(owner=self.user)
+        tasks = list(tasks.annotate(
+            last_stage=Subquery(latest_progress.values('stage')[:1]),
+            last_percentage=Subquery(latest_progress.values('percentage')[:1]),
+        ))
+        waiting_created = []
+        avg_duration = None
+        if any(task.status in waiting_statuses for task in tasks):
+            # Одна вибірка черги і одне середнє замість двох агрегатів на кожну задачу.
+            waiting_created = list(Task.objects.filter(status__in=waiting_statuses).order_by('created_at').values_list('created_at', flat=True))
+            avg_duration = Task.get_average_run_duration()
+        states = {}
+        for task in tasks:
+            if task.last_stage is not None:
+                progress = {"stage": task.last_stage, "percentage": task.last_percentage}
+            else:
+                progress = task.get_default_progress()
+            queue_position = None
+            estimated_wait = None
+            if task.status in waiting_statuses:
+                queue_position = bisect.bisect_left(waiting_created, task.created_at) + 1
+                estimated_wait = Task.estimate_wait_for_position(queue_position, avg_duration)
+            states[str(task.uuid)] = {
+                'status': task.status,
+                'stage': progress.get('stage'),
+                'percentage': progress.get('percentage'),
+                'result_message': task.result_message,
+                'matrix_size': task.matrix_size,
+                'queue_position': queue_position,
+                'estimated_wait_time_sec': estimated_wait,
+            }
+        return states
+
+class SolverSessionConsumer(AsyncWebsocketConsumer):
+    """Потік правих частин для резидентної сесії: {"action": "solve", "b": [...], "id": "..."} -> {"type": "result", ...}.
+    Відповідь воркер надсилає прямо в канал цього сокета, без опитування Redis."""
+    async def connect(self):
+        self.session_uuid = self.scope['url_route']['kwargs']['session_uuid']
+        self.session_group_name = f"session_{self.session_uuid}"
+        self.user = self.scope['user']
+        if not self.user or not self.user.is_authenticated:
+            await self.close(code=4001)
+            return
+        state = await self.get_session_state()
+        if state is None:
+            await self.close(code=4003)
+            return
+        await self.channel_layer.group_add(self.session_group_name, self.channel_name)
+        await self.accept()
+        await self.send(text_data=json.dumps({'type': 'initial_state', **state}))
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(self.session_group_name, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            message = json.loads(text_data or '')
+        except ValueError:
+            await self.send_error("Некоректний JSON.")
+            return
+        if not isinstance(message, dict) or message.get('action') != 'solve':
+            await self.send_error("Очікується {\"action\": \"solve\", \"b\": [...]}.")
+            return
+        state = await self.get_session_state()
+        if state is None or state['status'] not in SolverSession.ACTIVE_STATUSES:
+            await self.send_error("Сесію закрито.", message.get('id'))
+            return
+        try:
+            b = parse_rhs(message.get('b'), state['matrix_size'])
+        except ValueError as e:
+            await self.send_error(str(e), message.get('id'))
+            return
+        request_id = str(message['id']) if message.get('id') is not None else None
+        await sync_to_async(submit_request)(self.session_uuid, b.tolist(), reply_to=self.channel_name, request_id=request_id)
+
+    async def send_error(self, message, request_id=None):
+        await self.send(text_data=json.dumps({'type': 'error', 'message': message, 'request_id': request_id}))
+
+    async def session_result(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'result',
+            'request_id': event.get('request_id'),
+            'x': event.get('x'),
+            'solve_seconds': event.get('solve_seconds'),
+            'error': event.get('error'),
+        }))
+
+    async def session_status(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'status',
+            'status': event['status'],
+            'factorization': event.get('factorization'),
+            'message': event.get('message'),
+        }))
+
+    @database_sync_to_async
+    def get_session_state(self):
+        try:
+            sessions = SolverSession.objects.filter(uuid=uuid.UUID(self.session_uuid))
+        except ValueError:
+            return None
+        if not self.user.is_staff:
+            sessions = sessions.filter(owner=self.user)
+        session = sessions.first()
+        if session is None:
+            return None
+        return {
+            'status': session.status,
+            'factorization': session.factorization,
+            'matrix_size': session.matrix_size,
+            'solves': session.solves,
+            'message': session.message,
+        }
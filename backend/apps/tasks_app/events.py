@@ -0,0 +1,189 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+ALL_TASKS_SUBSCRIBERS_KEY = "lu:ws:all_tasks:subscribers"
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+_all_tasks_check = {"at": 0.0, "subscribed": True}
+
+
+def register_all_tasks_subscriber(channel_name):
+    from .utils import get_redis_connection
+    get_redis_connection().zadd(ALL_TASKS_SUBSCRIBERS_KEY, {channel_name: time.time()})
+
+
+def unregister_all_tasks_subscriber(channel_name):
+    from .utils import get_redis_connection
+    get_redis_connection().zrem(ALL_TASKS_SUBSCRIBERS_KEY, channel_name)
+
+
+def all_tasks_subscribed():
+    """Чи слухає хтось загальний потік задач. Відповідь кешується в процесі на WS_ALL_TASKS_CHECK_INTERVAL;
+    якщо Redis недоступний, вважаємо, що слухає (краще зайва подія, ніж втрачена)."""
+    now = time.monotonic()
+    if now - _all_tasks_check["at"] < settings.WS_ALL_TASKS_CHECK_INTERVAL:
+        return _all_tasks_check["subscribed"]
+    from .utils import get_redis_connection
+    try:
+        r = get_redis_connection()
+        # Записи сокетів, що зникли без disconnect, живуть не довше за членство в групі channel layer.
+        r.zremrangebyscore(ALL_TASKS_SUBSCRIBERS_KEY, 0, time.time() - settings.WS_ALL_TASKS_SUBSCRIBER_TTL)
+        subscribed = r.zcard(ALL_TASKS_SUBSCRIBERS_KEY) > 0
+    except Exception as e:
+        print(f"Warning: could not check all-tasks subscribers: {e}")
+        subscribed = True
+    _all_tasks_check.update(at=now, subscribed=subscribed)
+    return subscribed
+
+
+class EventPublisher:
+    """Фоновий потік воркера, що пакетно відправляє події задач у channel layer.
+
+    publish() лише ставить подію в чергу і ніколи не чекає на Redis. Проміжний прогрес
+    задачі, ще не відправлений, замінюється новішим; при переповненні черги першими
+    відкидаються саме такі події, а зміни статусу й логи зберігаються.
+    """
+
+    def __init__(self, channel_layer=None, max_pending=None, batch_interval=None):
+        self._channel_layer = channel_layer
+        self.max_pending = max_pending or settings.WORKER_EVENT_QUEUE_MAX
+        self.batch_interval = settings.WORKER_EVENT_BATCH_INTERVAL if batch_interval is None else batch_interval
+        self._queue = deque()
+        self._pending_progress = {}
+        self._last_status = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._in_flight = 0
+        self.published = 0
+        self.merged = 0
+        self.dropped = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="lu-event-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        if not self.running:
+            return
+        self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def flush(self, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while (self._queue or self._in_flight) and self.running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def publish(self, groups, event):
+        task_id = event.get('task_id')
+        with self._cond:
+            is_progress = not event.get('log_message') and self._last_status.get(task_id) == event.get('status')
+            if event.get('status') in TERMINAL_STATUSES:
+                # Після завершення задача більше не змінюється — не тримаємо її в пам'яті процесу.
+                self._last_status.pop(task_id, None)
+            else:
+                self._last_status[task_id] = event.get('status')
+            if not is_progress:
+                # Новіший прогрес не можна вливати в запис, що стоїть у черзі раніше за цю подію.
+                self._pending_progress.pop(task_id, None)
+            if is_progress and task_id in self._pending_progress:
+                self._pending_progress[task_id][1] = event
+                self.merged += 1
+                return
+            if len(self._queue) >= self.max_pending and not self._evict(is_progress):
+                self.dropped += 1
+                return
+            entry = [tuple(groups), event, is_progress]
+            self._queue.append(entry)
+            if is_progress:
+                self._pending_progress[task_id] = entry
+            self._cond.notify()
+
+    def _evict(self, incoming_is_progress):
+        if incoming_is_progress:
+            return False
+        for entry in self._queue:
+            if entry[2]:
+                self._queue.remove(entry)
+                self._pending_progress.pop(entry[1].get('task_id'), None)
+                self.dropped += 1
+                return True
+        # Черга заповнена лише важливими подіями — відкидаємо найстарішу.
+        entry = self._queue.popleft()
+        self._pending_progress.pop(entry[1].get('task_id'), None)
+        self.dropped += 1
+        return True
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._queue and not self._stopping:
+                self._cond.wait()
+            batch = list(self._queue)
+            self._queue.clear()
+            self._pending_progress.clear()
+            self._in_flight = len(batch)
+            return batch
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                batch = self._take_batch()
+                if not batch and self._stopping:
+                    break
+                try:
+                    loop.run_until_complete(self._send(batch))
+                    self.published += len(batch)
+                except Exception as e:
+                    print(f"Warning: could not publish {len(batch)} task events: {e}")
+                with self._cond:
+                    self._in_flight = 0
+                    self._cond.notify_all()
+                if self.batch_interval:
+                    time.sleep(self.batch_interval)
+        finally:
+            loop.close()
+
+    async def _send(self, batch):
+        if self._channel_layer is None:
+            from channels.layers import get_channel_layer
+            self._channel_layer = get_channel_layer()
+        # У межах групи — строго по черзі, щоб клієнт не побачив RUNNING після COMPLETED; різні групи — паралельно.
+        per_group = {}
+        for groups, event, _ in batch:
+            for group in groups:
+                per_group.setdefault(group, []).append(event)
+        await asyncio.gather(*[self._send_in_order(group, events) for group, events in per_group.items()])
+
+    async def _send_in_order(self, group, events):
+        for event in events:
+            await self._channel_layer.group_send(group, event)
+
+    def stats(self):
+        return {
+            "pending": len(self._queue),
+            "published": self.published,
+            "merged": self.merged,
+            "dropped": self.dropped,
+        }
+
+
+event_publisher = EventPublisher()
@@ -0,0 +1,54 @@
+import json
+
+from django.conf import settings
+
+from .utils import get_redis_connection
+
+TASK_HTTP_CACHE_PREFIX = "lu:task:http:"
+CACHE_KINDS = ("detail", "events")
+
+
+def task_cache_key(task_id, kind):
+    return f"{TASK_HTTP_CACHE_PREFIX}{kind}:{task_id}"
+
+
+def task_etag(task):
+    return f'W/"{task.id}-{task.version}"'
+
+
+def load_task_cache(task_id, kind):
+    try:
+        raw = get_redis_connection().get(task_cache_key(task_id, kind))
+    except Exception as e:
+        print(f"Warning: could not read task cache: {e}")
+        return None
+    return json.loads(raw) if raw else None
+
+
+def store_task_cache(task, kind, body=None):
+    """Зберігає ETag/Last-Modified задачі, а для завершених задач — і серіалізовану відповідь."""
+    # Задача могла змінитися, поки відповідь серіалізувалася; застарілий запис не зберігаємо.
+    if not type(task).objects.filter(id=task.id, version=task.version).exists():
+        return
+    entry = {
+        "etag": task_etag(task),
+        "last_modified": task.updated_at.timestamp(),
+        "owner_id": task.owner_id,
+        "status": task.status,
+        "body": body,
+    }
+    ttl = settings.TASK_DETAIL_CACHE_TTL if body is not None else settings.TASK_ETAG_CACHE_TTL
+    try:
+        get_redis_connection().set(task_cache_key(task.id, kind), json.dumps(entry, default=str), ex=ttl)
+    except Exception as e:
+        print(f"Warning: could not write task cache: {e}")
+
+
+def invalidate_task_cache(task_ids):
+    keys = [task_cache_key(task_id, kind) for task_id in task_ids for kind in CACHE_KINDS]
+    if not keys:
+        return
+    try:
+        get_redis_connection().delete(*keys)
+    except Exception as e:
+        print(f"Warning: could not invalidate task cache: {e}")
@@ -0,0 +1,274 @@
+import math
+import time
+
+import numpy as np
+from celery.exceptions import SoftTimeLimitExceeded
+
+from .lu_solver import back_substitution, check_trivial_singularity, forward_substitution
+
+METHODS = ("auto", "gmres", "cg", "bicgstab")
+PRECONDITIONERS = ("none", "jacobi", "ilu0")
+METHOD_LABELS = {"gmres": "GMRES", "cg": "CG", "bicgstab": "BiCGSTAB"}
+DEFAULT_OPTIONS = {
+    "method": "auto",
+    "preconditioner": "jacobi",
+    "tol": 1e-10,
+    "max_iter": 1000,
+    "restart": 50,
+}
+MAX_ITERATIONS = 100000
+
+
+def normalize_options(options):
+    """Перевіряє параметри ітераційного розв'язувача і доповнює їх значеннями за замовчуванням."""
+    options = dict(options or {})
+    unknown = set(options) - set(DEFAULT_OPTIONS)
+    if unknown:
+        raise ValueError(f"Невідомі параметри: {', '.join(sorted(unknown))}.")
+    result = {**DEFAULT_OPTIONS, **options}
+    if result["method"] not in METHODS:
+        raise ValueError(f"Метод має бути одним з: {', '.join(METHODS)}.")
+    if result["preconditioner"] not in PRECONDITIONERS:
+        raise ValueError(f"Передобумовлювач має бути одним з: {', '.join(PRECONDITIONERS)}.")
+    try:
+        result["tol"] = float(result["tol"])
+        result["max_iter"] = int(result["max_iter"])
+        result["restart"] = int(result["restart"])
+    except (TypeError, ValueError):
+        raise ValueError("tol має бути числом, max_iter і restart — цілими.")
+    if not 0 < result["tol"] < 1:
+        raise ValueError("tol має бути в інтервалі (0, 1).")
+    if not 1 <= result["max_iter"] <= MAX_ITERATIONS:
+        raise ValueError(f"max_iter має бути від 1 до {MAX_ITERATIONS}.")
+    if result["restart"] < 1:
+        raise ValueError("restart має бути додатним.")
+    return result
+
+
+def as_operator(A, sparse_density=0.1):
+    """Повертає функцію x -> A @ x. Для розрідженої A — рядковий CSR-добуток за O(nnz) замість O(n²)."""
+    rows, cols = np.nonzero(A)
+    if rows.size > sparse_density * A.size:
+        return lambda x: A @ x
+    data = A[rows, cols]
+    n = A.shape[0]
+    return lambda x: np.bincount(rows, weights=data * x[cols], minlength=n)
+
+
+def jacobi_preconditioner(A):
+    diagonal = np.diagonal(A).copy()
+    if not diagonal.all():
+        raise np.linalg.LinAlgError("Нульовий елемент на діагоналі: передобумовлювач Якобі неможливий.")
+    return lambda r: r / diagonal
+
+
+def ilu0_preconditioner(A):
+    """Неповний LU без заповнення: L і U мають той самий шаблон ненульових елементів, що й A.
+    Для щільної A це звичайний LU без перестановок, тож має сенс лише для розріджених матриць."""
+    LU = np.array(A, dtype=np.float64, copy=True)
+    pattern = LU != 0
+    n = LU.shape[0]
+    for i in range(1, n):
+        for k in np.flatnonzero(pattern[i, :i]):
+            if LU[k, k] == 0:
+                raise np.linalg.LinAlgError(f"ILU(0): нульовий ведучий елемент у рядку {k + 1}.")
+            LU[i, k] /= LU[k, k]
+            mask = pattern[i, k + 1:]
+            LU[i, k + 1:][mask] -= LU[i, k] * LU[k, k + 1:][mask]
+    if not np.diagonal(LU).all():
+        raise np.linalg.LinAlgError("ILU(0): нульовий елемент на діагоналі U.")
+    return lambda r: back_substitution(LU, forward_substitution(LU, r, unit_diagonal=True))
+
+
+PRECONDITIONER_BUILDERS = {
+    "none": lambda A: (lambda r: r),
+    "jacobi": jacobi_preconditioner,
+    "ilu0": ilu0_preconditioner,
+}
+
+
+def conjugate_gradient(matvec, b, precondition, tol, max_iter, callback):
+    b_norm = np.linalg.norm(b) or 1.0
+    x = np.zeros_like(b)
+    r = b.copy()
+    z = precondition(r)
+    p = z.copy()
+    rz = r @ z
+    for iteration in range(1, max_iter + 1):
+        Ap = matvec(p)
+        pAp = p @ Ap
+        if pAp <= 0:
+            # Від'ємна кривина: матриця не додатно визначена, CG тут не застосовний.
+            return x, iteration - 1, False
+        alpha = rz / pAp
+        x += alpha * p
+        r -= alpha * Ap
+        relative_residual = np.linalg.norm(r) / b_norm
+        callback(iteration, relative_residual)
+        if relative_residual <= tol:
+            return x, iteration, True
+        z = precondition(r)
+        rz_new = r @ z
+        p = z + (rz_new / rz) * p
+        rz = rz_new
+    return x, max_iter, False
+
+
+def bicgstab(matvec, b, precondition, tol, max_iter, callback):
+    b_norm = np.linalg.norm(b) or 1.0
+    x = np.zeros_like(b)
+    r = b.copy()
+    r_hat = r.copy()
+    rho = alpha = omega = 1.0
+    v = np.zeros_like(b)
+    p = np.zeros_like(b)
+    for iteration in range(1, max_iter + 1):
+        rho_new = r_hat @ r
+        if rho_new == 0 or omega == 0:
+            return x, iteration - 1, False
+        p = r + (rho_new / rho) * (alpha / omega) * (p - omega * v)
+        p_hat = precondition(p)
+        v = matvec(p_hat)
+        alpha = rho_new / (r_hat @ v)
+        s = r - alpha * v
+        if np.linalg.norm(s) / b_norm <= tol:
+            x += alpha * p_hat
+            callback(iteration, np.linalg.norm(s) / b_norm)
+            return x, iteration, True
+        s_hat = precondition(s)
+        t = matvec(s_hat)
+        omega = (t @ s) / (t @ t)
+        x += alpha * p_hat + omega * s_hat
+        r = s - omega * t
+        rho = rho_new
+        relative_residual = np.linalg.norm(r) / b_norm
+        callback(iteration, relative_residual)
+        if relative_residual <= tol:
+            return x, iteration, True
+    return x, max_iter, False
+
+
+def gmres(matvec, b, precondition, tol, max_iter, callback, restart=50):
+    """GMRES(restart) з правим передобумовленням; мінімізація через обертання Гівенса."""
+    n = b.shape[0]
+    b_norm = np.linalg.norm(b) or 1.0
+    x = np.zeros_like(b)
+    restart = min(restart, n)
+    iteration = 0
+    while iteration < max_iter:
+        r = b - matvec(x)
+        beta = np.linalg.norm(r)
+        if beta / b_norm <= tol:
+            return x, iteration, True
+        V = np.zeros((restart + 1, n))
+        Z = np.zeros((restart, n))
+        H = np.zeros((restart + 1, restart))
+        cs = np.zeros(restart)
+        sn = np.zeros(restart)
+        g = np.zeros(restart + 1)
+        g[0] = beta
+        V[0] = r / beta
+        converged = False
+        for j in range(restart):
+            Z[j] = precondition(V[j])
+            w = matvec(Z[j])
+            for i in range(j + 1):
+                H[i, j] = w @ V[i]
+                w -= H[i, j] * V[i]
+            H[j + 1, j] = np.linalg.norm(w)
+            if H[j + 1, j] != 0:
+                V[j + 1] = w / H[j + 1, j]
+            for i in range(j):
+                H[i, j], H[i + 1, j] = cs[i] * H[i, j] + sn[i] * H[i + 1, j], -sn[i] * H[i, j] + cs[i] * H[i + 1, j]
+            denominator = math.hypot(H[j, j], H[j + 1, j])
+            cs[j], sn[j] = (H[j, j] / denominator, H[j + 1, j] / denominator) if denominator else (1.0, 0.0)
+            happy_breakdown = H[j + 1, j] == 0
+            H[j, j], H[j + 1, j] = denominator, 0.0
+            g[j + 1] = -sn[j] * g[j]
+            g[j] = cs[j] * g[j]
+            iteration += 1
+            relative_residual = abs(g[j + 1]) / b_norm
+            callback(iteration, relative_residual)
+            converged = relative_residual <= tol
+            if converged or happy_breakdown or iteration >= max_iter:
+                break
+        if not H[j, j]:
+            return x, iteration, False
+        y = back_substitution(H[:j + 1, :j + 1], g[:j + 1])
+        x += Z[:j + 1].T @ y
+        if converged:
+            return x, iteration, True
+    return x, iteration, False
+
+
+def choose_method(A, method, symmetric):
+    if method != "auto":
+        return method
+    # CG лише для симетричних матриць з додатною діагоналлю (необхідна умова додатної визначеності).
+    return "cg" if symmetric and np.diagonal(A).min() > 0 else "gmres"
+
+
+def krylov_solve(A, b, options, progress_callback=None, symmetric=False, progress_interval=0.5, sparse_density=0.1):
+    """Розв'язує Ax = b методом Крилова. Повертає (x, info); info["converged"] = False означає,
+    що потрібен прямий розклад (метод не збігся, зламався або передобумовлювач неможливий)."""
+    options = normalize_options(options)
+    method = choose_method(A, options["method"], symmetric)
+    info = {"method": method, "preconditioner": options["preconditioner"], "iterations": 0, "converged": False}
+    try:
+        precondition = PRECONDITIONER_BUILDERS[options["preconditioner"]](A)
+    except np.linalg.LinAlgError as e:
+        info["reason"] = str(e)
+        return None, info
+    matvec = as_operator(A, sparse_density)
+    label = METHOD_LABELS[method]
+    last_report = [0.0]
+
+    def report(iteration, relative_residual):
+        now = time.monotonic()
+        if progress_callback is None or now - last_report[0] < progress_interval:
+            return
+        last_report[0] = now
+        # Прогрес у логарифмічній шкалі: від початкової нев'язки 1 (x0 = 0) до tol.
+        done = math.log10(relative_residual) / math.log10(options["tol"]) if relative_residual > 0 else 1.0
+        progress_callback(f"{label}: ітерація {iteration}, нев'язка {relative_residual:.2e}", 80 * min(max(done, 0.0), 1.0))
+
+    kwargs = {"restart": options["restart"]} if method == "gmres" else {}
+    solver = {"gmres": gmres, "cg": conjugate_gradient, "bicgstab": bicgstab}[method]
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        x, iterations, converged = solver(matvec, b, precondition, options["tol"], options["max_iter"], report, **kwargs)
+    b_norm = np.linalg.norm(b) or 1.0
+    residual_norm = float(np.linalg.norm(A @ x - b) / b_norm) if np.all(np.isfinite(x)) else float("inf")
+    # Рекурентна нев'язка може відійти від справжньої — рішення приймаємо за справжньою.
+    converged = converged and residual_norm <= 10 * options["tol"]
+    info.update(iterations=iterations, residual_norm=residual_norm, converged=converged)
+    if not converged:
+        info["reason"] = f"не збігся за {iterations} ітерацій (нев'язка {residual_norm:.2e})"
+    return x, info
+
+
+def solve_krylov_system(matrix_path, vector_path, progress_callback, options, symmetric=False, timings=None,
+                        progress_interval=0.5, sparse_density=0.1):
+    """Аналог solve_lu_system для ітераційного рушія. Повертає (x, info), див. krylov_solve."""
+    try:
+        progress_callback("Завантаження даних", 0)
+        timings = timings if timings is not None else {}
+        started = time.time()
+        A = np.loadtxt(matrix_path, ndmin=2)
+        b = np.loadtxt(vector_path, ndmin=1)
+        n = A.shape[0]
+        if A.shape != (n, n) or b.shape != (n,):
+            raise ValueError("Некоректні розміри матриці A або вектора b.")
+        check_trivial_singularity(A)
+        timings['load'] = time.time() - started
+        started = time.time()
+        x, info = krylov_solve(A, b, options, progress_callback, symmetric, progress_interval, sparse_density)
+        timings['solve'] = time.time() - started
+        if info["converged"]:
+            progress_callback(f"{METHOD_LABELS[info['method']]}: збіжність за {info['iterations']} ітерацій", 100)
+        return x, info
+    except np.linalg.LinAlgError as e:
+        raise Exception(f"Матриця сингулярна або вироджена. {e}")
+    except (SoftTimeLimitExceeded, InterruptedError):
+        raise
+    except Exception as e:
+        raise Exception(f"Помилка під час обчислень: {e}")
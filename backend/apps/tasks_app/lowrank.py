@@ -0,0 +1,167 @@
+import numpy as np
+
+from .lu_solver import ResidentFactors
+
+MODIFICATION_KEYS = ("rows", "columns", "U", "V", "b")
+
+
+class LowRankUpdateError(Exception):
+    """Оновлення розкладу неможливе або нестабільне — потрібен повний розклад A'."""
+
+
+def _indexed_vectors(spec, key, n):
+    items = spec.get(key) or {}
+    if not isinstance(items, dict):
+        raise ValueError(f"{key} має бути об'єктом {{індекс: [значення]}} (індекси з 0).")
+    vectors = {}
+    for index, values in items.items():
+        try:
+            index = int(index)
+        except (TypeError, ValueError):
+            raise ValueError(f"{key}: індекс {index!r} не є цілим числом.")
+        if not 0 <= index < n:
+            raise ValueError(f"{key}: індекс {index} поза межами 0..{n - 1}.")
+        vectors[index] = _vector(values, n, f"{key}[{index}]")
+    return vectors
+
+
+def _vector(values, n, label):
+    if not isinstance(values, list) or len(values) != n:
+        raise ValueError(f"{label} має містити {n} чисел.")
+    try:
+        vector = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError(f"{label} має містити лише числа.")
+    if vector.ndim != 1 or not np.all(np.isfinite(vector)):
+        raise ValueError(f"{label} має містити лише скінченні числа.")
+    return vector
+
+
+def _factor(values, n, label):
+    try:
+        matrix = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError(f"{label} має бути матрицею чисел n×k.")
+    if matrix.ndim == 1:
+        matrix = matrix[:, None]
+    if matrix.ndim != 2 or matrix.shape[0] != n or not np.all(np.isfinite(matrix)):
+        raise ValueError(f"{label} має бути матрицею скінченних чисел розміру {n}×k.")
+    return matrix
+
+
+def validate_modification(spec, n):
+    """Перевіряє опис зміни A і повертає його ранг. Зміна задається як заміна рядків ("rows"),
+    стовпців ("columns") та/або добуток U·Vᵀ ("U", "V" — n×k); "b" — новий вектор правої частини."""
+    if not isinstance(spec, dict) or not spec:
+        raise ValueError("Опис зміни має бути непорожнім об'єктом.")
+    unknown = set(spec) - set(MODIFICATION_KEYS)
+    if unknown:
+        raise ValueError(f"Невідомі поля зміни: {', '.join(sorted(unknown))}.")
+    rank = len(_indexed_vectors(spec, "rows", n)) + len(_indexed_vectors(spec, "columns", n))
+    if ("U" in spec) != ("V" in spec):
+        raise ValueError("U і V задаються лише разом.")
+    if "U" in spec:
+        U, V = _factor(spec["U"], n, "U"), _factor(spec["V"], n, "V")
+        if U.shape != V.shape:
+            raise ValueError("U і V мають мати однакову кількість стовпців.")
+        rank += U.shape[1]
+    if "b" in spec:
+        _vector(spec["b"], n, "b")
+    if rank == 0 and "b" not in spec:
+        raise ValueError("Зміна не містить ані нових рядків/стовпців, ані U·Vᵀ, ані нового b.")
+    return rank
+
+
+def apply_modification(A, b, spec):
+    """Повертає (A', b', U, V), де A' = A + U·Vᵀ. Рядки замінюються першими, стовпці — вже в A з новими рядками."""
+    n = A.shape[0]
+    A = np.array(A, dtype=np.float64, copy=True)
+    us, vs = [], []
+    for i, row in sorted(_indexed_vectors(spec, "rows", n).items()):
+        unit = np.zeros(n)
+        unit[i] = 1.0
+        us.append(unit)
+        vs.append(row - A[i])
+        A[i] = row
+    for j, column in sorted(_indexed_vectors(spec, "columns", n).items()):
+        unit = np.zeros(n)
+        unit[j] = 1.0
+        us.append(column - A[:, j])
+        vs.append(unit)
+        A[:, j] = column
+    U = np.column_stack(us) if us else np.zeros((n, 0))
+    V = np.column_stack(vs) if vs else np.zeros((n, 0))
+    if "U" in spec:
+        U_extra, V_extra = _factor(spec["U"], n, "U"), _factor(spec["V"], n, "V")
+        A += U_extra @ V_extra.T
+        U, V = np.hstack([U, U_extra]), np.hstack([V, V_extra])
+    if "b" in spec:
+        b = _vector(spec["b"], n, "b")
+    return A, b, U, V
+
+
+class LowRankUpdatedFactors:
+    """Розв'язувач для A' = A + U·Vᵀ за готовим розкладом A (формула Шермана–Моррісона–Вудбері):
+    A'⁻¹b = A⁻¹b − A⁻¹U·C⁻¹·Vᵀ·A⁻¹b, C = I + Vᵀ·A⁻¹U. Підготовка — k розв'язків O(n²), далі O(n²+nk) на праву частину."""
+
+    def __init__(self, factors, U, V, max_condition):
+        self.base = factors
+        self.U = U
+        self.V = V
+        self.n = factors.n
+        self.rank = U.shape[1]
+        self.Z = factors.solve(U)
+        self.C = np.eye(self.rank) + V.T @ self.Z
+        condition = np.linalg.cond(self.C) if self.rank else 1.0
+        # Погано обумовлена C означає, що A' близька до виродженої або оновлення знищує точність розкладу A.
+        if not np.isfinite(condition) or condition > max_condition:
+            raise LowRankUpdateError(f"ємнісна матриця Вудбері погано обумовлена (cond ~{condition:.1e})")
+        self._Z_transposed = None
+
+    def solve(self, b):
+        y = self.base.solve(b)
+        if not self.rank:
+            return y
+        return y - self.Z @ np.linalg.solve(self.C, self.V.T @ y)
+
+    def solve_transposed(self, c):
+        # A'ᵀ = Aᵀ + V·Uᵀ, і її ємнісна матриця — це Cᵀ.
+        y = self.base.solve_transposed(c)
+        if not self.rank:
+            return y
+        if self._Z_transposed is None:
+            self._Z_transposed = self.base.solve_transposed(self.V)
+        return y - self._Z_transposed @ np.linalg.solve(self.C.T, self.U.T @ y)
+
+    def slogdet(self):
+        # Лема про визначник матриці: det(A + U·Vᵀ) = det(C)·det(A).
+        sign, logdet = self.base.slogdet()
+        if not self.rank:
+            return sign, logdet
+        sign_c, logdet_c = np.linalg.slogdet(self.C)
+        return sign * int(sign_c), logdet + float(logdet_c)
+
+    def save(self, path):
+        # Базовий розклад разом із накопиченим оновленням: наступна зміна додасть свої стовпці до U і V.
+        self.base.save(path, update_U=self.U, update_V=self.V)
+
+
+def load_stored_factors(path, max_condition=np.inf):
+    """Розклад із factors.npz: ResidentFactors або, якщо разом із ним збережено оновлення, LowRankUpdatedFactors."""
+    factors, extra = ResidentFactors.load(path)
+    if "update_U" not in extra:
+        return factors
+    return LowRankUpdatedFactors(factors, extra["update_U"], extra["update_V"], max_condition)
+
+
+def load_updated_factors(path, U, V, max_rank, max_condition):
+    """Завантажує збережений розклад (можливо, вже з оновленням) і додає до нього зміну U·Vᵀ."""
+    factors, extra = ResidentFactors.load(path)
+    if "update_U" in extra:
+        U = np.hstack([extra["update_U"], U])
+        V = np.hstack([extra["update_V"], V])
+    if U.shape[0] != factors.n:
+        raise LowRankUpdateError("розмір збереженого розкладу не збігається з матрицею")
+    if U.shape[1] > max_rank:
+        raise LowRankUpdateError(f"сумарний ранг оновлення {U.shape[1]} перевищує {max_rank}")
+    return LowRankUpdatedFactors(factors, U, V, max_condition)
@@ -1,17 +1,109 @@
 import numpy as np
 import time
 import os
+from celery.exceptions import SoftTimeLimitExceeded
 
-def lu_decomposition(A, progress_callback):
+DEFAULT_PIVOT_TOLERANCE = 1e-12
+
+
+class SingularMatrixError(np.linalg.LinAlgError):
+    pass
+
+
+class NotPositiveDefiniteError(np.linalg.LinAlgError):
+    pass
+
+
+class FactorizationCheckpoint:
+    """Періодично зберігає частково розкладений стан у .npz (для LU: оброблені стовпці L, рядки U,
+    оновлений хвостовий блок і перестановку рядків; для Холецького: стовпці L). Дозволяє продовжити
+    розклад з того ж стовпця."""
+
+    def __init__(self, path, interval, on_save=None):
+        self.path = path
+        self.interval = interval
+        self.on_save = on_save
+        self.last_saved = time.monotonic()
+
+    def load(self, n, method="lu"):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with np.load(self.path) as data:
+                state = {key: data[key] for key in data.files}
+        except (OSError, ValueError) as e:
+            print(f"Warning: ignoring unreadable checkpoint {self.path}: {e}")
+            return None
+        k = int(state['k'])
+        # Контрольні точки без поля method записані LU-розкладом.
+        if int(state['n']) != n or not 0 < k < n or str(state.get('method', 'lu')) != method:
+            return None
+        return state
+
+    def maybe_save(self, n, k, method, arrays):
+        """arrays — функція, що повертає масиви стану; викликається лише коли справді час зберігати."""
+        if time.monotonic() - self.last_saved >= self.interval:
+            self.save(n, k, method, **arrays())
+
+    def save(self, n, k, method, **arrays):
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez(tmp_path, n=n, k=k, method=method, **arrays)
+        os.replace(tmp_path, self.path)
+        self.last_saved = time.monotonic()
+        if self.on_save:
+            self.on_save(k)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def check_trivial_singularity(A):
+    zero_rows = np.flatnonzero(~A.any(axis=1))
+    if zero_rows.size:
+        raise SingularMatrixError(f"Рядок {zero_rows[0] + 1} матриці A нульовий.")
+    zero_cols = np.flatnonzero(~A.any(axis=0))
+    if zero_cols.size:
+        raise SingularMatrixError(f"Стовпець {zero_cols[0] + 1} матриці A нульовий.")
+
+
+def lu_decomposition(A, progress_callback, pivot_tol=DEFAULT_PIVOT_TOLERANCE, workspace=None, checkpoint=None):
     n = A.shape[0]
-    L = np.zeros((n, n))
-    U = np.zeros((n, n))
-    P = np.eye(n)
-    A_copy = A.copy()
-    progress_callback(0)
+    check_trivial_singularity(A)
+    pivot_threshold = pivot_tol * (np.max(np.abs(A)) if n else 0.0)
+    if workspace is None:
+        L = np.zeros((n, n))
+        U = np.zeros((n, n))
+        P = np.eye(n)
+        A_copy = A.copy()
+    else:
+        L = workspace.zeros((n, n))
+        U = workspace.zeros((n, n))
+        P = workspace.zeros((n, n))
+        np.fill_diagonal(P, 1.0)
+        A_copy = workspace.empty((n, n))
+        np.copyto(A_copy, A)
+    start_column = 0
+    state = checkpoint.load(n) if checkpoint else None
+    if state is not None:
+        # Стовпці лівіше k і рядки вище k у A_copy далі не читаються, тож відновлюємо лише хвостовий блок.
+        start_column = int(state['k'])
+        L[:, :start_column] = state['L']
+        U[:start_column] = state['U']
+        A_copy[start_column:, start_column:] = state['trailing']
+        P[:] = 0.0
+        P[np.arange(n), state['perm']] = 1.0
+    progress_callback(start_column / n * 100 if n else 0)
 
-    for k in range(n):
+    for k in range(start_column, n):
         pivot_row = np.argmax(np.abs(A_copy[k:n, k])) + k
+        if abs(A_copy[pivot_row, k]) <= pivot_threshold:
+            raise SingularMatrixError(
+                f"Ведучий елемент у стовпці {k + 1} близький до нуля "
+                f"({abs(A_copy[pivot_row, k]):.3e} <= {pivot_threshold:.3e})."
+            )
         if k != pivot_row:
             A_copy[[k, pivot_row]] = A_copy[[pivot_row, k]]
             P[[k, pivot_row]] = P[[pivot_row, k]]
@@ -28,17 +120,267 @@ def lu_decomposition(A, progress_callback):
         progress = (k + 1) / n * 100
         if k % (n // 20 or 1) == 0 or k == n - 1: 
             progress_callback(progress) 
+        if checkpoint and k < n - 1:
+            checkpoint.maybe_save(n, k + 1, "lu", lambda: dict(
+                L=L[:, :k + 1], U=U[:k + 1], trailing=A_copy[k + 1:, k + 1:], perm=np.argmax(P, axis=1),
+            ))
             
     return L, U, P
 
 
-def solve_lu_system(matrix_path, vector_path, progress_callback, save_matrices=False):
+def cholesky_decomposition(A, progress_callback, pivot_tol=DEFAULT_PIVOT_TOLERANCE, workspace=None, checkpoint=None):
+    """A = L L^T для симетричної додатно визначеної A (читається лише нижній трикутник).
+    Удвічі менше операцій і пам'яті, ніж LU, без перестановок. Якщо діагональний елемент
+    стає недодатним, кидає NotPositiveDefiniteError — тоді потрібен LU."""
+    n = A.shape[0]
+    check_trivial_singularity(A)
+    diagonal = np.diagonal(A)
+    if n and diagonal.min() <= 0:
+        raise NotPositiveDefiniteError(f"Діагональний елемент {int(np.argmin(diagonal)) + 1} недодатний.")
+    pivot_threshold = pivot_tol * (np.max(np.abs(A)) if n else 0.0)
+    L = workspace.zeros((n, n)) if workspace is not None else np.zeros((n, n))
+    start_column = 0
+    state = checkpoint.load(n, "cholesky") if checkpoint else None
+    if state is not None:
+        start_column = int(state['k'])
+        L[:, :start_column] = state['L']
+    progress_callback(start_column / n * 100 if n else 0)
+
+    for k in range(start_column, n):
+        # Лівосторонній варіант: стовпець k оновлюється вже готовими стовпцями 0..k-1.
+        pivot = A[k, k] - L[k, :k] @ L[k, :k]
+        if pivot <= pivot_threshold:
+            raise NotPositiveDefiniteError(f"Діагональний елемент у стовпці {k + 1} недодатний ({pivot:.3e}).")
+        L[k, k] = np.sqrt(pivot)
+        L[k + 1:, k] = (A[k + 1:, k] - L[k + 1:, :k] @ L[k, :k]) / L[k, k]
+
+        if k % (n // 20 or 1) == 0 or k == n - 1:
+            progress_callback((k + 1) / n * 100)
+        if checkpoint and k < n - 1:
+            checkpoint.maybe_save(n, k + 1, "cholesky", lambda: dict(L=L[:, :k + 1]))
+
+    return L
+
+
+def forward_substitution(L, b, unit_diagonal=False):
+    n = L.shape[0]
+    y = np.zeros(b.shape, dtype=np.result_type(L, b))
+    for i in range(n):
+        y[i] = b[i] - L[i, :i] @ y[:i]
+        if not unit_diagonal:
+            y[i] /= L[i, i]
+    return y
+
+
+def back_substitution(U, y, unit_diagonal=False):
+    n = U.shape[0]
+    x = np.zeros(y.shape, dtype=np.result_type(U, y))
+    for i in range(n - 1, -1, -1):
+        x[i] = y[i] - U[i, i + 1:] @ x[i + 1:]
+        if not unit_diagonal:
+            x[i] /= U[i, i]
+    return x
+
+
+def lu_solve(L, U, P, b):
+    y = forward_substitution(L, P @ b, unit_diagonal=True)
+    return back_substitution(U, y)
+
+
+def cholesky_solve(L, b):
+    return back_substitution(L.T, forward_substitution(L, b))
+
+
+def lu_solve_transposed(L, U, P, c):
+    # A = P^T L U  =>  A^T z = c  <=>  U^T w = c, L^T v = w, z = P^T v
+    w = forward_substitution(U.T, c)
+    v = back_substitution(L.T, w, unit_diagonal=True)
+    return P.T @ v
+
+
+def permutation_sign(perm):
+    """Знак перестановки: (-1)^(n - кількість циклів)."""
+    seen = np.zeros(len(perm), dtype=bool)
+    cycles = 0
+    for start in range(len(perm)):
+        if seen[start]:
+            continue
+        cycles += 1
+        j = start
+        while not seen[j]:
+            seen[j] = True
+            j = perm[j]
+    return -1 if (len(perm) - cycles) % 2 else 1
+
+
+class ResidentFactors:
+    """Готовий розклад A: L (Холецький) або L, U і вектор перестановки рядків (LU).
+    Його тримає в пам'яті резидентна сесія і зберігає у factors.npz задача з keep_factors."""
+
+    def __init__(self, method, L, U=None, perm=None):
+        self.method = method
+        self.L = L
+        self.U = U
+        self.perm = perm
+        self.n = L.shape[0]
+
+    @classmethod
+    def factorize(cls, A, symmetric=False, pivot_tol=None, progress_callback=None):
+        progress_callback = progress_callback or (lambda percentage: None)
+        kwargs = {"pivot_tol": pivot_tol} if pivot_tol is not None else {}
+        if symmetric:
+            try:
+                return cls("cholesky", cholesky_decomposition(A, progress_callback, **kwargs))
+            except NotPositiveDefiniteError:
+                pass
+        L, U, P = lu_decomposition(A, progress_callback, **kwargs)
+        return cls.from_lu(L, U, P)
+
+    @classmethod
+    def from_lu(cls, L, U, P):
+        # Щільна P займає ще n² — достатньо вектора перестановки.
+        return cls("lu", L, U, np.argmax(P, axis=1))
+
+    @classmethod
+    def load(cls, path):
+        """Повертає (factors, extra), де extra — інші масиви, збережені разом із розкладом."""
+        with np.load(path) as data:
+            arrays = {key: data[key] for key in data.files}
+        factors = cls(str(arrays.pop("method")), arrays.pop("L"), arrays.pop("U", None), arrays.pop("perm", None))
+        return factors, arrays
+
+    def save(self, path, **extra):
+        arrays = {key: value for key, value in (("U", self.U), ("perm", self.perm)) if value is not None}
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, method=self.method, L=self.L, **arrays, **extra)
+        os.replace(tmp_path, path)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.L, self.U, self.perm) if array is not None)
+
+    def solve(self, b):
+        if self.method == "cholesky":
+            return cholesky_solve(self.L, b)
+        return back_substitution(self.U, forward_substitution(self.L, b[self.perm], unit_diagonal=True))
+
+    def solve_transposed(self, c):
+        if self.method == "cholesky":
+            return self.solve(c)
+        v = back_substitution(self.L.T, forward_substitution(self.U.T, c), unit_diagonal=True)
+        z = np.empty_like(v)
+        z[self.perm] = v
+        return z
+
+    def slogdet(self):
+        """(знак, ln|det A|) з діагоналі розкладу — без переповнення, яке дав би добуток діагоналі."""
+        if self.method == "cholesky":
+            return 1, 2.0 * float(np.sum(np.log(np.diagonal(self.L))))
+        diagonal = np.diagonal(self.U)
+        # PA = LU, det L = 1, det P = det Pᵀ = ±1.
+        sign = permutation_sign(self.perm) * int(np.prod(np.sign(diagonal)))
+        return sign, float(np.sum(np.log(np.abs(diagonal))))
+
+
+def estimate_inverse_norm_1(solve, solve_transposed, n, max_iter=5):
+    # Оцінювач Хейгера/Хайема для ||A^-1||_1: лише O(n^2) розв'язки з готовим розкладом.
+    if n == 0:
+        return 0.0
+    x = np.full(n, 1.0 / n)
+    estimate = 0.0
+    for iteration in range(max_iter):
+        y = solve(x)
+        new_estimate = np.abs(y).sum()
+        if iteration > 0 and new_estimate <= estimate:
+            break
+        estimate = new_estimate
+        xi = np.where(y >= 0, 1.0, -1.0)
+        z = solve_transposed(xi)
+        j = int(np.argmax(np.abs(z)))
+        if iteration > 0 and abs(z[j]) <= z @ x:
+            break
+        x = np.zeros(n)
+        x[j] = 1.0
+    alternating = np.array([(-1) ** i * (1 + i / max(n - 1, 1)) for i in range(n)])
+    alternating_estimate = 2 * np.abs(solve(alternating)).sum() / (3 * n)
+    return max(estimate, alternating_estimate)
+
+
+def verify_solution(A, b, x, solve, solve_transposed):
+    b_norm = np.linalg.norm(b)
+    residual = np.linalg.norm(A @ x - b)
+    residual_norm = residual / b_norm if b_norm > 0 else residual
+    inverse_norm = estimate_inverse_norm_1(solve, solve_transposed, A.shape[0])
+    condition_number = np.linalg.norm(A, 1) * inverse_norm
+    return {
+        "residual_norm": float(residual_norm),
+        "condition_number": float(condition_number),
+    }
+
+
+def batched_lu_factor(A, pivot_tol=DEFAULT_PIVOT_TOLERANCE):
+    """LU з частковим вибором головного елемента для стеку (k, n, n): один цикл по стовпцях
+    для всіх k систем. Повертає упакований LU (L з одиничною діагоналлю під U), перестановки
+    рядків і маску вироджених систем."""
+    LU = np.array(A, dtype=np.float64, copy=True)
+    k, n, _ = LU.shape
+    batch = np.arange(k)
+    perm = np.tile(np.arange(n), (k, 1))
+    scale = np.abs(LU).max(axis=(1, 2)) if n else np.zeros(k)
+    singular = scale == 0
+    for j in range(n):
+        pivot_rows = np.argmax(np.abs(LU[:, j:, j]), axis=1) + j
+        row_j = LU[batch, j].copy()
+        LU[batch, j] = LU[batch, pivot_rows]
+        LU[batch, pivot_rows] = row_j
+        perm_j = perm[batch, j].copy()
+        perm[batch, j] = perm[batch, pivot_rows]
+        perm[batch, pivot_rows] = perm_j
+        pivots = LU[:, j, j]
+        small = np.abs(pivots) <= pivot_tol * scale
+        singular |= small
+        LU[:, j + 1:, j] /= np.where(small, 1.0, pivots)[:, None]
+        LU[:, j + 1:, j + 1:] -= LU[:, j + 1:, j, None] * LU[:, j, None, j + 1:]
+    return LU, perm, singular
+
+
+def batched_lu_solve(LU, perm, b):
+    k, n, _ = LU.shape
+    x = np.take_along_axis(np.asarray(b, dtype=np.float64), perm, axis=1)
+    for i in range(n):
+        x[:, i] -= np.einsum('kj,kj->k', LU[:, i, :i], x[:, :i])
+    diagonal = np.diagonal(LU, axis1=1, axis2=2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in range(n - 1, -1, -1):
+            x[:, i] = (x[:, i] - np.einsum('kj,kj->k', LU[:, i, i + 1:], x[:, i + 1:])) / diagonal[:, i]
+    return x
+
+
+def batched_verify(A, b, x):
+    b_norm = np.linalg.norm(b, axis=1)
+    residual = np.linalg.norm(np.einsum('kij,kj->ki', A, x) - b, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        residual_norm = np.where(b_norm > 0, residual / b_norm, residual)
+        # Для n <= MICRO_BATCH_MAX_N точне cond_1 через пакетний inv дешевше за оцінювач по одній системі.
+        condition_number = np.linalg.cond(A, 1)
+    return residual_norm, condition_number
+
+def solve_lu_system(matrix_path, vector_path, progress_callback, save_matrices=False,
+                    verify=False, pivot_tol=DEFAULT_PIVOT_TOLERANCE, workspace=None, timings=None, checkpoint=None,
+                    symmetric=False, factors_path=None, arrays=None):
+    """Повертає (x, files_to_save, metrics, factorization), де factorization — "cholesky" або "lu".
+    Якщо задано factors_path, розклад зберігається туди (див. ResidentFactors.load).
+    arrays — уже розібрані (A, b): тоді файли matrix_path/vector_path не читаються."""
     try:
         progress_callback("Завантаження даних", 0)
         start_time = time.time()
+        timings = timings if timings is not None else {}
         
-        A = np.loadtxt(matrix_path)
-        b = np.loadtxt(vector_path)
+        if arrays is not None:
+            A, b = arrays
+        else:
+            A = np.loadtxt(matrix_path, ndmin=2)
+            b = np.loadtxt(vector_path, ndmin=1)
         
         n = A.shape[0]
         if A.shape != (n, n) or b.shape != (n,):
@@ -47,16 +389,42 @@ def solve_lu_system(matrix_path, vector_path, progress_callback, save_matrices=F
         def lu_progress_callback(percentage):
             scaled_percentage = percentage * 0.8 
             progress_callback("LU розклад", scaled_percentage)
-        
-        L, U, P = lu_decomposition(A, lu_progress_callback)
-        progress_callback("LU розклад", 80)
 
-        Pb = np.dot(P, b)
-        y = np.linalg.solve(L, Pb)
+        def cholesky_progress_callback(percentage):
+            progress_callback("Розклад Холецького", percentage * 0.8)
         
-        progress_callback("Розв'язання системи", 90)
-        x = np.linalg.solve(U, y)
-        progress_callback("Розв'язання системи", 100)
+        timings['load'] = time.time() - start_time
+        stage_started = time.time()
+        factorization = "lu"
+        if symmetric:
+            try:
+                L = cholesky_decomposition(A, cholesky_progress_callback, pivot_tol=pivot_tol, workspace=workspace, checkpoint=checkpoint)
+                factorization = "cholesky"
+            except NotPositiveDefiniteError as e:
+                progress_callback(f"Матриця не додатно визначена ({e}) — перехід до LU", 0)
+        if factorization == "cholesky":
+            solve = lambda v: cholesky_solve(L, v)
+            # A симетрична, тож A^T z = c розв'язується тим самим розкладом.
+            solve_transposed = solve
+        else:
+            L, U, P = lu_decomposition(A, lu_progress_callback, pivot_tol=pivot_tol, workspace=workspace, checkpoint=checkpoint)
+            solve = lambda v: lu_solve(L, U, P, v)
+            solve_transposed = lambda v: lu_solve_transposed(L, U, P, v)
+        timings['factorization'] = time.time() - stage_started
+        if factors_path:
+            factors = ResidentFactors("cholesky", L) if factorization == "cholesky" else ResidentFactors.from_lu(L, U, P)
+            factors.save(factors_path)
+        progress_callback("Розклад Холецького" if factorization == "cholesky" else "LU розклад", 80)
+
+        stage_started = time.time()
+        x = solve(b)
+        timings['solve'] = time.time() - stage_started
+        progress_callback("Розв'язання системи", 90 if verify else 100)
+
+        metrics = {}
+        if verify:
+            metrics = verify_solution(A, b, x, solve=solve, solve_transposed=solve_transposed)
+            progress_callback("Перевірка розв'язку", 100)
         end_time = time.time()
         progress_callback(f"Завершено за {end_time - start_time:.2f} c.", 100)
 
@@ -64,12 +432,17 @@ def solve_lu_system(matrix_path, vector_path, progress_callback, save_matrices=F
         if save_matrices:
             base_dir = os.path.dirname(matrix_path)
             np.savetxt(os.path.join(base_dir, "L.txt"), L)
-            np.savetxt(os.path.join(base_dir, "U.txt"), U)
-            np.savetxt(os.path.join(base_dir, "P.txt"), P)
-            files_to_save = {"L": "L.txt", "U": "U.txt", "P": "P.txt"}
-        return x, files_to_save
+            files_to_save = {"L": "L.txt"}
+            if factorization == "lu":
+                np.savetxt(os.path.join(base_dir, "U.txt"), U)
+                np.savetxt(os.path.join(base_dir, "P.txt"), P)
+                files_to_save.update(U="U.txt", P="P.txt")
+        return x, files_to_save, metrics, factorization
 
     except np.linalg.LinAlgError as e:
         raise Exception(f"Матриця сингулярна або вироджена. {e}")
+    except (SoftTimeLimitExceeded, InterruptedError):
+        # Ці винятки обробляє сама задача (ліміт часу, скасування) — не загортаємо їх.
+        raise
     except Exception as e:
-        raise Exception(f"Помилка під час обчислень: {e}")
\ No newline at end of file
+        raise Exception(f"Помилка під час обчислень: {e}")
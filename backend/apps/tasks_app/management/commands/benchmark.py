@@ -0,0 +1,113 @@
+import contextlib
+import io
+import json
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from apps.tasks_app.benchmarking import (
+    MATRIX_CLASSES, SOLVER_ENGINES, compare_reports, environment_info,
+    run_e2e_suite, run_io_suite, run_solver_suite,
+)
+from config.celery import app as celery_app
+
+SUITES = ("solver", "io", "e2e")
+BENCHMARK_USER = "benchmark"
+
+
+def int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def str_list(value):
+    return [item for item in value.split(',') if item]
+
+
+@contextlib.contextmanager
+def in_process_stack():
+    """Тестова БД, InMemoryChannelLayer і eager Celery замість Postgres/Redis/воркерів."""
+    with tempfile.TemporaryDirectory() as media_root, override_settings(
+        MEDIA_ROOT=media_root,
+        CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+        WS_UPDATE_MIN_INTERVAL=0,
+    ):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        always_eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        try:
+            # Попередження воркерів про недоступний Redis (метрики, кеш) не змішуємо зі звітом.
+            with contextlib.redirect_stdout(io.StringIO()):
+                yield
+        finally:
+            celery_app.conf.task_always_eager = always_eager
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+class Command(BaseCommand):
+    help = "Відтворюваний бенчмарк: розв'язувачі, формати вводу/виводу і наскрізне навантаження через REST + WebSocket. Результат — JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suites', type=str_list, default=list(SUITES), help="Через кому: solver,io,e2e.")
+        parser.add_argument('--engines', type=str_list, default=list(SOLVER_ENGINES))
+        parser.add_argument('--matrix-classes', type=str_list, default=list(MATRIX_CLASSES))
+        parser.add_argument('--sizes', type=int_list, default=[50, 100, 200])
+        parser.add_argument('--io-sizes', type=int_list, default=[100, 500])
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--e2e-mode', choices=['inprocess', 'live'], default='inprocess',
+                            help="inprocess: тестова БД, пам'ять замість Redis, eager Celery; live: налаштовані БД/Redis і запущені воркери.")
+        parser.add_argument('--e2e-tasks', type=int, default=20)
+        parser.add_argument('--e2e-sizes', type=int_list, default=[20, 50, 100])
+        parser.add_argument('--e2e-timeout', type=float, default=300)
+        parser.add_argument('--output', help="Файл для JSON-звіту (за замовчуванням stdout).")
+        parser.add_argument('--compare', help="JSON-звіт попереднього прогону для пошуку регресій.")
+        parser.add_argument('--threshold', type=float, default=0.2, help="Допустиме відносне погіршення метрики.")
+
+    def handle(self, *args, **options):
+        unknown = set(options['suites']) - set(SUITES) or set(options['engines']) - set(SOLVER_ENGINES) \
+            or set(options['matrix_classes']) - set(MATRIX_CLASSES)
+        if unknown:
+            raise CommandError(f"Unknown benchmark option(s): {', '.join(sorted(unknown))}")
+        report = {"environment": environment_info(), "started_at": time.time(), "options": {
+            key: options[key] for key in ('suites', 'engines', 'matrix_classes', 'sizes', 'io_sizes', 'repeat', 'seed',
+                                          'e2e_mode', 'e2e_tasks', 'e2e_sizes')
+        }}
+        if 'solver' in options['suites']:
+            self.stderr.write("Running solver suite...")
+            report["solver"] = run_solver_suite(options['engines'], options['matrix_classes'], options['sizes'], options['repeat'], options['seed'])
+        if 'io' in options['suites']:
+            self.stderr.write("Running I/O suite...")
+            report["io"] = run_io_suite(options['io_sizes'], options['repeat'], options['seed'])
+        if 'e2e' in options['suites']:
+            self.stderr.write(f"Running end-to-end suite ({options['e2e_mode']})...")
+            report["e2e"] = {"mode": options['e2e_mode'], **self.run_e2e(options)}
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                report["regressions"] = compare_reports(json.load(f), report, options['threshold'])
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stderr.write(f"Report written to {options['output']}")
+        else:
+            self.stdout.write(output)
+        if report.get("regressions"):
+            raise CommandError(f"{len(report['regressions'])} metric(s) regressed by more than {options['threshold']:.0%}.")
+
+    def run_e2e(self, options):
+        args = (options['e2e_sizes'], options['e2e_tasks'], options['e2e_timeout'], options['seed'])
+        if options['e2e_mode'] == 'live':
+            return run_e2e_suite(self.benchmark_user(), *args)
+        with in_process_stack():
+            return run_e2e_suite(self.benchmark_user(), *args)
+
+    @staticmethod
+    def benchmark_user():
+        user, _ = get_user_model().objects.get_or_create(username=BENCHMARK_USER, defaults={'email': 'benchmark@localhost'})
+        return user
@@ -0,0 +1,64 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from rest_framework.test import APIClient
+
+from apps.tasks_app.models import Task
+from apps.tasks_app.tasks import count_running_jobs
+
+
+class Command(BaseCommand):
+    help = "Латентність запиту до API і диспетчеризації черги з постійними з'єднаннями та без них."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--username', help="Користувач для запитів до /api/tasks/ (за замовчуванням перший).")
+
+    def handle(self, *args, **options):
+        db = connection.settings_dict
+        self.stdout.write(f"Database {db['HOST']}:{db['PORT']} (CONN_MAX_AGE={db['CONN_MAX_AGE']}, "
+                          f"server-side cursors {'off' if db.get('DISABLE_SERVER_SIDE_CURSORS') else 'on'})")
+        user_model = get_user_model()
+        user = user_model.objects.filter(username=options['username']).first() if options['username'] else user_model.objects.first()
+        configured_max_age = db['CONN_MAX_AGE']
+        for label, max_age in (("no reuse", 0), ("persistent", configured_max_age if configured_max_age else 600)):
+            connection.close()
+            db['CONN_MAX_AGE'] = max_age
+            dispatch = self.measure(options['iterations'], self.dispatch_once)
+            request = self.measure(options['iterations'], lambda: self.request_once(user)) if user else None
+            self.report(label, "dispatch", dispatch)
+            if request:
+                self.report(label, "GET /api/tasks/", request)
+        connection.close()
+        db['CONN_MAX_AGE'] = configured_max_age
+
+    @staticmethod
+    def dispatch_once():
+        # Те саме, що робить коротка задача try_run_next_task_from_queue; Celery між задачами викликає close_old_connections.
+        close_old_connections()
+        count_running_jobs()
+        Task.objects.filter(status=Task.Status.QUEUED).order_by('created_at').first()
+        close_old_connections()
+
+    @staticmethod
+    def request_once(user):
+        client = APIClient()
+        client.force_authenticate(user)
+        client.get('/api/tasks/', HTTP_HOST='localhost')
+
+    @staticmethod
+    def measure(iterations, func):
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - started) * 1000)
+        return samples
+
+    def report(self, label, name, samples):
+        samples = sorted(samples)
+        p95 = samples[int(len(samples) * 0.95) - 1]
+        self.stdout.write(f"{label:>10} {name:<16} p50 {statistics.median(samples):7.2f} ms  p95 {p95:7.2f} ms")
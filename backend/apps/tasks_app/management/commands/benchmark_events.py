@@ -0,0 +1,96 @@
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.core.management.base import BaseCommand
+
+from apps.tasks_app.events import EventPublisher
+from apps.tasks_app.lu_solver import solve_lu_system
+from apps.tasks_app.models import ALL_TASKS_GROUP
+
+
+class SlowChannelLayer:
+    """Обгортка над channel layer, що додає затримку мережі до кожного group_send."""
+
+    def __init__(self, layer, latency):
+        self.layer = layer
+        self.latency = latency
+
+    async def group_send(self, group, message):
+        await asyncio.sleep(self.latency)
+        await self.layer.group_send(group, message)
+
+
+class Command(BaseCommand):
+    help = "Порівнює час розв'язання LU без публікації подій, з синхронною та з фоновою публікацією."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=600)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--in-memory', action='store_true', help="InMemoryChannelLayer замість налаштованого (Redis).")
+        parser.add_argument('--latency-ms', type=float, default=0.0, help="Штучна затримка кожного group_send.")
+
+    def handle(self, *args, **options):
+        n = options['size']
+        layer = InMemoryChannelLayer() if options['in_memory'] else get_channel_layer()
+        if options['latency_ms']:
+            layer = SlowChannelLayer(layer, options['latency_ms'] / 1000.0)
+        rng = np.random.default_rng(0)
+        A = rng.random((n, n)) + n * np.eye(n)
+        b = rng.random(n)
+        with tempfile.TemporaryDirectory() as tmp:
+            matrix_path = os.path.join(tmp, 'A.txt')
+            vector_path = os.path.join(tmp, 'b.txt')
+            np.savetxt(matrix_path, A)
+            np.savetxt(vector_path, b)
+            results = {}
+            for mode in ('none', 'sync', 'async'):
+                publisher = EventPublisher(channel_layer=layer) if mode == 'async' else None
+                if publisher:
+                    publisher.start()
+                samples = []
+                events = 0
+                for _ in range(options['repeat']):
+                    counter = [0]
+                    callback = self.make_callback(mode, layer, publisher, counter)
+                    started = time.perf_counter()
+                    solve_lu_system(matrix_path, vector_path, progress_callback=callback, verify=False)
+                    samples.append(time.perf_counter() - started)
+                    events = counter[0]
+                if publisher:
+                    publisher.stop()
+                    self.stdout.write(f"  async publisher: {publisher.stats()}")
+                results[mode] = samples
+                self.stdout.write(
+                    f"{mode:>5}: median {statistics.median(samples):.3f}s, "
+                    f"min {min(samples):.3f}s, events/run {events}"
+                )
+        baseline = statistics.median(results['none'])
+        for mode in ('sync', 'async'):
+            overhead = statistics.median(results[mode]) - baseline
+            self.stdout.write(f"{mode} overhead: {overhead * 1000:.1f} ms ({overhead / baseline * 100:.1f}%)")
+
+    @staticmethod
+    def make_callback(mode, layer, publisher, counter):
+        task_id = 'benchmark'
+
+        def callback(stage, percentage):
+            counter[0] += 1
+            if mode == 'none':
+                return
+            event = {
+                'type': 'task_update', 'task_id': task_id, 'status': 'running',
+                'stage': stage, 'percentage': percentage, 'log_message': None,
+            }
+            groups = (f"task_{task_id}", ALL_TASKS_GROUP)
+            if mode == 'sync':
+                for group in groups:
+                    async_to_sync(layer.group_send)(group, event)
+            else:
+                publisher.publish(groups, event)
+        return callback
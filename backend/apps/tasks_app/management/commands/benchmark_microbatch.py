@@ -0,0 +1,52 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.tasks_app.lu_solver import solve_lu_system, batched_lu_factor, batched_lu_solve, batched_verify
+
+
+class Command(BaseCommand):
+    help = "Порівнює пропускну здатність (задач/с): одна задача на завдання проти мікропакета."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=50)
+        parser.add_argument('--count', type=int, default=256)
+        parser.add_argument('--batch-size', type=int, default=64)
+
+    def handle(self, *args, **options):
+        n, count, batch_size = options['size'], options['count'], options['batch_size']
+        rng = np.random.default_rng(0)
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for i in range(count):
+                matrix_path = os.path.join(tmp, f'A{i}.txt')
+                vector_path = os.path.join(tmp, f'b{i}.txt')
+                np.savetxt(matrix_path, rng.random((n, n)) + n * np.eye(n), fmt='%.18e')
+                np.savetxt(vector_path, rng.random(n), fmt='%.18e')
+                paths.append((matrix_path, vector_path))
+
+            started = time.perf_counter()
+            for i, (matrix_path, vector_path) in enumerate(paths):
+                x, _, _, _ = solve_lu_system(matrix_path, vector_path, progress_callback=lambda stage, percentage: None, verify=True)
+                np.savetxt(os.path.join(tmp, f'x_single{i}.txt'), x, fmt='%.18e')
+            single_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for offset in range(0, count, batch_size):
+                chunk = paths[offset:offset + batch_size]
+                A = np.stack([np.loadtxt(matrix_path, ndmin=2) for matrix_path, _ in chunk])
+                b = np.stack([np.loadtxt(vector_path, ndmin=1) for _, vector_path in chunk])
+                LU, perm, singular = batched_lu_factor(A)
+                X = batched_lu_solve(LU, perm, b)
+                batched_verify(A, b, X)
+                for i, x in enumerate(X):
+                    np.savetxt(os.path.join(tmp, f'x_batch{offset + i}.txt'), x, fmt='%.18e')
+            batch_seconds = time.perf_counter() - started
+
+        self.stdout.write(f"n={n}, tasks={count}, batch size={batch_size}")
+        self.stdout.write(f"one task per job: {count / single_seconds:.1f} tasks/s ({single_seconds:.2f}s)")
+        self.stdout.write(f"micro-batch:      {count / batch_seconds:.1f} tasks/s ({batch_seconds:.2f}s)")
+        self.stdout.write(f"speedup: {single_seconds / batch_seconds:.1f}x (solver and file I/O only; Celery, DB and WebSocket overhead per task come on top)")
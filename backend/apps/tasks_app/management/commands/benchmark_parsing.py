@@ -0,0 +1,50 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.tasks_app.parsing import parse_augmented_file_parallel, parse_augmented_matrix
+
+
+class Command(BaseCommand):
+    help = "Порівнює швидкість розбору (МБ/с) текстової [A|b]: np.loadtxt проти паралельного парсера з різною кількістю процесів."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=2000)
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+        parser.add_argument('--repeat', type=int, default=2)
+
+    def handle(self, *args, **options):
+        n, repeat = options['size'], options['repeat']
+        rng = np.random.default_rng(0)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'system.txt')
+            out_path = os.path.join(tmp, 'parsed.npy')
+            expected = rng.standard_normal((n, n + 1))
+            np.savetxt(path, expected, fmt='%.18e')
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            self.stdout.write(f"n={n}, file {size_mb:.1f} MB, {os.cpu_count()} CPU(s)")
+
+            def best_of(parse):
+                seconds = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    A, b = parse()
+                    seconds.append(time.perf_counter() - started)
+                if not (np.array_equal(A, expected[:, :-1]) and np.array_equal(b, expected[:, -1])):
+                    raise AssertionError("parsed matrix differs from the source")
+                return min(seconds)
+
+            def loadtxt():
+                with open(path) as stream:
+                    return parse_augmented_matrix(stream, n)
+
+            baseline = best_of(loadtxt)
+            self.stdout.write(f"np.loadtxt:            {size_mb / baseline:7.1f} MB/s ({baseline:.2f}s)")
+            for workers in options['workers']:
+                seconds = best_of(lambda: parse_augmented_file_parallel(path, n, workers, out_path))
+                self.stdout.write(
+                    f"parallel, {workers:2d} process(es): {size_mb / seconds:7.1f} MB/s ({seconds:.2f}s, {baseline / seconds:.1f}x)"
+                )
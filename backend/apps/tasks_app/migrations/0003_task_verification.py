@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks_app', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='condition_number',
+            field=models.FloatField(blank=True, help_text='Оцінка числа обумовленості cond_1(A)', null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='residual_norm',
+            field=models.FloatField(blank=True, help_text="Відносна нев'язка ||Ax-b|| / ||b||", null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='verify_solution',
+            field=models.BooleanField(default=True, help_text="Перевірити розв'язок (нев'язка, число обумовленості)?"),
+        ),
+    ]
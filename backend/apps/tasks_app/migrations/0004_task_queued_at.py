@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks_app', '0003_task_verification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
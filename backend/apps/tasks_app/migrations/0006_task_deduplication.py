@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks_app', '0005_task_batch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='deduplicated_from',
+            field=models.ForeignKey(blank=True, help_text="Задача, чий розв'язок використано", null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='tasks_app.task'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='input_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='SHA-256 розібраної системи (A, b)', max_length=64, null=True),
+        ),
+    ]
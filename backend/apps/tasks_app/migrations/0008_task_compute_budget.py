@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks_app', '0007_task_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, help_text="Кількість спроб виконання розв'язувачем"),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='compute_seconds',
+            field=models.FloatField(default=0.0, help_text='Сумарний час обчислень за всі спроби, с'),
+        ),
+    ]
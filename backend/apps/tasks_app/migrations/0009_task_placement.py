@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks_app', '0008_task_compute_budget'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='dispatched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='worker_node',
+            field=models.CharField(blank=True, help_text='Вузол Celery, на якому зарезервовано ресурси', max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks_app', '0009_task_placement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='factorization',
+            field=models.CharField(blank=True, choices=[('lu', 'LU'), ('cholesky', 'Холецький')], help_text='Використаний розклад', max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='matrix_symmetric',
+            field=models.BooleanField(blank=True, help_text='Чи симетрична матриця A (визначається під час парсингу)', null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks_app', '0010_task_factorization'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='engine',
+            field=models.CharField(choices=[('direct', 'Прямий (LU / Холецький)'), ('iterative', 'Ітераційний (методи Крилова)')], default='direct', help_text="Рушій розв'язання", max_length=20),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='iterations',
+            field=models.PositiveIntegerField(blank=True, help_text='Кількість ітерацій ітераційного методу', null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='solver_options',
+            field=models.JSONField(blank=True, default=dict, help_text='Параметри ітераційного рушія (method, preconditioner, tol, max_iter, restart)'),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='factorization',
+            field=models.CharField(blank=True, choices=[('lu', 'LU'), ('cholesky', 'Холецький'), ('gmres', 'GMRES'), ('cg', 'CG'), ('bicgstab', 'BiCGSTAB')], help_text="Використаний метод розв'язання", max_length=20, null=True),
+        ),
+    ]
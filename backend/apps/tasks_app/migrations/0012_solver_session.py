@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:20
+
+import apps.tasks_app.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks_app', '0011_task_solver_engine'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolverSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(db_index=True, default=uuid.uuid4, editable=False, unique=True)),
+                ('matrix_file', models.FileField(blank=True, help_text='Файл з матрицею A', null=True, upload_to=apps.tasks_app.models.task_upload_path)),
+                ('matrix_size', models.IntegerField(blank=True, help_text='Розмірність матриці (N)', null=True)),
+                ('matrix_symmetric', models.BooleanField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('starting', 'Запуск'), ('ready', 'Готова'), ('closed', 'Закрита'), ('failed', 'Помилка')], default='starting', max_length=20)),
+                ('factorization', models.CharField(blank=True, choices=[('lu', 'LU'), ('cholesky', 'Холецький'), ('gmres', 'GMRES'), ('cg', 'CG'), ('bicgstab', 'BiCGSTAB')], max_length=20, null=True)),
+                ('idle_timeout_sec', models.PositiveIntegerField(default=300, help_text='Сесія закривається після стількох секунд без запитів')),
+                ('celery_task_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('worker_node', models.CharField(blank=True, max_length=255, null=True)),
+                ('solves', models.PositiveIntegerField(default=0, help_text="Кількість розв'язаних правих частин")),
+                ('message', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('ready_at', models.DateTimeField(blank=True, null=True)),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='solver_sessions', to=settings.AUTH_USER_MODEL)),
+                ('source_task', models.ForeignKey(blank=True, help_text='Задача, з якої взято матрицю A', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sessions', to='tasks_app.task')),
+            ],
+        ),
+    ]
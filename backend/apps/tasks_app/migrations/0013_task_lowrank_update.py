@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:26
+
+import apps.tasks_app.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks_app', '0012_solver_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='base_task',
+            field=models.ForeignKey(blank=True, help_text='Задача, розклад якої оновлюється', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='derived_tasks', to='tasks_app.task'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='factors_file',
+            field=models.FileField(blank=True, help_text='Збережений розклад A (.npz)', null=True, upload_to=apps.tasks_app.models.task_upload_path),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='keep_factors',
+            field=models.BooleanField(default=False, help_text='Зберегти розклад A для подальших малорангових змін матриці'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='update_rank',
+            field=models.PositiveIntegerField(blank=True, help_text='Ранг зміни A відносно базової задачі', null=True),
+        ),
+        migrations.AlterField(
+            model_name='solversession',
+            name='factorization',
+            field=models.CharField(blank=True, choices=[('lu', 'LU'), ('cholesky', 'Холецький'), ('gmres', 'GMRES'), ('cg', 'CG'), ('bicgstab', 'BiCGSTAB'), ('woodbury', 'Оновлення розкладу (Вудбері)')], max_length=20, null=True),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='factorization',
+            field=models.CharField(blank=True, choices=[('lu', 'LU'), ('cholesky', 'Холецький'), ('gmres', 'GMRES'), ('cg', 'CG'), ('bicgstab', 'BiCGSTAB'), ('woodbury', 'Оновлення розкладу (Вудбері)')], help_text="Використаний метод розв'язання", max_length=20, null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:28
+
+import apps.tasks_app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks_app', '0013_task_lowrank_update'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='determinant_sign',
+            field=models.SmallIntegerField(blank=True, help_text='Знак det A', null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='inverse_file',
+            field=models.FileField(blank=True, help_text='A⁻¹ (.npy)', null=True, upload_to=apps.tasks_app.models.task_upload_path),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='log_abs_determinant',
+            field=models.FloatField(blank=True, help_text='ln|det A|', null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='matrix_solution_file',
+            field=models.FileField(blank=True, help_text='X для AX = B (.npy)', null=True, upload_to=apps.tasks_app.models.task_upload_path),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='products',
+            field=models.JSONField(blank=True, default=list, help_text='Похідні величини з розкладу: determinant, inverse, matrix_solve'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks_app', '0014_task_factorization_products'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='task',
+            name='verify_solution',
+            field=models.BooleanField(default=False, help_text="Перевірити розв'язок (нев'язка, число обумовленості)?"),
+        ),
+    ]
@@ -1,15 +1,63 @@
 from datetime import timedelta
 import uuid
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.utils import timezone
 import os
+import threading
+import time
 from django.db.models import Q
 
+ALL_TASKS_GROUP = "tasks_all"
+# Задачі, чий прогрес або логи змінилися, але версію ще не збільшено (див. Task.touch_coalesced).
+_pending_touches = set()
+_touch_state = {"flushed_at": 0.0, "lock": threading.Lock()}
+
 def task_upload_path(instance, filename):
     return f'tasks/{instance.uuid}/{filename}'
 
+class TaskBatch(models.Model):
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, db_index=True)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='task_batches')
+    name = models.CharField(max_length=255, default="Пакет задач LU")
+    total_tasks = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    def __str__(self):
+        return f'TaskBatch {self.id} ({self.total_tasks} tasks) by {self.owner.username}'
+
+    def get_status_counts(self):
+        rows = self.tasks.values('status').annotate(count=models.Count('id'))
+        return {row['status']: row['count'] for row in rows}
+
+    def get_progress(self):
+        counts = self.get_status_counts()
+        finished = sum(counts.get(s, 0) for s in [Task.Status.COMPLETED, Task.Status.FAILED, Task.Status.CANCELLED])
+        return {
+            "status_counts": counts,
+            "finished": finished,
+            "percentage": round(finished / self.total_tasks * 100, 1) if self.total_tasks else 100.0,
+        }
+
 class Task(models.Model):
+    PRODUCTS = ('determinant', 'inverse', 'matrix_solve')
+    # Усе, що задача-дублікат переймає від лідера: результат, метод розв'язання і похідні величини.
+    RESULT_FIELDS = (
+        'result_file', 'factors_file', 'inverse_file', 'matrix_solution_file', 'factorization', 'iterations',
+        'matrix_symmetric', 'residual_norm', 'condition_number', 'determinant_sign', 'log_abs_determinant',
+    )
+
+    class Engine(models.TextChoices):
+        DIRECT = 'direct', 'Прямий (LU / Холецький)'
+        ITERATIVE = 'iterative', 'Ітераційний (методи Крилова)'
+
+    class Factorization(models.TextChoices):
+        LU = 'lu', 'LU'
+        CHOLESKY = 'cholesky', 'Холецький'
+        GMRES = 'gmres', 'GMRES'
+        CG = 'cg', 'CG'
+        BICGSTAB = 'bicgstab', 'BiCGSTAB'
+        WOODBURY = 'woodbury', 'Оновлення розкладу (Вудбері)'
+
     class Status(models.TextChoices):
         PENDING = 'pending', 'В очікуванні'
         QUEUED = 'queued', 'В черзі'
@@ -20,6 +68,7 @@ class Task(models.Model):
 
     uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, db_index=True)
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='tasks')
+    batch = models.ForeignKey(TaskBatch, on_delete=models.CASCADE, related_name='tasks', blank=True, null=True)
     celery_task_id = models.CharField(max_length=255, blank=True, null=True, db_index=True)
     name = models.CharField(max_length=255, default="Задача LU")
     description = models.TextField(blank=True, null=True)
@@ -27,17 +76,45 @@ class Task(models.Model):
     matrix_file = models.FileField(upload_to=task_upload_path, blank=True, null=True, help_text="Файл з матрицею A")
     vector_file = models.FileField(upload_to=task_upload_path, blank=True, null=True, help_text="Файл з вектором b")
     matrix_size = models.IntegerField(blank=True, null=True, help_text="Розмірність матриці (N)")
+    matrix_symmetric = models.BooleanField(blank=True, null=True, help_text="Чи симетрична матриця A (визначається під час парсингу)")
+    engine = models.CharField(max_length=20, choices=Engine.choices, default=Engine.DIRECT, help_text="Рушій розв'язання")
+    solver_options = models.JSONField(default=dict, blank=True, help_text="Параметри ітераційного рушія (method, preconditioner, tol, max_iter, restart)")
+    factorization = models.CharField(max_length=20, choices=Factorization.choices, blank=True, null=True, help_text="Використаний метод розв'язання")
+    iterations = models.PositiveIntegerField(blank=True, null=True, help_text="Кількість ітерацій ітераційного методу")
     max_n = models.IntegerField(default=settings.MAX_MATRIX_N_SIZE, help_text="Макс. допустимий розмір N")
     save_matrices = models.BooleanField(default=False, help_text="Зберегти L, U, P матриці?")
+    keep_factors = models.BooleanField(default=False, help_text="Зберегти розклад A для подальших малорангових змін матриці")
+    factors_file = models.FileField(upload_to=task_upload_path, blank=True, null=True, help_text="Збережений розклад A (.npz)")
+    base_task = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True, related_name='derived_tasks', help_text="Задача, розклад якої оновлюється")
+    update_rank = models.PositiveIntegerField(blank=True, null=True, help_text="Ранг зміни A відносно базової задачі")
+    products = models.JSONField(default=list, blank=True, help_text="Похідні величини з розкладу: determinant, inverse, matrix_solve")
+    determinant_sign = models.SmallIntegerField(blank=True, null=True, help_text="Знак det A")
+    log_abs_determinant = models.FloatField(blank=True, null=True, help_text="ln|det A|")
+    inverse_file = models.FileField(upload_to=task_upload_path, blank=True, null=True, help_text="A⁻¹ (.npy)")
+    matrix_solution_file = models.FileField(upload_to=task_upload_path, blank=True, null=True, help_text="X для AX = B (.npy)")
+    verify_solution = models.BooleanField(default=False, help_text="Перевірити розв'язок (нев'язка, число обумовленості)?")
+    residual_norm = models.FloatField(blank=True, null=True, help_text="Відносна нев'язка ||Ax-b|| / ||b||")
+    condition_number = models.FloatField(blank=True, null=True, help_text="Оцінка числа обумовленості cond_1(A)")
     result_file = models.FileField(upload_to=task_upload_path, blank=True, null=True, help_text="Файл з результатом (вектор X)")
     result_message = models.TextField(blank=True, null=True, help_text="Повідомлення про помилку або успіх")
     created_at = models.DateTimeField(auto_now_add=True)
+    queued_at = models.DateTimeField(null=True, blank=True)
     started_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+    input_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True, help_text="SHA-256 розібраної системи (A, b)")
+    deduplicated_from = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True, related_name='duplicates', help_text="Задача, чий розв'язок використано")
+    worker_node = models.CharField(max_length=255, blank=True, null=True, help_text="Вузол Celery, на якому зарезервовано ресурси")
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0, help_text="Кількість спроб виконання розв'язувачем")
+    compute_seconds = models.FloatField(default=0.0, help_text="Сумарний час обчислень за всі спроби, с")
+    version = models.PositiveIntegerField(default=0, help_text="Лічильник змін задачі (для ETag)")
+    updated_at = models.DateTimeField(auto_now=True)
     def __str__(self):
         return f'Task {self.id} ({self.status}) by {self.owner.username}'
     def mark_status(self, status, message=None):
         self.status = status
+        if status == self.Status.QUEUED and not self.queued_at:
+            self.queued_at = timezone.now()
         if status == self.Status.RUNNING and not self.started_at:
             self.started_at = timezone.now()
         elif status in [self.Status.COMPLETED, self.Status.FAILED, self.Status.CANCELLED] and not self.completed_at:
@@ -45,12 +122,84 @@ class Task(models.Model):
         if message is not None:
             self.result_message = message
         update_fields = ['status']
+        if self.queued_at: update_fields.append('queued_at')
         if self.started_at: update_fields.append('started_at')
         if self.completed_at: update_fields.append('completed_at')
         if message is not None: update_fields.append('result_message')
 
         self.save(update_fields=update_fields)
         self.send_websocket_update()
+        if status in [self.Status.COMPLETED, self.Status.FAILED, self.Status.CANCELLED]:
+            Task.resolve_followers([self])
+
+    def copy_result_from(self, leader):
+        for field in self.RESULT_FIELDS:
+            if isinstance(self._meta.get_field(field), models.FileField):
+                getattr(self, field).name = getattr(leader, field).name
+            else:
+                setattr(self, field, getattr(leader, field))
+
+    @classmethod
+    def resolve_followers(cls, leaders):
+        """Завершує задачі, що чекали на ідентичну задачу-лідера, або передає лідерство наступній."""
+        leaders = {leader.id: leader for leader in leaders}
+        followers = list(cls.objects.filter(
+            deduplicated_from_id__in=leaders.keys(), status__in=[cls.Status.PENDING, cls.Status.QUEUED]
+        ).order_by('created_at'))
+        if not followers:
+            return False
+        now = timezone.now()
+        completed, promoted = [], {}
+        for follower in followers:
+            leader = leaders[follower.deduplicated_from_id]
+            if leader.status == cls.Status.COMPLETED and leader.result_file:
+                follower.status = cls.Status.COMPLETED
+                follower.copy_result_from(leader)
+                follower.result_message = f"Результат отримано з ідентичної задачі #{leader.id}."
+                follower.completed_at = now
+                completed.append(follower)
+            elif leader.id not in promoted:
+                promoted[leader.id] = follower
+                follower.deduplicated_from = None
+            else:
+                follower.deduplicated_from = promoted[leader.id]
+        with transaction.atomic():
+            cls.objects.bulk_update(completed, ['status', *cls.RESULT_FIELDS, 'result_message', 'completed_at'])
+            cls.objects.bulk_update([f for f in followers if f not in completed], ['deduplicated_from'])
+            TaskLog.objects.bulk_create([TaskLog(task=f, message=f.result_message) for f in completed])
+        for follower in completed:
+            follower.send_websocket_update(stage="Завершено", percentage=100)
+        return bool(promoted)
+
+    @classmethod
+    def touch(cls, task_ids):
+        """Збільшує версію задач і скидає їхній HTTP-кеш; викликається після збереження видимої клієнту зміни.
+        Заодно застосовує відкладені touch_coalesced."""
+        from .http_cache import invalidate_task_cache
+        with _touch_state["lock"]:
+            task_ids = set(task_ids) | _pending_touches
+            _pending_touches.clear()
+            _touch_state["flushed_at"] = time.monotonic()
+        if not task_ids:
+            return
+        cls.objects.filter(id__in=task_ids).update(version=models.F('version') + 1, updated_at=timezone.now())
+        transaction.on_commit(lambda: invalidate_task_cache(task_ids))
+
+    @classmethod
+    def touch_coalesced(cls, task_id):
+        """touch для прогресу й логів: не частіше ніж раз на TASK_TOUCH_COALESCE_SEC на процес, щоб UPDATE
+        і скидання кешу не стояли в циклі обчислень. Відкладене застосує наступний touch, heartbeat воркера
+        (flush_pending_touches) або кінець задачі."""
+        with _touch_state["lock"]:
+            _pending_touches.add(task_id)
+        cls.flush_pending_touches()
+
+    @classmethod
+    def flush_pending_touches(cls):
+        with _touch_state["lock"]:
+            due = bool(_pending_touches) and time.monotonic() - _touch_state["flushed_at"] >= settings.TASK_TOUCH_COALESCE_SEC
+        if due:
+            cls.touch(())
 
     def update_progress(self, stage, percentage):
         TaskProgress.objects.create(task=self, stage=stage, percentage=percentage)
@@ -60,6 +209,9 @@ class Task(models.Model):
         last_progress = self.progress_updates.last()
         if last_progress:
             return {"stage": last_progress.stage, "percentage": last_progress.percentage}
+        return self.get_default_progress()
+
+    def get_default_progress(self):
         if self.status == Task.Status.PENDING: return {"stage": "Очікування парсингу", "percentage": 0}
         if self.status == Task.Status.QUEUED: return {"stage": "В черзі", "percentage": 0}
         return {"stage": "Ініціалізація", "percentage": 0}
@@ -71,10 +223,21 @@ class Task(models.Model):
     def send_websocket_update(self, **kwargs):
         from channels.layers import get_channel_layer
         from asgiref.sync import async_to_sync
+        from apps.monitoring.prometheus import observe_current
+        from .events import all_tasks_subscribed, event_publisher
 
-        channel_layer = get_channel_layer()
+        publish_started = time.perf_counter()
+        # Прогрес і логи не змінюють саму задачу; зміни статусу та результату мають ставати видимими одразу.
+        progress_only = 'log_message' in kwargs or ('stage' in kwargs and self.status not in [self.Status.COMPLETED, self.Status.FAILED, self.Status.CANCELLED])
+        if progress_only:
+            Task.touch_coalesced(self.pk)
+        else:
+            Task.touch([self.pk])
         group_name = f"task_{self.uuid}"
-        progress = self.get_progress()
+        if 'stage' in kwargs and 'percentage' in kwargs:
+            progress = kwargs
+        else:
+            progress = self.get_progress()
         data = {
             'type': 'task_update',
             'task_id': str(self.uuid),
@@ -87,7 +250,17 @@ class Task(models.Model):
             'queue_position': self.get_queue_position() if self.status in [self.Status.QUEUED, self.Status.PENDING] else None,
             'estimated_wait_time_sec': self.get_estimated_wait_time() if self.status in [self.Status.QUEUED, self.Status.PENDING] else None,
         }
-        async_to_sync(channel_layer.group_send)(group_name, data)
+        groups = [group_name]
+        # Зміни статусу йдуть у загальний потік завжди, а прогрес і логи — лише коли його хтось слухає.
+        if not progress_only or all_tasks_subscribed():
+            groups.append(ALL_TASKS_GROUP)
+        if event_publisher.running:
+            event_publisher.publish(groups, data)
+        else:
+            channel_layer = get_channel_layer()
+            for group in groups:
+                async_to_sync(channel_layer.group_send)(group, data)
+        observe_current("lu_progress_publish_seconds", time.perf_counter() - publish_started)
 
     def get_queue_position(self):
         if self.status not in [self.Status.QUEUED, self.Status.PENDING]:
@@ -102,8 +275,12 @@ class Task(models.Model):
         position = self.get_queue_position()
         if position is None or position <= 0:
             return 0
-        avg_duration = Task.objects.filter(
-            status=self.Status.COMPLETED,
+        return self.estimate_wait_for_position(position, self.get_average_run_duration())
+
+    @classmethod
+    def get_average_run_duration(cls):
+        avg_duration = cls.objects.filter(
+            status=cls.Status.COMPLETED,
             completed_at__isnull=False,
             started_at__isnull=False
         ).aggregate(
@@ -111,6 +288,12 @@ class Task(models.Model):
         )['avg_duration']
         if not avg_duration or avg_duration.total_seconds() <= 0:
             avg_duration = timedelta(minutes=1)
+        return avg_duration
+
+    @staticmethod
+    def estimate_wait_for_position(position, avg_duration):
+        if position is None or position <= 0:
+            return 0
         active_workers = max(1, settings.MAX_ACTIVE_TASKS_GLOBAL)
         wait_cycles = (position - 1) // active_workers
         wait_time_seconds = wait_cycles * avg_duration.total_seconds()
@@ -118,6 +301,62 @@ class Task(models.Model):
         return round(wait_time_seconds)
 
 
+class SolverSession(models.Model):
+    """Резидентний розв'язувач: воркер один раз розкладає A і тримає множники в пам'яті,
+    відповідаючи на потік нових векторів b за O(n²)."""
+    class Status(models.TextChoices):
+        STARTING = 'starting', 'Запуск'
+        READY = 'ready', 'Готова'
+        CLOSED = 'closed', 'Закрита'
+        FAILED = 'failed', 'Помилка'
+
+    ACTIVE_STATUSES = [Status.STARTING, Status.READY]
+
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, db_index=True)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='solver_sessions')
+    source_task = models.ForeignKey(Task, on_delete=models.SET_NULL, blank=True, null=True, related_name='sessions', help_text="Задача, з якої взято матрицю A")
+    matrix_file = models.FileField(upload_to=task_upload_path, blank=True, null=True, help_text="Файл з матрицею A")
+    matrix_size = models.IntegerField(blank=True, null=True, help_text="Розмірність матриці (N)")
+    matrix_symmetric = models.BooleanField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.STARTING)
+    factorization = models.CharField(max_length=20, choices=Task.Factorization.choices, blank=True, null=True)
+    idle_timeout_sec = models.PositiveIntegerField(default=300, help_text="Сесія закривається після стількох секунд без запитів")
+    celery_task_id = models.CharField(max_length=255, blank=True, null=True)
+    worker_node = models.CharField(max_length=255, blank=True, null=True)
+    solves = models.PositiveIntegerField(default=0, help_text="Кількість розв'язаних правих частин")
+    message = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    ready_at = models.DateTimeField(null=True, blank=True)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+    closed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'SolverSession {self.id} ({self.status}) by {self.owner.username}'
+
+    def mark_status(self, status, message=None):
+        self.status = status
+        now = timezone.now()
+        if status == self.Status.READY:
+            self.ready_at = self.last_activity_at = now
+        elif status in [self.Status.CLOSED, self.Status.FAILED]:
+            self.closed_at = now
+        if message is not None:
+            self.message = message
+        self.save(update_fields=['status', 'ready_at', 'last_activity_at', 'closed_at', 'message', 'factorization', 'worker_node', 'celery_task_id'])
+        self.send_websocket_update()
+
+    def send_websocket_update(self):
+        from channels.layers import get_channel_layer
+        from asgiref.sync import async_to_sync
+        async_to_sync(get_channel_layer().group_send)(f"session_{self.uuid}", {
+            'type': 'session_status',
+            'session_id': str(self.uuid),
+            'status': self.status,
+            'factorization': self.factorization,
+            'message': self.message,
+        })
+
+
 class TaskProgress(models.Model):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='progress_updates')
     stage = models.CharField(max_length=100)
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .parsing import UPLOAD_CHUNK_SIZE
+
+ENCODING_EXTENSIONS = {'gzip': '.gz', 'x-gzip': '.gz', 'zstd': '.zst', 'xz': '.xz', 'identity': '.txt'}
+
+
+class CompressedMatrixParser(BaseParser):
+    """Сире тіло запиту з розширеною матрицею [A|b] (текст або gzip/zstd/xz).
+
+    Тіло потоково пишеться у тимчасовий файл і передається як source_file; розпакування
+    відбувається у воркері парсингу. Інші поля задачі беруться з query-параметрів.
+    """
+    media_type = '*/*'
+    accepted_media_types = (
+        'text/plain', 'application/octet-stream', 'application/gzip',
+        'application/x-gzip', 'application/zstd', 'application/x-xz',
+    )
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        if media_type and media_type.split(';')[0].strip() not in self.accepted_media_types:
+            raise ParseError(f"Непідтримуваний тип вмісту: {media_type}")
+        if stream is None:
+            raise ParseError("Порожнє тіло запиту.")
+        encoding = request.META.get('HTTP_CONTENT_ENCODING', 'identity').strip().lower()
+        if encoding not in ENCODING_EXTENSIONS:
+            raise ParseError(f"Непідтримуване Content-Encoding: {encoding}")
+        upload = TemporaryUploadedFile(f"upload{ENCODING_EXTENSIONS[encoding]}", media_type, 0, None)
+        size = 0
+        while True:
+            chunk = stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > settings.MAX_RAW_UPLOAD_SIZE:
+                upload.close()
+                raise ParseError(f"Тіло запиту перевищує {settings.MAX_RAW_UPLOAD_SIZE} байт.")
+            upload.write(chunk)
+        upload.size = size
+        upload.seek(0)
+        data = {key: value for key, value in request.query_params.items()}
+        data['source_file'] = upload
+        return data
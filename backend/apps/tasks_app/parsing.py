@@ -0,0 +1,324 @@
+import gzip
+import hashlib
+import io
+import lzma
+import os
+import tarfile
+import threading
+import zipfile
+
+import billiard
+import numpy as np
+from django.conf import settings
+
+BATCH_INPUT_FILENAME = "input.src"
+UPLOAD_FILENAME = "upload.src"
+CHECKPOINT_FILENAME = "lu_checkpoint.npz"
+FACTORS_FILENAME = "factors.npz"
+LOWRANK_UPDATE_FILENAME = "lowrank_update.npz"
+RHS_MATRIX_FILENAME = "B.npy"
+PRODUCT_FILENAMES = {"inverse": "A_inv.npy", "matrix_solve": "X_matrix.npy"}
+PARSED_FILENAME = "parsed.npy"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+SYMMETRY_BLOCK_ROWS = 256
+
+GZIP_MAGIC = b"\x1f\x8b"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def detect_compression(head):
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(XZ_MAGIC):
+        return "xz"
+    if head.startswith(ZSTD_MAGIC):
+        return "zstd"
+    return None
+
+
+def open_decompressed(path):
+    """Відкриває вхідний файл як текстовий потік, розпаковуючи gzip/xz/zstd на льоту (формат — за сигнатурою)."""
+    with open(path, 'rb') as f:
+        compression = detect_compression(f.read(6))
+    if compression == "gzip":
+        raw = gzip.open(path, 'rb')
+    elif compression == "xz":
+        raw = lzma.open(path, 'rb')
+    elif compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("Файл стиснуто zstd, але пакет zstandard не встановлено на сервері.")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    else:
+        raw = open(path, 'rb')
+    return io.TextIOWrapper(io.BufferedReader(raw) if compression == "zstd" else raw, encoding='utf-8')
+
+
+def save_upload(uploaded_file, path):
+    """Потоково записує завантажений файл на диск, не тримаючи його вміст у пам'яті."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        for chunk in uploaded_file.chunks(UPLOAD_CHUNK_SIZE):
+            f.write(chunk)
+    return path
+
+
+def parse_augmented_matrix(source, max_n):
+    """Розбирає розширену матрицю [A|b] з тексту або текстового потоку і повертає (A, b)."""
+    stream = io.StringIO(source) if isinstance(source, str) else source
+    try:
+        full_matrix = np.loadtxt(stream, dtype=np.float64, ndmin=2)
+    except Exception as e:
+        if isinstance(source, str):
+            line_preview = source.split('\n', 1)[0][:80]
+            raise ValueError(f"Помилка читання даних... Початок: '{line_preview}...'. Деталі: {e}")
+        raise ValueError(f"Помилка читання даних... Деталі: {e}")
+    if full_matrix.ndim != 2: raise ValueError("Вхідні дані не вдалося перетворити на 2D матрицю.")
+    n_rows, n_cols = full_matrix.shape
+    if n_cols <= 1: raise ValueError(f"Матриця має мати щонайменше 2 стовпці... Отримано: {n_cols}.")
+    matrix_n = n_rows
+    if matrix_n != (n_cols - 1): raise ValueError(f"Матриця A має бути квадратною... Отримано {n_rows}x{n_cols-1}.")
+    if matrix_n > max_n: raise ValueError(f"Розмір матриці ({matrix_n}) перевищує ліміт ({max_n}).")
+    return full_matrix[:, :-1], full_matrix[:, -1]
+
+
+def _is_data_line(line):
+    stripped = line.strip()
+    return bool(stripped) and not stripped.startswith(b"#")
+
+
+def _read_range(path, start, stop):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(stop - start)
+
+
+def _count_rows(path, start, stop):
+    return sum(1 for line in _read_range(path, start, stop).split(b"\n") if _is_data_line(line))
+
+
+def _parse_range(path, start, stop, out_path, row_offset, n_rows, n_cols):
+    """Розбирає діапазон байтів і пише рядки одразу в memmap-результат; повертає (рядків, стовпців) для перевірки."""
+    rows = np.loadtxt(io.BytesIO(_read_range(path, start, stop)), dtype=np.float64, ndmin=2)
+    if rows.size == 0:
+        return 0, n_cols
+    if rows.shape != (n_rows, n_cols):
+        return rows.shape
+    out = np.load(out_path, mmap_mode='r+')
+    out[row_offset:row_offset + n_rows] = rows
+    out.flush()
+    return rows.shape
+
+
+def newline_aligned_ranges(path, parts):
+    """Ділить файл на parts діапазонів байтів, кожен з яких закінчується на межі рядка."""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, parts):
+            target = max(size * i // parts, bounds[-1])
+            f.seek(target)
+            f.readline()
+            position = min(f.tell(), size)
+            if position > bounds[-1]:
+                bounds.append(position)
+    if bounds[-1] != size:
+        bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def first_data_line(path):
+    with open(path, 'rb') as f:
+        for line in f:
+            if _is_data_line(line.split(b"#", 1)[0]):
+                return line
+    return b""
+
+
+def _parse_pool(workers):
+    """Пул процесів billiard: на відміну від concurrent.futures, його можна створити і з daemon-процесу
+    prefork-воркера Celery. Якщо процеси створити не вдалося — None, і розбір іде послідовно."""
+    if workers <= 1:
+        return None
+    try:
+        return billiard.Pool(processes=workers)
+    except (AssertionError, OSError) as e:
+        print(f"Parallel parsing unavailable ({e!r}). Falling back to sequential parsing.")
+        return None
+
+
+def parse_augmented_file_parallel(path, max_n, workers, out_path, chunk_bytes=16 * 1024 * 1024):
+    """Паралельний аналог parse_augmented_matrix для нестиснутого файлу: діапазони байтів, вирівняні по рядках,
+    розбирають окремі процеси і пишуть у спільний .npy (memmap). Повертає (A, b) — представлення цього memmap."""
+    n_cols = len(first_data_line(path).split(b"#", 1)[0].split())
+    if n_cols <= 1: raise ValueError(f"Матриця має мати щонайменше 2 стовпці... Отримано: {n_cols}.")
+    matrix_n = n_cols - 1
+    # Розмір відомий з першого рядка, тож завелику матрицю відхиляємо ще до розбору.
+    if matrix_n > max_n: raise ValueError(f"Розмір матриці ({matrix_n}) перевищує ліміт ({max_n}).")
+    parts = max(workers, min(os.path.getsize(path) // chunk_bytes + 1, workers * 8))
+    ranges = newline_aligned_ranges(path, parts)
+    pool = _parse_pool(workers)
+    # Окремий apply_async на діапазон, а не starmap: billiard зараховує результат мапа лише першому процесу,
+    # і решта процесів пулу перед виходом 30 с чекає підтвердження своїх відповідей.
+    def run(func, *args):
+        if not pool:
+            return list(map(func, *args))
+        return [result.get() for result in [pool.apply_async(func, call_args) for call_args in zip(*args)]]
+    try:
+        # Спершу рядки кожного діапазону: з них виходять зсуви в результаті і перевірка квадратності до розбору.
+        counts = list(run(_count_rows, [path] * len(ranges), *zip(*ranges)))
+        if sum(counts) != matrix_n:
+            raise ValueError(f"Матриця A має бути квадратною... Отримано {sum(counts)}x{matrix_n}.")
+        offsets = np.concatenate([[0], np.cumsum(counts)[:-1]]).tolist()
+        np.lib.format.open_memmap(out_path, mode='w+', dtype=np.float64, shape=(matrix_n, n_cols)).flush()
+        try:
+            shapes = list(run(
+                _parse_range, [path] * len(ranges), *zip(*ranges), [out_path] * len(ranges), offsets, counts, [n_cols] * len(ranges)
+            ))
+        except ValueError as e:
+            raise ValueError(f"Помилка читання даних... Деталі: {e}")
+    finally:
+        # Усі результати вже отримано синхронно; terminate не чекає, доки процеси пулу самі завершаться.
+        if pool:
+            pool.terminate()
+            pool.join()
+    for (start, _), count, shape in zip(ranges, counts, shapes):
+        if count and tuple(shape) != (count, n_cols):
+            raise ValueError(f"Помилка читання даних: фрагмент з байта {start} містить рядки з {shape[1]} стовпцями замість {n_cols}.")
+    full_matrix = np.load(out_path, mmap_mode='r')
+    return full_matrix[:, :-1], full_matrix[:, -1]
+
+
+def use_parallel_parse(path):
+    """Паралельний розбір лише для великих нестиснутих файлів: стиснутий потік не можна різати за байтами."""
+    if settings.PARSE_PARALLEL_WORKERS <= 1 or os.path.getsize(path) < settings.PARSE_PARALLEL_MIN_MB * 1024 * 1024:
+        return False
+    with open(path, 'rb') as f:
+        return detect_compression(f.read(6)) is None
+
+
+def system_hash(A, b):
+    """SHA-256 розібраної системи: однакові (A, b) дають однаковий хеш незалежно від форматування тексту."""
+    digest = hashlib.sha256()
+    digest.update(np.int64(A.shape[0]).tobytes())
+    digest.update(np.ascontiguousarray(A, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(b, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def is_symmetric(A, rtol=0.0):
+    """Порівнює верхній трикутник A з нижнім блоками рядків і виходить на першому розбіжному блоці,
+    тож для несиметричної матриці зазвичай переглядається лише перший блок."""
+    n = A.shape[0]
+    for start in range(0, n, SYMMETRY_BLOCK_ROWS):
+        stop = min(start + SYMMETRY_BLOCK_ROWS, n)
+        if not np.allclose(A[start:stop, start:], A[start:, start:stop].T, rtol=rtol, atol=0.0):
+            return False
+    return True
+
+
+def task_dir_path(task):
+    return os.path.join(settings.MEDIA_ROOT, "tasks", str(task.uuid))
+
+
+class InputWriter(threading.Thread):
+    """Фоновий запис A.txt і b.txt; кожен файл з'являється атомарно (через тимчасовий і os.replace)."""
+
+    def __init__(self, items):
+        super().__init__(name="lu-input-writer", daemon=True)
+        self.items = items
+        self.error = None
+
+    def run(self):
+        try:
+            for path, array in self.items:
+                tmp_path = f"{path}.tmp"
+                np.savetxt(tmp_path, array, fmt='%.18e')
+                os.replace(tmp_path, path)
+        except Exception as e:
+            self.error = e
+
+    def wait(self):
+        self.join()
+        if self.error:
+            raise self.error
+
+
+def save_task_inputs(task, A, b, background=False):
+    """Записує A і b у теку задачі та заповнює matrix_file, vector_file, matrix_size (без save()).
+    З background=True запис іде у фоновому потоці; повертається InputWriter, на якому треба викликати wait()."""
+    task_dir = task_dir_path(task)
+    os.makedirs(task_dir, exist_ok=True)
+    matrix_path = os.path.join(task_dir, "A.txt")
+    vector_path = os.path.join(task_dir, "b.txt")
+    writer = InputWriter([(matrix_path, A), (vector_path, b)])
+    task.matrix_file.name = os.path.relpath(matrix_path, settings.MEDIA_ROOT)
+    task.vector_file.name = os.path.relpath(vector_path, settings.MEDIA_ROOT)
+    task.matrix_size = A.shape[0]
+    if background:
+        writer.start()
+        return writer
+    writer.run()
+    if writer.error:
+        raise writer.error
+    return None
+
+
+def batch_input_path(task):
+    return os.path.join(task_dir_path(task), BATCH_INPUT_FILENAME)
+
+
+def checkpoint_path(task):
+    return os.path.join(task_dir_path(task), CHECKPOINT_FILENAME)
+
+
+def factors_path(task):
+    return os.path.join(task_dir_path(task), FACTORS_FILENAME)
+
+
+def lowrank_update_path(task):
+    return os.path.join(task_dir_path(task), LOWRANK_UPDATE_FILENAME)
+
+
+def rhs_matrix_path(task):
+    return os.path.join(task_dir_path(task), RHS_MATRIX_FILENAME)
+
+
+def product_path(task, product):
+    return os.path.join(task_dir_path(task), PRODUCT_FILENAMES[product])
+
+
+def parsed_path(task):
+    return os.path.join(task_dir_path(task), PARSED_FILENAME)
+
+
+def upload_path(task):
+    return os.path.join(task_dir_path(task), UPLOAD_FILENAME)
+
+
+def _is_system_member(name):
+    base = os.path.basename(name)
+    return bool(base) and not base.startswith('.') and '__MACOSX' not in name
+
+
+def iter_archive_members(uploaded_file):
+    """Повертає (ім'я, байти) для кожного файлу системи в zip або tar (у т.ч. стиснутому) архіві."""
+    uploaded_file.seek(0)
+    if zipfile.is_zipfile(uploaded_file):
+        uploaded_file.seek(0)
+        with zipfile.ZipFile(uploaded_file) as archive:
+            for info in sorted(archive.infolist(), key=lambda i: i.filename):
+                if not info.is_dir() and _is_system_member(info.filename):
+                    yield info.filename, archive.read(info)
+        return
+    uploaded_file.seek(0)
+    try:
+        archive = tarfile.open(fileobj=uploaded_file, mode='r:*')
+    except tarfile.TarError:
+        raise ValueError("Архів має бути у форматі zip або tar (tar.gz, tar.xz).")
+    with archive:
+        for member in sorted(archive.getmembers(), key=lambda m: m.name):
+            if member.isfile() and _is_system_member(member.name):
+                yield member.name, archive.extractfile(member).read()
@@ -2,8 +2,16 @@ from django.urls import re_path
 from . import consumers
 
 websocket_urlpatterns = [
+    re_path(
+        r'ws/tasks/updates/$',
+        consumers.TaskSubscriptionConsumer.as_asgi()
+    ),
     re_path(
         r'ws/tasks/updates/(?P<task_uuid>[0-9a-f-]+)/$', 
         consumers.TaskProgressConsumer.as_asgi()
     ),
+    re_path(
+        r'ws/sessions/(?P<session_uuid>[0-9a-f-]+)/$',
+        consumers.SolverSessionConsumer.as_asgi()
+    ),
 ]
\ No newline at end of file
@@ -1,19 +1,47 @@
+import math
+from django.conf import settings
 from rest_framework import serializers
-from .models import Task, TaskProgress, TaskLog
+from .krylov_solver import normalize_options
+from .lowrank import validate_modification
+from .models import Task, TaskBatch, TaskProgress, TaskLog, SolverSession
+
+
+def validate_products(attrs, n=None):
+    products = sorted(set(attrs.get('products') or []))
+    if 'matrix_solve' in products and attrs.get('rhs_matrix') is None:
+        raise serializers.ValidationError({'rhs_matrix': "Для matrix_solve потрібна матриця правих частин B."})
+    if attrs.get('rhs_matrix') is not None:
+        if 'matrix_solve' not in products:
+            raise serializers.ValidationError({'rhs_matrix': "B використовується лише з products=['matrix_solve']."})
+        rows = attrs['rhs_matrix']
+        if not isinstance(rows, list) or not rows or (n is not None and len(rows) != n):
+            raise serializers.ValidationError({'rhs_matrix': f"B має бути списком з {n or 'n'} рядків."})
+    attrs['products'] = products
+    return attrs
+
+def validate_solver_options(value):
+    try:
+        return normalize_options(value)
+    except ValueError as e:
+        raise serializers.ValidationError(str(e))
 
 class TaskProgressSerializer(serializers.ModelSerializer):
     class Meta:
         model = TaskProgress
-        fields = ['stage', 'percentage', 'timestamp']
+        fields = ['id', 'stage', 'percentage', 'timestamp']
 
 class TaskLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = TaskLog
-        fields = ['message', 'level', 'timestamp']
+        fields = ['id', 'message', 'level', 'timestamp']
 
 class TaskCreateSerializer(serializers.ModelSerializer):
     source_file = serializers.FileField(write_only=True, required=False, allow_null=True)
     matrix_text = serializers.CharField(write_only=True, required=False, allow_null=True, trim_whitespace=False)
+    base_task = serializers.PrimaryKeyRelatedField(queryset=Task.objects.all(), required=False, allow_null=True)
+    modification = serializers.JSONField(write_only=True, required=False)
+    products = serializers.ListField(child=serializers.ChoiceField(choices=Task.PRODUCTS), required=False)
+    rhs_matrix = serializers.JSONField(write_only=True, required=False, help_text="B для products=['matrix_solve'] (n рядків)")
     status = serializers.CharField(read_only=True)
     class Meta:
         model = Task
@@ -25,17 +53,49 @@ class TaskCreateSerializer(serializers.ModelSerializer):
             'matrix_text',      
             'max_n',
             'save_matrices',
+            'verify_solution',
+            'engine',
+            'solver_options',
+            'keep_factors',
+            'base_task',
+            'modification',
+            'products',
+            'rhs_matrix',
             'status',          
         ]
         read_only_fields = ['owner', 'uuid', 'status'] 
 
+    def validate_solver_options(self, value):
+        return validate_solver_options(value)
+
     def validate(self, attrs):
+        validate_products(attrs)
+        if attrs.get('base_task') or 'modification' in attrs:
+            return self.validate_update(attrs)
         if not attrs.get('source_file') and not attrs.get('matrix_text'):
             raise serializers.ValidationError("Необхідно надати або файл (source_file), або текст (matrix_text).")
         if attrs.get('source_file') and attrs.get('matrix_text'):
             raise serializers.ValidationError("Надайте щось одне: або файл, або текст, але не обидва.")
         return attrs
 
+    def validate_update(self, attrs):
+        """Задача-зміна: A' = A базової задачі + малорангова зміна; розв'язується оновленням її розкладу."""
+        base = attrs.get('base_task')
+        if not base or 'modification' not in attrs:
+            raise serializers.ValidationError("Для зміни матриці потрібні і base_task, і modification.")
+        if attrs.get('source_file') or attrs.get('matrix_text'):
+            raise serializers.ValidationError("Задача-зміна не приймає нових даних: A береться з base_task.")
+        request = self.context.get('request')
+        if request is not None and base.owner_id != request.user.id:
+            raise serializers.ValidationError({'base_task': "Базову задачу не знайдено."})
+        if base.status != Task.Status.COMPLETED or not base.factors_file or not base.matrix_file:
+            raise serializers.ValidationError({'base_task': "Базова задача має бути завершеною і зберігати розклад (keep_factors)."})
+        try:
+            validate_modification(attrs['modification'], base.matrix_size)
+        except ValueError as e:
+            raise serializers.ValidationError({'modification': str(e)})
+        return attrs
+
 class TaskListSerializer(serializers.ModelSerializer):
     owner = serializers.ReadOnlyField(source='owner.username')
     last_progress = serializers.SerializerMethodField()
@@ -55,12 +115,16 @@ class TaskDetailSerializer(serializers.ModelSerializer):
     logs = TaskLogSerializer(many=True, read_only=True)
     queue_position = serializers.SerializerMethodField()
     estimated_wait_time_sec = serializers.SerializerMethodField()
+    determinant = serializers.SerializerMethodField()
 
     class Meta:
         model = Task
         fields = [
             'id', 'uuid', 'name', 'description', 'status', 'celery_task_id',
-            'matrix_size', 'save_matrices', 'result_message',
+            'matrix_size', 'matrix_symmetric', 'engine', 'solver_options', 'factorization', 'iterations',
+            'save_matrices', 'keep_factors', 'base_task', 'update_rank', 'factors_file', 'result_message',
+            'products', 'determinant', 'determinant_sign', 'log_abs_determinant', 'inverse_file', 'matrix_solution_file',
+            'verify_solution', 'residual_norm', 'condition_number',
             'created_at', 'started_at', 'completed_at',
             'owner', 'progress_updates', 'logs',
             'result_file', 
@@ -69,6 +133,12 @@ class TaskDetailSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = fields 
 
+    def get_determinant(self, obj):
+        # det A легко виходить за межі float; тоді клієнт користується знаком і ln|det A|.
+        if obj.log_abs_determinant is None or obj.log_abs_determinant > 709:
+            return None
+        return obj.determinant_sign * math.exp(obj.log_abs_determinant)
+
     def get_queue_position(self, obj):
         if obj.status in [Task.Status.QUEUED, Task.Status.PENDING]:
             return obj.get_queue_position()
@@ -77,4 +147,67 @@ class TaskDetailSerializer(serializers.ModelSerializer):
     def get_estimated_wait_time_sec(self, obj):
         if obj.status in [Task.Status.QUEUED, Task.Status.PENDING]:
             return obj.get_estimated_wait_time()
-        return None 
\ No newline at end of file
+        return None 
+
+class TaskBatchCreateSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=255, required=False)
+    files = serializers.ListField(child=serializers.FileField(), required=False, allow_empty=False)
+    archive = serializers.FileField(required=False)
+    max_n = serializers.IntegerField(required=False, min_value=1)
+    save_matrices = serializers.BooleanField(required=False, default=False)
+    verify_solution = serializers.BooleanField(required=False, default=False)
+    engine = serializers.ChoiceField(choices=Task.Engine.choices, required=False, default=Task.Engine.DIRECT)
+    solver_options = serializers.JSONField(required=False, default=dict)
+
+    def validate_solver_options(self, value):
+        return validate_solver_options(value)
+
+    def validate(self, attrs):
+        if not attrs.get('files') and not attrs.get('archive'):
+            raise serializers.ValidationError("Необхідно надати список файлів (files) або архів (archive).")
+        if attrs.get('files') and attrs.get('archive'):
+            raise serializers.ValidationError("Надайте щось одне: або список файлів, або архів.")
+        return attrs
+
+class TaskBatchSerializer(serializers.ModelSerializer):
+    owner = serializers.ReadOnlyField(source='owner.username')
+    progress = serializers.SerializerMethodField()
+    tasks = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TaskBatch
+        fields = ['id', 'uuid', 'name', 'owner', 'total_tasks', 'created_at', 'progress', 'tasks']
+        read_only_fields = fields
+
+    def get_progress(self, obj):
+        return obj.get_progress()
+
+    def get_tasks(self, obj):
+        if not self.context.get('include_tasks'):
+            return None
+        return list(obj.tasks.order_by('id').values('id', 'uuid', 'name', 'status'))
+
+class TaskProductsSerializer(serializers.Serializer):
+    products = serializers.ListField(child=serializers.ChoiceField(choices=Task.PRODUCTS), allow_empty=False)
+    rhs_matrix = serializers.JSONField(required=False)
+
+    def validate(self, attrs):
+        return validate_products(attrs, self.context['task'].matrix_size)
+
+class SolverSessionCreateSerializer(serializers.Serializer):
+    task_id = serializers.IntegerField(help_text="Задача, матрицю A якої розкласти")
+    idle_timeout_sec = serializers.IntegerField(required=False, min_value=10)
+
+    def validate_idle_timeout_sec(self, value):
+        return min(value, settings.SESSION_MAX_LIFETIME_SEC)
+
+class SolverSessionSerializer(serializers.ModelSerializer):
+    owner = serializers.ReadOnlyField(source='owner.username')
+
+    class Meta:
+        model = SolverSession
+        fields = [
+            'id', 'uuid', 'owner', 'source_task', 'matrix_size', 'status', 'factorization', 'idle_timeout_sec',
+            'solves', 'message', 'created_at', 'ready_at', 'last_activity_at', 'closed_at'
+        ]
+        read_only_fields = fields
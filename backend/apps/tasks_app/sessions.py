@@ -0,0 +1,131 @@
+import json
+import time
+import uuid
+
+import numpy as np
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from .utils import get_redis_connection
+
+SESSION_KEY_PREFIX = "lu:session:"
+HTTP_REPLY = "http"
+PENDING = "pending"
+
+
+def requests_key(session_uuid):
+    return f"{SESSION_KEY_PREFIX}{session_uuid}:requests"
+
+
+def reply_key(request_id):
+    return f"{SESSION_KEY_PREFIX}reply:{request_id}"
+
+
+def request_key(request_id):
+    # Якій сесії належить HTTP-запит: за цим ключем опитування відрізняє "ще в обробці" від невідомого запиту.
+    return f"{SESSION_KEY_PREFIX}request:{request_id}"
+
+
+def heartbeat_id(session_uuid):
+    # Сесії використовують ті самі heartbeat воркера, що й задачі, з окремим простором ідентифікаторів.
+    return f"session:{session_uuid}"
+
+
+def parse_rhs(values, n):
+    """Перетворює JSON-список на вектор b довжини n або кидає ValueError з повідомленням для клієнта."""
+    if not isinstance(values, list) or len(values) != n:
+        raise ValueError(f"Вектор b має містити {n} чисел.")
+    try:
+        b = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError("Вектор b має містити лише числа.")
+    if b.ndim != 1 or not np.all(np.isfinite(b)):
+        raise ValueError("Вектор b має містити лише скінченні числа.")
+    return b
+
+
+def submit_request(session_uuid, b, reply_to=HTTP_REPLY, request_id=None, pending_ttl=None):
+    request_id = request_id or uuid.uuid4().hex
+    message = {"id": request_id, "b": b, "reply_to": reply_to}
+    pipe = get_redis_connection().pipeline()
+    if reply_to == HTTP_REPLY and pending_ttl:
+        pipe.set(request_key(request_id), str(session_uuid), ex=pending_ttl)
+    pipe.rpush(requests_key(session_uuid), json.dumps(message))
+    pipe.execute()
+    return request_id
+
+
+def close_session(session_uuid):
+    get_redis_connection().rpush(requests_key(session_uuid), json.dumps({"command": "close"}))
+
+
+def poll_reply(session_uuid, request_id):
+    """Відповідь воркера на HTTP-запит сесії; PENDING, поки запит чекає в черзі, або None для невідомого запиту."""
+    r = get_redis_connection()
+    owner = r.get(request_key(request_id))
+    if owner is None or owner.decode() != str(session_uuid):
+        return None
+    # Відповідь не вилучається: повторне опитування повертає той самий результат до завершення SESSION_REPLY_TTL.
+    reply = r.lrange(reply_key(request_id), 0, 0)
+    return json.loads(reply[0]) if reply else PENDING
+
+
+def send_reply(message, reply, reply_ttl):
+    reply = {"request_id": message.get("id"), **reply}
+    if message.get("reply_to", HTTP_REPLY) == HTTP_REPLY:
+        r = get_redis_connection()
+        key = reply_key(message.get("id"))
+        pipe = r.pipeline()
+        pipe.rpush(key, json.dumps(reply))
+        pipe.expire(key, reply_ttl)
+        pipe.expire(request_key(message.get("id")), reply_ttl)
+        pipe.execute()
+    else:
+        async_to_sync(get_channel_layer().send)(message["reply_to"], {"type": "session_result", **reply})
+
+
+def serve_requests(session_uuid, factors, idle_timeout, reply_ttl, on_solved, poll_interval=5.0):
+    """Обробляє запити сесії, доки не прийде команда close або не мине idle_timeout без запитів.
+    Повертає причину завершення: "closed" або "idle"."""
+    r = get_redis_connection()
+    key = requests_key(session_uuid)
+    last_request = time.monotonic()
+    while True:
+        remaining = idle_timeout - (time.monotonic() - last_request)
+        if remaining <= 0:
+            return "idle"
+        item = r.blpop([key], timeout=max(1, min(int(remaining) + 1, int(poll_interval))))
+        if item is None:
+            continue
+        last_request = time.monotonic()
+        try:
+            message = json.loads(item[1])
+        except ValueError:
+            continue
+        if message.get("command") == "close":
+            return "closed"
+        started = time.perf_counter()
+        try:
+            x = factors.solve(parse_rhs(message.get("b"), factors.n))
+        except ValueError as e:
+            send_reply(message, {"error": str(e)}, reply_ttl)
+            continue
+        send_reply(message, {"x": x.tolist(), "solve_seconds": time.perf_counter() - started}, reply_ttl)
+        on_solved()
+
+
+def drain_requests(session_uuid, error, reply_ttl):
+    """Відповідає помилкою на запити, що лишилися в черзі закритої сесії."""
+    r = get_redis_connection()
+    key = requests_key(session_uuid)
+    while True:
+        item = r.lpop(key)
+        if item is None:
+            break
+        try:
+            message = json.loads(item)
+        except ValueError:
+            continue
+        if "id" in message:
+            send_reply(message, {"error": error}, reply_ttl)
+    r.delete(key)
@@ -1,37 +1,324 @@
 from celery import shared_task, Task as CeleryTask
-from celery.exceptions import SoftTimeLimitExceeded
+from celery.exceptions import SoftTimeLimitExceeded, Retry
+from celery.utils.nodenames import worker_direct
 from django.conf import settings
 from django.core.files.base import ContentFile
 import numpy as np
 import os
 import io
 import time
+import uuid
 from datetime import timedelta
 from django.db import transaction 
-from django.db.models import Q 
-from .models import Task
-from .lu_solver import solve_lu_system
+from django.db.models import F, Q 
+from django.utils import timezone
+from .models import Task, TaskBatch, TaskLog, SolverSession
+from .lu_solver import solve_lu_system, batched_lu_factor, batched_lu_solve, batched_verify, FactorizationCheckpoint, ResidentFactors, verify_solution
+from .lowrank import LowRankUpdateError, apply_modification, load_updated_factors, load_stored_factors
+from .krylov_solver import METHOD_LABELS, solve_krylov_system
+from .sessions import serve_requests, drain_requests, heartbeat_id
+from .parsing import (
+    parse_augmented_matrix, save_task_inputs, batch_input_path, system_hash, open_decompressed, checkpoint_path, is_symmetric,
+    factors_path, lowrank_update_path, rhs_matrix_path, product_path, parsed_path, use_parallel_parse, parse_augmented_file_parallel
+)
+from .worker_runtime import buffer_pool, get_worker_runtime_states, soft_time_limit, start_task_heartbeat, stop_task_heartbeat, task_heartbeat_key
+from .utils import get_redis_connection
+from .admission import AdmissionPlanner, estimate_memory_mb, estimate_cpu_cost, job_engine, release_stale_dispatches
+from apps.monitoring.prometheus import TaskMetrics, record_observations, size_bucket, factorization_gflops
+
+def get_solve_queue(matrix_size):
+    if matrix_size is not None and matrix_size <= settings.SOLVE_SMALL_MAX_N:
+        return 'solve_small'
+    return 'solve_large'
+
+def solve_queue_filter(queue):
+    if queue == 'solve_small':
+        return Q(matrix_size__lte=settings.SOLVE_SMALL_MAX_N)
+    return Q(matrix_size__gt=settings.SOLVE_SMALL_MAX_N) | Q(matrix_size__isnull=True)
+
+def count_running_jobs(*filters):
+    # Задачі одного мікропакета мають спільний celery_task_id і займають один слот; резидентна сесія теж займає слот.
+    running_tasks = Task.objects.filter(*filters, status=Task.Status.RUNNING).values('celery_task_id').distinct().count()
+    return running_tasks + SolverSession.objects.filter(*filters, status__in=SolverSession.ACTIVE_STATUSES).count()
+
+def attempt_time_limits(task):
+    """Ліміти однієї спроби run_lu_task: не довше за CELERY_TASK_TIME_LIMIT і за залишок бюджету обчислень задачі."""
+    remaining = max(settings.LU_COMPUTE_BUDGET_SEC - task.compute_seconds, 1)
+    soft_time_limit = min(settings.CELERY_TASK_TIME_LIMIT, int(np.ceil(remaining)))
+    return {'soft_time_limit': soft_time_limit, 'time_limit': soft_time_limit + 60}
+
+def requeue_for_resume(task, celery_task_id):
+    """Повертає задачу в чергу після ліміту однієї спроби; контрольна точка лишається, наступна спроба продовжить з неї."""
+    requeued = Task.objects.filter(id=task.id, status=Task.Status.RUNNING, celery_task_id=celery_task_id).update(
+        status=Task.Status.QUEUED, celery_task_id=None, worker_node=None, dispatched_at=None
+    )
+    if not requeued:
+        return False
+    task.refresh_from_db(fields=['status', 'celery_task_id', 'worker_node', 'dispatched_at'])
+    resume_note = " Обчислення продовжиться з контрольної точки." if os.path.exists(checkpoint_path(task)) else ""
+    task.add_log(f"Спроба досягла ліміту часу ({task.compute_seconds:.0f} з {settings.LU_COMPUTE_BUDGET_SEC} c бюджету). Задачу повернуто в чергу.{resume_note}", level="WARNING")
+    task.send_websocket_update()
+    return True
+
+def count_dispatched_jobs(*filters):
+    # Надіслані, але ще не запущені задачі вже займають слот; мікропакет має один celery_task_id.
+    return Task.objects.filter(
+        *filters, status=Task.Status.QUEUED, dispatched_at__isnull=False
+    ).values('celery_task_id').distinct().count()
+
+def collect_micro_batch(task_to_run):
+    """Повертає id задач для мікропакета або None, якщо варто ще зачекати на сусідів того ж розміру."""
+    group = list(Task.objects.select_for_update(skip_locked=True).filter(
+        status=Task.Status.QUEUED, matrix_size=task_to_run.matrix_size, engine=Task.Engine.DIRECT,
+        deduplicated_from__isnull=True, dispatched_at__isnull=True, keep_factors=False, base_task__isnull=True, products=[]
+    ).order_by('created_at').values_list('id', flat=True)[:settings.MICRO_BATCH_MAX_SIZE])
+    waited = (timezone.now() - (task_to_run.queued_at or task_to_run.created_at)).total_seconds()
+    if len(group) < settings.MICRO_BATCH_MAX_SIZE and waited < settings.MICRO_BATCH_WINDOW_SEC:
+        try_run_next_task_from_queue.apply_async(countdown=settings.MICRO_BATCH_WINDOW_SEC - waited)
+        return None
+    return group
+
+def find_duplicate_source(task):
+    """Шукає завершену (в межах DEDUP_TTL_SEC) або ще активну задачу з тим самим input_hash."""
+    # Похідні величини (A⁻¹, AX = B) лежать у теці задачі, тож задачу з ними обчислюємо самостійно.
+    if not settings.DEDUP_ENABLED or not task.input_hash or task.products:
+        return None
+    candidates = Task.objects.filter(input_hash=task.input_hash, deduplicated_from__isnull=True).exclude(id=task.id)
+    if settings.DEDUP_SCOPE != 'global':
+        candidates = candidates.filter(owner_id=task.owner_id)
+    if task.save_matrices:
+        candidates = candidates.filter(save_matrices=True)
+    if task.verify_solution:
+        candidates = candidates.filter(verify_solution=True)
+    if task.keep_factors:
+        candidates = candidates.filter(keep_factors=True)
+    completed = candidates.filter(
+        status=Task.Status.COMPLETED,
+        completed_at__gte=timezone.now() - timedelta(seconds=settings.DEDUP_TTL_SEC),
+    ).exclude(result_file='').exclude(result_file__isnull=True).order_by('-completed_at').first()
+    if completed:
+        return completed
+    return candidates.filter(status__in=[Task.Status.QUEUED, Task.Status.RUNNING]).order_by('created_at').first()
+
+def complete_from_duplicate(task, source):
+    task.copy_result_from(source)
+    task.deduplicated_from = source
+    task.save(update_fields=['input_hash', 'matrix_size', 'update_rank', *Task.RESULT_FIELDS, 'deduplicated_from'])
+    task.mark_status(Task.Status.COMPLETED, f"Результат отримано з ідентичної задачі #{source.id}.")
+    task.add_log(f"Ідентичну систему вже розв'язано в задачі #{source.id}. Повторне обчислення пропущено.")
+
+def use_micro_batch_for(task):
+    return (
+        task is not None and settings.MICRO_BATCH_MAX_SIZE > 1 and task.engine == Task.Engine.DIRECT
+        and task.matrix_size is not None and task.matrix_size <= settings.MICRO_BATCH_MAX_N
+        and not task.keep_factors and task.base_task_id is None and not task.products
+    )
+
+def run_iterative_engine(task, matrix_path, vector_path, progress_callback, timings):
+    """Розв'язує задачу методом Крилова. Повертає (x, verification, method) або None, якщо метод
+    не збігся і задачу треба розв'язати прямим розкладом."""
+    x, info = solve_krylov_system(
+        matrix_path,
+        vector_path,
+        progress_callback,
+        task.solver_options,
+        symmetric=bool(task.matrix_symmetric),
+        timings=timings,
+        progress_interval=settings.KRYLOV_PROGRESS_INTERVAL_SEC,
+        sparse_density=settings.KRYLOV_SPARSE_DENSITY,
+    )
+    task.iterations = info["iterations"]
+    label = f"{METHOD_LABELS[info['method']]} (передобумовлювач: {info['preconditioner']})"
+    if not info["converged"]:
+        task.add_log(f"{label}: {info['reason']}. Перехід до прямого розкладу.", level="WARNING")
+        return None
+    task.add_log(f"{label}: збіжність за {info['iterations']} ітерацій, нев'язка {info['residual_norm']:.3e}.")
+    # Число обумовленості потребує розкладу; для ітераційного рушія повідомляємо лише нев'язку.
+    verification = {"residual_norm": info["residual_norm"], "condition_number": None} if task.verify_solution else {}
+    return x, verification, info["method"]
+
+def run_low_rank_update(task, matrix_path, vector_path, progress_callback, timings, keep_path=None):
+    """Розв'язує A' = A + U·Vᵀ за збереженим розкладом базової задачі (Шерман–Моррісон–Вудбері).
+    Повертає (x, verification, "woodbury") або None, якщо потрібен повний розклад A'."""
+    base = task.base_task
+    if base is None or not base.factors_file:
+        task.add_log("Розклад базової задачі недоступний. Виконується повний розклад.", level="WARNING")
+        return None
+    progress_callback("Оновлення розкладу (Вудбері)", 0)
+    started = time.time()
+    try:
+        with np.load(lowrank_update_path(task)) as update:
+            U, V = update["U"], update["V"]
+        A = np.loadtxt(matrix_path, ndmin=2)
+        b = np.loadtxt(vector_path, ndmin=1)
+        timings['load'] = time.time() - started
+        started = time.time()
+        solver = load_updated_factors(
+            os.path.join(settings.MEDIA_ROOT, base.factors_file.name), U, V,
+            max_rank=max(1, int(settings.LOWRANK_MAX_RANK_FRACTION * task.matrix_size)),
+            max_condition=settings.LOWRANK_MAX_CAPACITANCE_COND,
+        )
+        x = solver.solve(b)
+    except (LowRankUpdateError, np.linalg.LinAlgError, OSError, ValueError, KeyError) as e:
+        task.add_log(f"Оновлення розкладу неможливе: {e}. Виконується повний розклад.", level="WARNING")
+        return None
+    timings['solve'] = time.time() - started
+    b_norm = np.linalg.norm(b) or 1.0
+    residual_norm = float(np.linalg.norm(A @ x - b) / b_norm)
+    # Похибка формули Вудбері зростає з обумовленістю C, тож результат приймаємо лише за справжньою нев'язкою.
+    if not np.isfinite(residual_norm) or residual_norm > settings.LOWRANK_RESIDUAL_TOL:
+        task.add_log(f"Оновлення розкладу нестабільне (нев'язка {residual_norm:.3e}). Виконується повний розклад.", level="WARNING")
+        return None
+    progress_callback("Розв'язання системи", 90 if task.verify_solution else 100)
+    verification = verify_solution(A, b, x, solve=solver.solve, solve_transposed=solver.solve_transposed) if task.verify_solution else {}
+    if keep_path:
+        solver.save(keep_path)
+    task.add_log(f"Розклад задачі #{base.id} оновлено на ранг {solver.rank} за O(n²k). Повний розклад не знадобився.")
+    return x, verification, Task.Factorization.WOODBURY
+
+def compute_products(task, solver, products):
+    """Обчислює похідні величини з готового розкладу без повторного розкладу. Повертає змінені поля задачі."""
+    update_fields = []
+    if 'determinant' in products:
+        task.determinant_sign, task.log_abs_determinant = solver.slogdet()
+        update_fields += ['determinant_sign', 'log_abs_determinant']
+        task.add_log(f"det A = {task.determinant_sign:+d}·exp({task.log_abs_determinant:.6g}).")
+    outputs = []
+    if 'inverse' in products:
+        outputs.append(('inverse', 'inverse_file', lambda: solver.solve(np.eye(solver.n))))
+    if 'matrix_solve' in products:
+        outputs.append(('matrix_solve', 'matrix_solution_file', lambda: solver.solve(np.load(rhs_matrix_path(task)))))
+    for product, field, compute in outputs:
+        path = product_path(task, product)
+        np.save(path, compute())
+        getattr(task, field).name = os.path.relpath(path, settings.MEDIA_ROOT)
+        update_fields.append(field)
+        task.add_log(f"Збережено {os.path.basename(path)} (обчислено з наявного розкладу).")
+    return update_fields
+
+def dispatch_by_capacity(planner, queue):
+    """Надсилає задачі черги конкретним вузлам, доки голова черги вміщається за пам'яттю (FIFO, без обгону)."""
+    while True:
+        with transaction.atomic():
+            task_to_run = Task.objects.select_for_update(skip_locked=True).filter(
+                solve_queue_filter(queue), status=Task.Status.QUEUED, deduplicated_from__isnull=True, dispatched_at__isnull=True
+            ).order_by('created_at').first()
+            if task_to_run is None:
+                return
+            group = [task_to_run.id]
+            if use_micro_batch_for(task_to_run):
+                group = collect_micro_batch(task_to_run)
+                if group is None:
+                    return
+            n = task_to_run.matrix_size
+            memory_mb = estimate_memory_mb(n, job_engine(len(group)), len(group))
+            if memory_mb > planner.max_memory_mb(queue):
+                task_to_run.mark_status(
+                    Task.Status.FAILED,
+                    f"Недостатньо пам'яті: для n={n} потрібно ~{memory_mb:.0f} МБ, найбільший воркер черги {queue} має {planner.max_memory_mb(queue):.0f} МБ."
+                )
+                continue
+            node = planner.place(queue, memory_mb, estimate_cpu_cost(n, len(group)))
+            if node is None:
+                return
+            celery_task_id = str(uuid.uuid4())
+            Task.objects.filter(id__in=group).update(worker_node=node, dispatched_at=timezone.now(), celery_task_id=celery_task_id)
+            options = {'queue': worker_direct(node), 'task_id': celery_task_id, 'expires': settings.ADMISSION_DISPATCH_TIMEOUT_SEC}
+            print(f"Placing {len(group)} task(s) (n={n}, ~{memory_mb:.0f} MB) on {node}.")
+            if len(group) > 1:
+                transaction.on_commit(lambda group=group, options=options: run_small_task_batch.apply_async(args=[group], **options))
+            else:
+                options.update(attempt_time_limits(task_to_run))
+                transaction.on_commit(lambda task_id=task_to_run.id, options=options: run_lu_task.apply_async(args=[task_id], **options))
 
 @shared_task(ignore_result=True)
 def try_run_next_task_from_queue():
     try:
-        running_tasks_count = Task.objects.filter(status=Task.Status.RUNNING).count()
+        planner = AdmissionPlanner.from_workers()
+        release_stale_dispatches()
+        running_tasks_count = count_running_jobs() + count_dispatched_jobs()
 
-        if running_tasks_count < settings.MAX_ACTIVE_TASKS_GLOBAL:
+        for queue, queue_limit in settings.SOLVE_QUEUE_LIMITS.items():
+            if planner.handles(queue):
+                dispatch_by_capacity(planner, queue)
+                continue
+            # Вузли черги не повідомили ємність — старий режим з фіксованими лімітами кількості.
+            if running_tasks_count >= settings.MAX_ACTIVE_TASKS_GLOBAL:
+                continue
+            queue_running_count = count_running_jobs(solve_queue_filter(queue)) + count_dispatched_jobs(solve_queue_filter(queue))
+            if queue_running_count >= queue_limit:
+                continue
             with transaction.atomic():
                 task_to_run = Task.objects.select_for_update(skip_locked=True).filter(
-                    status=Task.Status.QUEUED
+                    solve_queue_filter(queue), status=Task.Status.QUEUED, deduplicated_from__isnull=True, dispatched_at__isnull=True
                 ).order_by('created_at').first()
-
-                if task_to_run:
-                    print(f"Slot available ({running_tasks_count}/{settings.MAX_ACTIVE_TASKS_GLOBAL}). Triggering run_lu_task for task {task_to_run.id}")
-                    run_lu_task.delay(task_to_run.id)
+                if task_to_run is None:
+                    continue
+                group = [task_to_run.id]
+                if use_micro_batch_for(task_to_run):
+                    group = collect_micro_batch(task_to_run)
+                    if group is None:
+                        continue
+                # Позначка надсилання ставиться під тим самим блокуванням: паралельний диспетчер цих задач уже не вибере.
+                celery_task_id = str(uuid.uuid4())
+                Task.objects.filter(id__in=group).update(dispatched_at=timezone.now(), celery_task_id=celery_task_id)
+                options = {'queue': queue, 'task_id': celery_task_id}
+                if len(group) > 1:
+                    print(f"Slot available ({running_tasks_count}/{settings.MAX_ACTIVE_TASKS_GLOBAL}, {queue} {queue_running_count}/{queue_limit}). Triggering micro-batch of {len(group)} tasks (n={task_to_run.matrix_size})")
+                    transaction.on_commit(lambda group=group, options=options: run_small_task_batch.apply_async(args=[group], **options))
+                else:
+                    print(f"Slot available ({running_tasks_count}/{settings.MAX_ACTIVE_TASKS_GLOBAL}, {queue} {queue_running_count}/{queue_limit}). Triggering run_lu_task for task {task_to_run.id}")
+                    options.update(attempt_time_limits(task_to_run))
+                    transaction.on_commit(lambda task_id=task_to_run.id, options=options: run_lu_task.apply_async(args=[task_id], **options))
+                running_tasks_count += 1
     except Exception as e:
         print(f"Error in try_run_next_task_from_queue: {e}")
 
+def use_fused_solve(task, source):
+    """Чи може воркер парсингу одразу розв'язати задачу з масивів у пам'яті (лише малі задачі прямого рушія)."""
+    return (
+        settings.FUSED_SOLVE_ENABLED and source is None and task.engine == Task.Engine.DIRECT
+        and task.base_task_id is None and task.matrix_size <= settings.FUSED_SOLVE_MAX_N
+    )
+
+def reserve_fused_slot(task, node):
+    """Чи можна розв'язати задачу просто зараз у процесі парсингу на вузлі node. Повертає (так/ні, worker_node задачі).
+    Викликається в транзакції: голову черги блокуємо так само, як диспетчер, тож рішення не перетинаються."""
+    queue = get_solve_queue(task.matrix_size)
+    # Вільний слот не дає права обганяти задачі, що вже чекають у тій самій черзі.
+    head = Task.objects.select_for_update().filter(
+        solve_queue_filter(queue), status=Task.Status.QUEUED, deduplicated_from__isnull=True, dispatched_at__isnull=True
+    ).exclude(id=task.id).order_by('created_at').values_list('id', flat=True)[:1]
+    if list(head):
+        return False, None
+    planner = AdmissionPlanner.from_workers()
+    # Розв'язання займає пам'ять контейнера парсингу, тож запас рахуємо за вузлом парсингу, а не за вузлами черги.
+    if node in planner.nodes:
+        if planner.headroom_mb(node) < estimate_memory_mb(task.matrix_size):
+            return False, None
+    elif planner.handles(queue):
+        # Вузол парсингу не повідомив ємність: у режимі планування за пам'яттю розв'язання лишаємо вузлам черги.
+        return False, None
+    else:
+        node = None
+    if planner.handles(queue):
+        return True, node
+    if count_running_jobs() + count_dispatched_jobs() >= settings.MAX_ACTIVE_TASKS_GLOBAL:
+        return False, None
+    queue_filter = solve_queue_filter(queue)
+    return count_running_jobs(queue_filter) + count_dispatched_jobs(queue_filter) < settings.SOLVE_QUEUE_LIMITS[queue], node
+
+def remove_parsed_file(task):
+    # Проміжний memmap паралельного парсера; A і b на цей момент уже записані у файли задачі.
+    try:
+        os.remove(parsed_path(task))
+    except FileNotFoundError:
+        pass
+
 @shared_task(bind=True)
-def parse_and_prepare_task_data(self, task_id, source_file_content=None, matrix_text=None):
+def parse_and_prepare_task_data(self, task_id, source_file_content=None, matrix_text=None, source_path=None, modification=None, rhs_matrix=None):
     task = None
+    parse_started = time.perf_counter()
     try:
         task = Task.objects.get(id=task_id)
 
@@ -42,41 +329,100 @@ def parse_and_prepare_task_data(self, task_id, source_file_content=None, matrix_
         data_string = None
         if source_file_content: data_string = source_file_content
         elif matrix_text: data_string = matrix_text
-        else: raise ValueError("Не надано ані вмісту файлу, ані тексту матриці.")
-        string_io = io.StringIO(data_string)
-        try:
-            full_matrix = np.loadtxt(string_io, dtype=np.float64, ndmin=2)
-        except Exception as e:
-            line_preview = data_string.split('\n', 1)[0][:80]
-            raise ValueError(f"Помилка читання даних... Початок: '{line_preview}...'. Деталі: {e}")
-        if full_matrix.ndim != 2: raise ValueError("Вхідні дані не вдалося перетворити на 2D матрицю.")
-        n_rows, n_cols = full_matrix.shape
-        if n_cols <= 1: raise ValueError(f"Матриця має мати щонайменше 2 стовпці... Отримано: {n_cols}.")
-        matrix_n = n_rows
-        if matrix_n != (n_cols - 1): raise ValueError(f"Матриця A має бути квадратною... Отримано {n_rows}x{n_cols-1}.")
-        if matrix_n > task.max_n: raise ValueError(f"Розмір матриці ({matrix_n}) перевищує ліміт ({task.max_n}).")
-        A = full_matrix[:, :-1]
-        b = full_matrix[:, -1]
-        task_dir = os.path.join(settings.MEDIA_ROOT, "tasks", str(task.uuid))
-        os.makedirs(task_dir, exist_ok=True)
-        matrix_path = os.path.join(task_dir, "A.txt")
-        vector_path = os.path.join(task_dir, "b.txt")
-        np.savetxt(matrix_path, A, fmt='%.18e')
-        np.savetxt(vector_path, b, fmt='%.18e')
-        rel_matrix_path = os.path.relpath(matrix_path, settings.MEDIA_ROOT)
-        rel_vector_path = os.path.relpath(vector_path, settings.MEDIA_ROOT)
-        task.matrix_file.name = rel_matrix_path
-        task.vector_file.name = rel_vector_path
-        task.matrix_size = matrix_n
+        elif not source_path and modification is None: raise ValueError("Не надано ані вмісту файлу, ані тексту матриці.")
+        if modification is not None:
+            # Нова система — базова A з малоранговою зміною; U і V зберігаються для оновлення розкладу.
+            base = task.base_task
+            if base is None or not base.matrix_file or not base.vector_file:
+                raise ValueError("Базова задача або її вхідні дані більше не доступні.")
+            A, b, U, V = apply_modification(
+                np.loadtxt(os.path.join(settings.MEDIA_ROOT, base.matrix_file.name), ndmin=2),
+                np.loadtxt(os.path.join(settings.MEDIA_ROOT, base.vector_file.name), ndmin=1),
+                modification,
+            )
+            task.update_rank = U.shape[1]
+        elif source_path:
+            full_source_path = os.path.join(settings.MEDIA_ROOT, source_path)
+            try:
+                if use_parallel_parse(full_source_path):
+                    A, b = parse_augmented_file_parallel(full_source_path, task.max_n, settings.PARSE_PARALLEL_WORKERS, parsed_path(task))
+                else:
+                    with open_decompressed(full_source_path) as stream:
+                        A, b = parse_augmented_matrix(stream, task.max_n)
+            finally:
+                if os.path.exists(full_source_path):
+                    os.remove(full_source_path)
+        else:
+            A, b = parse_augmented_matrix(data_string, task.max_n)
+        task.input_hash = system_hash(A, b)
+        task.matrix_size = A.shape[0]
+        task.matrix_symmetric = is_symmetric(A, settings.LU_SYMMETRY_RTOL)
+        source = find_duplicate_source(task)
+        if source and source.status == Task.Status.COMPLETED:
+            complete_from_duplicate(task, source)
+            remove_parsed_file(task)
+            return f"Task {task_id} completed from duplicate {source.id}"
+        if rhs_matrix is not None:
+            B = np.asarray(rhs_matrix, dtype=np.float64)
+            if B.ndim == 1:
+                B = B[:, None]
+            if B.ndim != 2 or B.shape[0] != A.shape[0]:
+                raise ValueError(f"Матриця правих частин B має містити {A.shape[0]} рядків.")
+        fused = use_fused_solve(task, source)
+        # Для злитого режиму A і b пишуться у фоні паралельно з розв'язанням; файли потрібні для повторних спроб і сесій.
+        writer = save_task_inputs(task, A, b, background=fused)
+        if rhs_matrix is not None:
+            np.save(rhs_matrix_path(task), B)
+        if modification is not None:
+            np.savez(lowrank_update_path(task), U=U, V=V)
+        matrix_n = task.matrix_size
+        task.deduplicated_from = source
         task.status = Task.Status.QUEUED
-        task.save(update_fields=['matrix_file', 'vector_file', 'matrix_size', 'status'])
+        task.queued_at = timezone.now()
+        fused_id = None
+        with transaction.atomic():
+            fused_slot, fused_node = reserve_fused_slot(task, self.request.hostname) if fused else (False, None)
+            if fused_slot:
+                # Позначка надсилання прибирає задачу з вибірки диспетчера, а слот рахується як зайнятий.
+                fused_id = str(uuid.uuid4())
+                task.worker_node = fused_node
+                task.celery_task_id = fused_id
+                task.dispatched_at = task.queued_at
+            elif writer:
+                # Слоту немає — задачу візьме інший воркер, тож файли мають бути на диску до постановки в чергу.
+                writer.wait()
+                writer = None
+            task.save(update_fields=[
+                'matrix_file', 'vector_file', 'matrix_size', 'matrix_symmetric', 'update_rank', 'input_hash', 'deduplicated_from',
+                'status', 'queued_at', 'worker_node', 'celery_task_id', 'dispatched_at'
+            ])
         task.update_progress("Готово до обчислення (в черзі)", 10)
         task.add_log("Парсинг даних успішно завершено.")
+        if source:
+            task.add_log(f"Ідентична задача #{source.id} вже обчислюється. Очікуємо її результат.")
+            # Лідер міг завершитися між пошуком і збереженням — перевіряємо ще раз.
+            source.refresh_from_db(fields=['status', 'result_file', 'residual_norm', 'condition_number'])
+            if source.status in [Task.Status.COMPLETED, Task.Status.FAILED, Task.Status.CANCELLED]:
+                Task.resolve_followers([source])
+        record_observations([("lu_parse_seconds", time.perf_counter() - parse_started)], {"engine": "lu", "size": size_bucket(matrix_n)})
+        if fused_id:
+            task.add_log("Є вільний слот: задача розв'язується одразу на воркері парсингу, без повторного читання файлів.")
+            # apply() виконує задачу в цьому процесі поза лімітами Celery, тож бюджет спроби обмежуємо самі.
+            with soft_time_limit(attempt_time_limits(task)['soft_time_limit']):
+                run_lu_task.apply(args=[task.id], kwargs={'inputs': (A, b)}, task_id=fused_id)
+        if writer:
+            try:
+                writer.wait()
+            except OSError as e:
+                task.add_log(f"Не вдалося зберегти A і b на диск: {e}. Повторні спроби й сесії для цієї задачі неможливі.", level="WARNING")
+        remove_parsed_file(task)
         try_run_next_task_from_queue.delay()
         return f"Parsing successful for task {task_id}"
 
     except Exception as e:
         error_message = f"Помилка парсингу для задачі ID {task_id}: {str(e)}"
+        if task:
+            remove_parsed_file(task)
         if task and task.status != Task.Status.CANCELLED:
                 task.mark_status(Task.Status.FAILED, error_message)
                 task.add_log(error_message, level="ERROR")
@@ -84,6 +430,74 @@ def parse_and_prepare_task_data(self, task_id, source_file_content=None, matrix_
         elif not task: print(f"CRITICAL PARSING ERROR (task object unavailable): {error_message}")
         return f"Parsing failed for task {task_id}: {error_message}"
 
+@shared_task(bind=True)
+def parse_task_batch(self, batch_id):
+    """Парсить усі задачі пакета одним завданням і оновлює їх кількома bulk-запитами."""
+    parse_started = time.perf_counter()
+    batch = TaskBatch.objects.get(id=batch_id)
+    tasks = list(batch.tasks.filter(status=Task.Status.PENDING).order_by('id'))
+    now = timezone.now()
+    parsed, failed, deduplicated, logs = [], [], [], []
+    batch_leaders = {}
+    for task in tasks:
+        input_path = batch_input_path(task)
+        try:
+            with open_decompressed(input_path) as stream:
+                A, b = parse_augmented_matrix(stream, task.max_n)
+            task.input_hash = system_hash(A, b)
+            task.matrix_size = A.shape[0]
+            task.matrix_symmetric = is_symmetric(A, settings.LU_SYMMETRY_RTOL)
+            leader_key = (task.input_hash, task.save_matrices, task.verify_solution, task.keep_factors)
+            source = find_duplicate_source(task) or (None if task.products else batch_leaders.get(leader_key))
+            if source and source.status == Task.Status.COMPLETED:
+                task.status = Task.Status.COMPLETED
+                task.copy_result_from(source)
+                task.deduplicated_from = source
+                task.result_message = f"Результат отримано з ідентичної задачі #{source.id}."
+                task.completed_at = now
+                deduplicated.append(task)
+                logs.append(TaskLog(task=task, message=task.result_message))
+                continue
+            save_task_inputs(task, A, b)
+            task.deduplicated_from = source
+            if source is None:
+                batch_leaders[leader_key] = task
+            task.status = Task.Status.QUEUED
+            task.queued_at = now
+            parsed.append(task)
+            logs.append(TaskLog(task=task, message="Парсинг даних успішно завершено."))
+        except Exception as e:
+            task.status = Task.Status.FAILED
+            task.result_message = f"Помилка парсингу для задачі ID {task.id}: {str(e)}"
+            task.completed_at = now
+            failed.append(task)
+            logs.append(TaskLog(task=task, message=task.result_message, level="ERROR"))
+        finally:
+            if os.path.exists(input_path):
+                os.remove(input_path)
+    with transaction.atomic():
+        # Задачі, скасовані під час парсингу, не перезаписуємо.
+        cancelled_ids = set(Task.objects.filter(id__in=[t.id for t in tasks], status=Task.Status.CANCELLED).values_list('id', flat=True))
+        parsed = [t for t in parsed if t.id not in cancelled_ids]
+        failed = [t for t in failed if t.id not in cancelled_ids]
+        deduplicated = [t for t in deduplicated if t.id not in cancelled_ids]
+        Task.objects.bulk_update(parsed, ['matrix_file', 'vector_file', 'matrix_size', 'matrix_symmetric', 'input_hash', 'deduplicated_from', 'status', 'queued_at'], batch_size=500)
+        Task.objects.bulk_update(deduplicated, ['matrix_size', 'input_hash', 'deduplicated_from', 'status', *Task.RESULT_FIELDS, 'result_message', 'completed_at'], batch_size=500)
+        Task.objects.bulk_update(failed, ['status', 'result_message', 'completed_at'], batch_size=500)
+        TaskLog.objects.bulk_create([log for log in logs if log.task_id not in cancelled_ids], batch_size=500)
+    Task.touch(t.id for t in parsed + deduplicated + failed)
+    # Лідер міг завершитися між пошуком і збереженням — інакше послідовник лишився б у черзі, яку диспетчер не бачить.
+    sources = {t.deduplicated_from_id for t in parsed if t.deduplicated_from_id}
+    finished_sources = list(Task.objects.filter(
+        id__in=sources, status__in=[Task.Status.COMPLETED, Task.Status.FAILED, Task.Status.CANCELLED]
+    )) if sources else []
+    if finished_sources:
+        Task.resolve_followers(finished_sources)
+    print(f"Batch {batch_id}: parsed {len(parsed)}, deduplicated {len(deduplicated)}, failed {len(failed)} in {time.perf_counter() - parse_started:.2f}s.")
+    if parsed:
+        try_run_next_task_from_queue.delay()
+    return f"Batch {batch_id}: parsed {len(parsed)}, failed {len(failed)}."
+
 class LuSolverTask(CeleryTask):
     def on_failure(self, exc, task_id, args, kwargs, einfo):
         task_id_from_args = args[0] if args else None
@@ -111,34 +525,78 @@ class LuSolverTask(CeleryTask):
     bind=True,
     base=LuSolverTask,
     soft_time_limit=settings.CELERY_TASK_TIME_LIMIT,
-    time_limit=settings.CELERY_TASK_TIME_LIMIT + 60
+    time_limit=settings.CELERY_TASK_TIME_LIMIT + 60,
+    # Повідомлення підтверджується лише після завершення: якщо воркер зникне, задачу отримає інший і продовжить з контрольної точки.
+    acks_late=True,
+    reject_on_worker_lost=True
 )
-def run_lu_task(self, task_id):
+def run_lu_task(self, task_id, inputs=None):
+    """inputs — (A, b) в пам'яті, якщо задачу розв'язує воркер парсингу (злитий режим); інакше A і b читаються з файлів."""
     task = None
+    task_metrics = None
+    checkpoint = None
+    record_compute_time = None
+    heartbeat_ids = []
     try:
         with transaction.atomic():
             task = Task.objects.select_for_update().get(id=task_id)
             if task.status == Task.Status.CANCELLED:
                 print(f"Task {task_id} was cancelled before execution started.")
                 return "Task was cancelled."
-            if task.status != Task.Status.QUEUED:
+            resumed = task.status == Task.Status.RUNNING and task.celery_task_id == self.request.id
+            if task.status != Task.Status.QUEUED and not resumed:
                 print(f"Task {task_id} has status {task.status} (expected QUEUED). Skipping execution.")
                 return f"Task {task_id} has unexpected status {task.status}."
-            running_tasks_count = Task.objects.filter(status=Task.Status.RUNNING).count()
-            if running_tasks_count >= settings.MAX_ACTIVE_TASKS_GLOBAL:
-                print(f"Task {task_id} hit limit just before starting ({running_tasks_count}/{settings.MAX_ACTIVE_TASKS_GLOBAL}). Re-queueing slightly.")
-                self.retry(countdown=5 + np.random.randint(0, 5), max_retries=None)
-                return f"Task {task_id} re-queued due to limit."
-            print(f"Starting task {task_id}. Setting status to RUNNING.")
-            task.celery_task_id = self.request.id
-            task.mark_status(Task.Status.RUNNING, "Задача прийнята воркером. Початок обчислень.") 
-            task.save(update_fields=['celery_task_id'])
+            if not resumed and task.celery_task_id and task.celery_task_id != self.request.id:
+                print(f"Task {task_id} was re-dispatched as {task.celery_task_id}. Skipping stale delivery.")
+                return f"Task {task_id} was re-placed."
+            if not resumed:
+                running_tasks_count = count_running_jobs()
+                queue = get_solve_queue(task.matrix_size)
+                queue_running_count = count_running_jobs(solve_queue_filter(queue))
+                # Задачі, розміщені планувальником за пам'яттю, вже мають зарезервований слот на вузлі.
+                if not task.worker_node and (running_tasks_count >= settings.MAX_ACTIVE_TASKS_GLOBAL or queue_running_count >= settings.SOLVE_QUEUE_LIMITS[queue]):
+                    if inputs is not None:
+                        print(f"Task {task_id} lost its slot before the fused solve. Leaving it to the dispatcher.")
+                        Task.objects.filter(id=task.id).update(celery_task_id=None, worker_node=None, dispatched_at=None)
+                        return f"Task {task_id} left in queue."
+                    print(f"Task {task_id} hit limit just before starting ({running_tasks_count}/{settings.MAX_ACTIVE_TASKS_GLOBAL}, {queue} {queue_running_count}/{settings.SOLVE_QUEUE_LIMITS[queue]}). Re-queueing slightly.")
+                    self.retry(countdown=5 + np.random.randint(0, 5), max_retries=None)
+                    return f"Task {task_id} re-queued due to limit."
+                print(f"Starting task {task_id}. Setting status to RUNNING.")
+                task.celery_task_id = self.request.id
+                task.save(update_fields=['celery_task_id'])
+                task.mark_status(Task.Status.RUNNING, "Задача прийнята воркером. Початок обчислень.") 
+            task.attempts += 1
+            task.save(update_fields=['attempts'])
+            # Heartbeat з'являється в тій самій транзакції, що й статус RUNNING, тож reaper не застане задачу без нього.
+            heartbeat_ids = [task.id]
+            start_task_heartbeat(heartbeat_ids, self.request.id)
+        if resumed:
+            print(f"Task {task_id} redelivered after worker loss (attempt {task.attempts}).")
+            task.add_log(f"Попередній воркер зупинився під час обчислень. Повторна спроба №{task.attempts}.", level="WARNING")
+        # Ліміт рахується за сумарним часом обчислень усіх спроб, а не за однією спробою.
+        compute_base = task.compute_seconds
+        attempt_started = time.monotonic()
+        if compute_base >= settings.LU_COMPUTE_BUDGET_SEC:
+            raise SoftTimeLimitExceeded()
+        def record_compute_time():
+            task.compute_seconds = compute_base + time.monotonic() - attempt_started
+            Task.objects.filter(id=task.id).update(compute_seconds=task.compute_seconds)
+        task_metrics = TaskMetrics(engine="lu", matrix_size=task.matrix_size).start()
+        if task.queued_at and task.started_at and not resumed:
+            task_metrics.observe("lu_queue_wait_seconds", (task.started_at - task.queued_at).total_seconds())
         def progress_callback(stage, percentage):
             try:
-                task.refresh_from_db(fields=['status'])
+                task.refresh_from_db(fields=['status', 'celery_task_id'])
                 if task.status == Task.Status.CANCELLED:
                     print(f"Task {task_id} cancelled during execution, stopping progress updates.")
                     raise InterruptedError("Task was cancelled") 
+                if task.celery_task_id != self.request.id:
+                    print(f"Task {task_id} was reassigned by the reaper, stopping this attempt.")
+                    raise InterruptedError("Task was reassigned")
+                if compute_base + time.monotonic() - attempt_started > settings.LU_COMPUTE_BUDGET_SEC:
+                    raise SoftTimeLimitExceeded()
                 task.update_progress(stage, percentage)
                 if percentage == 0 or percentage == 100 or int(percentage) % 10 == 0:
                     task.add_log(f"Етап: {stage} ({percentage:.0f}%)")
@@ -151,14 +609,48 @@ def run_lu_task(self, task_id):
             raise FileNotFoundError("Шляхи до файлів матриці або вектора не визначені в задачі.")
         matrix_path = os.path.join(settings.MEDIA_ROOT, task.matrix_file.name)
         vector_path = os.path.join(settings.MEDIA_ROOT, task.vector_file.name)
-        if not os.path.exists(matrix_path) or not os.path.exists(vector_path):
+        # У злитому режимі файли ще можуть записуватися у фоні — вони не потрібні, A і b уже в пам'яті.
+        if inputs is None and (not os.path.exists(matrix_path) or not os.path.exists(vector_path)):
             raise FileNotFoundError(f"Файл не знайдено за шляхом: {matrix_path} або {vector_path}")
-        result_vector, files_to_save = solve_lu_system(
-            matrix_path,
-            vector_path,
-            progress_callback=progress_callback,
-            save_matrices=task.save_matrices
-        )
+        timings = {}
+        if task.matrix_size and task.matrix_size >= settings.LU_CHECKPOINT_MIN_N:
+            checkpoint = FactorizationCheckpoint(
+                checkpoint_path(task),
+                settings.LU_CHECKPOINT_INTERVAL_SEC,
+                on_save=lambda column: record_compute_time(),
+            )
+            if os.path.exists(checkpoint.path):
+                task.add_log("Знайдено контрольну точку розкладу. Обчислення продовжиться з неї.")
+        solved = None
+        # Похідним величинам потрібен розклад, тож його зберігаємо і тоді, коли keep_factors вимкнено.
+        keep_path = factors_path(task) if task.keep_factors or task.products else None
+        if task.base_task_id:
+            solved = run_low_rank_update(task, matrix_path, vector_path, progress_callback, timings, keep_path)
+        if solved is None and task.engine == Task.Engine.ITERATIVE:
+            solved = run_iterative_engine(task, matrix_path, vector_path, progress_callback, timings)
+        if solved is not None:
+            result_vector, verification, factorization = solved
+        else:
+            with buffer_pool.workspace() as workspace:
+                result_vector, files_to_save, verification, factorization = solve_lu_system(
+                    matrix_path,
+                    vector_path,
+                    progress_callback=progress_callback,
+                    save_matrices=task.save_matrices,
+                    verify=task.verify_solution,
+                    pivot_tol=settings.LU_PIVOT_TOLERANCE,
+                    workspace=workspace,
+                    timings=timings,
+                    checkpoint=checkpoint,
+                    symmetric=settings.LU_CHOLESKY_ENABLED and bool(task.matrix_symmetric),
+                    factors_path=keep_path,
+                    arrays=inputs
+                )
+        task_metrics.labels["engine"] = factorization
+        task_metrics.observe("lu_solve_seconds", timings['solve'])
+        if 'factorization' in timings:
+            task_metrics.observe("lu_factorization_seconds", timings['factorization'])
+            task_metrics.observe("lu_task_gflops", factorization_gflops(task.matrix_size, timings['factorization'], factorization))
         task.refresh_from_db(fields=['status'])
         if task.status == Task.Status.CANCELLED:
             print(f"Task {task_id} was cancelled before saving results.")
@@ -170,9 +662,35 @@ def run_lu_task(self, task_id):
         np.savetxt(result_path, result_vector, fmt='%.18e')
         rel_result_path = os.path.relpath(result_path, settings.MEDIA_ROOT)
         task.result_file.name = rel_result_path
+        task.factorization = factorization
+        update_fields = ['result_file', 'factorization', 'iterations']
+        if keep_path and os.path.exists(keep_path):
+            if task.products:
+                update_fields += compute_products(task, load_stored_factors(keep_path), task.products)
+            if task.keep_factors:
+                task.factors_file.name = os.path.relpath(keep_path, settings.MEDIA_ROOT)
+                update_fields.append('factors_file')
+            else:
+                os.remove(keep_path)
+        elif keep_path:
+            task.add_log("Систему розв'язано ітераційним методом: розклад не збережено, похідні величини не обчислено.", level="WARNING")
+        if task.matrix_symmetric and factorization == Task.Factorization.LU:
+            task.add_log("Матриця симетрична, але не додатно визначена: використано LU-розклад.")
+        if verification:
+            task.residual_norm = verification['residual_norm']
+            task.condition_number = verification['condition_number']
+            update_fields += ['residual_norm', 'condition_number']
+            if task.condition_number is None:
+                task.add_log(f"Перевірка: нев'язка {task.residual_norm:.3e}.")
+            else:
+                task.add_log(f"Перевірка: нев'язка {task.residual_norm:.3e}, число обумовленості ~{task.condition_number:.3e}.")
+            if task.residual_norm > settings.LU_RESIDUAL_WARN_THRESHOLD:
+                task.add_log(f"Відносна нев'язка перевищує поріг {settings.LU_RESIDUAL_WARN_THRESHOLD:.0e}. Розв'язок може бути неточним.", level="WARNING")
+            if task.condition_number is not None and task.condition_number > settings.LU_CONDITION_WARN_THRESHOLD:
+                task.add_log("Матриця погано обумовлена. Точність розв'язку може бути низькою.", level="WARNING")
+        task.save(update_fields=update_fields)
         task.mark_status(Task.Status.COMPLETED, "Обчислення успішно завершено.")
         task.add_log("Задача виконана.")
-        task.save(update_fields=['result_file'])
         return f"Task {task_id} completed successfully."
     except InterruptedError:
         print(f"Task {task_id} execution interrupted due to cancellation.")
@@ -180,9 +698,20 @@ def run_lu_task(self, task_id):
             task.add_log("Виконання перервано (можливо, через скасування).", level="WARNING")
         try_run_next_task_from_queue.delay()
         return "Task execution interrupted."
+    except Retry:
+        raise
     except SoftTimeLimitExceeded:
+        if record_compute_time:
+            record_compute_time()
+            # Спробу обмежив ліміт Celery, а не бюджет: контрольну точку не видаляємо, задача продовжиться з неї.
+            attempt_limit = (self.request.timelimit or (None, None))[1] or self.soft_time_limit
+            if settings.LU_COMPUTE_BUDGET_SEC - compute_base > attempt_limit and task.compute_seconds < settings.LU_COMPUTE_BUDGET_SEC:
+                if requeue_for_resume(task, self.request.id):
+                    print(f"Task {task_id} hit the per-attempt time limit ({task.compute_seconds:.0f}/{settings.LU_COMPUTE_BUDGET_SEC}s of budget). Re-queued to resume.")
+                    try_run_next_task_from_queue.delay()
+                    return f"Task {task_id} re-queued to resume from checkpoint."
         if task and task.status not in [Task.Status.COMPLETED, Task.Status.FAILED, Task.Status.CANCELLED]:
-            error_msg = f"Помилка: Перевищено ліміт часу виконання ({settings.CELERY_TASK_TIME_LIMIT} c)."
+            error_msg = f"Помилка: Перевищено ліміт часу обчислень ({settings.LU_COMPUTE_BUDGET_SEC} c)."
             task.mark_status(Task.Status.FAILED, error_msg) 
             task.add_log("Задача примусово зупинена через перевищення ліміту часу.", level="ERROR")
         elif not task: print(f"CRITICAL ERROR: Task {task_id} not found in SoftTimeLimitExceeded handler.")
@@ -210,4 +739,271 @@ def run_lu_task(self, task_id):
         else:
             print(f"CRITICAL ERROR: Task {current_task_id} not found in generic Exception handler. Error: {repr(e)}")
         try_run_next_task_from_queue.delay()
-        return f"Task {current_task_id} failed: {str(e)}"
\ No newline at end of file
+        return f"Task {current_task_id} failed: {str(e)}"
+    finally:
+        if task_metrics:
+            task_metrics.finish()
+        if record_compute_time:
+            record_compute_time()
+        # Контрольна точка належить новому виконавцю, якщо reaper уже передав йому задачу.
+        if checkpoint and task.celery_task_id == self.request.id:
+            checkpoint.clear()
+        stop_task_heartbeat(heartbeat_ids, self.request.id)
+
+@shared_task(
+    bind=True,
+    soft_time_limit=settings.CELERY_TASK_TIME_LIMIT,
+    time_limit=settings.CELERY_TASK_TIME_LIMIT + 60
+)
+def run_small_task_batch(self, task_ids):
+    """Розв'язує мікропакет малих систем однакового розміру одним векторизованим LU."""
+    task_metrics = None
+    tasks = []
+    retrying = False
+    try:
+        with transaction.atomic():
+            tasks = list(Task.objects.select_for_update().filter(
+                id__in=task_ids, status=Task.Status.QUEUED
+            ).order_by('id'))
+            tasks = [t for t in tasks if not t.celery_task_id or t.celery_task_id == self.request.id]
+            if not tasks:
+                return "Micro-batch has no queued tasks."
+            queue = get_solve_queue(tasks[0].matrix_size)
+            running_tasks_count = count_running_jobs()
+            queue_running_count = count_running_jobs(solve_queue_filter(queue))
+            if not tasks[0].worker_node and (running_tasks_count >= settings.MAX_ACTIVE_TASKS_GLOBAL or queue_running_count >= settings.SOLVE_QUEUE_LIMITS[queue]):
+                print(f"Micro-batch of {len(tasks)} hit limit just before starting. Re-queueing slightly.")
+                self.retry(countdown=5 + np.random.randint(0, 5), max_retries=None)
+            started_at = timezone.now()
+            Task.objects.filter(id__in=[t.id for t in tasks]).update(
+                status=Task.Status.RUNNING, started_at=started_at, celery_task_id=self.request.id, attempts=F('attempts') + 1
+            )
+            Task.touch(t.id for t in tasks)
+            start_task_heartbeat([t.id for t in tasks], self.request.id)
+        n = tasks[0].matrix_size
+        task_metrics = TaskMetrics(engine="lu_batch", matrix_size=n).start()
+        for task in tasks:
+            if task.queued_at:
+                task_metrics.observe("lu_queue_wait_seconds", (started_at - task.queued_at).total_seconds())
+
+        load_started = time.perf_counter()
+        A = np.empty((len(tasks), n, n))
+        b = np.empty((len(tasks), n))
+        for i, task in enumerate(tasks):
+            A[i] = np.loadtxt(os.path.join(settings.MEDIA_ROOT, task.matrix_file.name), ndmin=2)
+            b[i] = np.loadtxt(os.path.join(settings.MEDIA_ROOT, task.vector_file.name), ndmin=1)
+        factorization_started = time.perf_counter()
+        LU, perm, singular = batched_lu_factor(A, pivot_tol=settings.LU_PIVOT_TOLERANCE)
+        solve_started = time.perf_counter()
+        X = batched_lu_solve(LU, perm, b)
+        solve_finished = time.perf_counter()
+        # Перевірка (зокрема точне cond_1) рахується лише для систем, де її замовили.
+        verified = [i for i, task in enumerate(tasks) if task.verify_solution]
+        residual_norms, condition_numbers = batched_verify(A[verified], b[verified], X[verified]) if verified else ([], [])
+        verification = {i: (float(residual_norms[k]), float(condition_numbers[k])) for k, i in enumerate(verified)}
+        print(f"Micro-batch of {len(tasks)} (n={n}): load {factorization_started - load_started:.3f}s, "
+              f"factorization {solve_started - factorization_started:.3f}s, solve {solve_finished - solve_started:.3f}s.")
+        task_metrics.observe("lu_factorization_seconds", solve_started - factorization_started)
+        task_metrics.observe("lu_solve_seconds", solve_finished - solve_started)
+        task_metrics.observe("lu_task_gflops", factorization_gflops(n, solve_started - factorization_started) * len(tasks))
+
+        # Не перезаписуємо задачі, скасовані під час обчислення.
+        still_running = set(Task.objects.filter(id__in=[t.id for t in tasks], status=Task.Status.RUNNING).values_list('id', flat=True))
+        completed_at = timezone.now()
+        finished, logs = [], []
+        for i, task in enumerate(tasks):
+            if task.id not in still_running:
+                continue
+            task.completed_at = completed_at
+            if singular[i]:
+                task.status = Task.Status.FAILED
+                task.result_message = "Помилка під час виконання: Матриця сингулярна або вироджена."
+                logs.append(TaskLog(task=task, message=task.result_message, level="ERROR"))
+            else:
+                result_path = os.path.join(os.path.dirname(os.path.join(settings.MEDIA_ROOT, task.matrix_file.name)), "result_X.txt")
+                np.savetxt(result_path, X[i], fmt='%.18e')
+                task.result_file.name = os.path.relpath(result_path, settings.MEDIA_ROOT)
+                task.status = Task.Status.COMPLETED
+                task.result_message = "Обчислення успішно завершено."
+                task.factorization = Task.Factorization.LU
+                if task.verify_solution:
+                    task.residual_norm, task.condition_number = verification[i]
+                logs.append(TaskLog(task=task, message=f"Задача виконана в мікропакеті з {len(tasks)} систем."))
+            finished.append(task)
+        with transaction.atomic():
+            Task.objects.bulk_update(
+                finished,
+                ['status', 'result_message', 'result_file', 'factorization', 'residual_norm', 'condition_number', 'completed_at'],
+                batch_size=500
+            )
+            TaskLog.objects.bulk_create(logs, batch_size=500)
+        for task in finished:
+            task.send_websocket_update(stage="Завершено", percentage=100)
+        Task.resolve_followers(finished)
+        return f"Micro-batch of {len(tasks)} tasks finished ({int(singular.sum())} singular)."
+    except Exception as e:
+        if isinstance(e, Retry):
+            retrying = True
+            raise
+        error_msg = f"Помилка під час виконання мікропакета: {str(e)}"
+        print(f"Micro-batch {task_ids} failed: {repr(e)}")
+        Task.objects.filter(id__in=[t.id for t in tasks], status=Task.Status.RUNNING).update(
+            status=Task.Status.FAILED, result_message=error_msg, completed_at=timezone.now()
+        )
+        Task.touch(t.id for t in tasks)
+        Task.resolve_followers(list(Task.objects.filter(id__in=[t.id for t in tasks], status=Task.Status.FAILED)))
+        return f"Micro-batch failed: {str(e)}"
+    finally:
+        if task_metrics:
+            task_metrics.finish()
+        stop_task_heartbeat([t.id for t in tasks], self.request.id)
+        # Пакет, відкладений через ліміт, лишається за цим повідомленням — диспетчеру тут нема чого робити.
+        if not retrying:
+            try_run_next_task_from_queue.delay()
+
+@shared_task(
+    bind=True,
+    soft_time_limit=settings.CELERY_TASK_TIME_LIMIT,
+    time_limit=settings.CELERY_TASK_TIME_LIMIT + 60
+)
+def compute_task_products(self, task_id, products):
+    """Похідні величини для завершеної задачі зі збереженим розкладом (keep_factors)."""
+    task = Task.objects.get(id=task_id)
+    try:
+        solver = load_stored_factors(os.path.join(settings.MEDIA_ROOT, task.factors_file.name))
+        task.save(update_fields=compute_products(task, solver, products))
+        # Версія змінюється лише після збереження, інакше кеш деталей задачі встиг би зберегти стару відповідь.
+        Task.touch([task.id])
+        return f"Products {products} computed for task {task_id}."
+    except SoftTimeLimitExceeded:
+        task.add_log(f"Обчислення похідних величин перервано: ліміт часу {settings.CELERY_TASK_TIME_LIMIT} c.", level="ERROR")
+    except Exception as e:
+        task.add_log(f"Помилка обчислення похідних величин: {e}", level="ERROR")
+    return f"Products failed for task {task_id}."
+
+def reserve_session_slot(matrix_size):
+    """Підбирає слот для резидентної сесії. Повертає (параметри apply_async, вузол, помилка)."""
+    queue = get_solve_queue(matrix_size)
+    planner = AdmissionPlanner.from_workers()
+    slots = planner.queue_processes(queue) if planner.handles(queue) else settings.SOLVE_QUEUE_LIMITS[queue]
+    # Сесія може годинами тримати процес воркера — не даємо сесіям зайняти всю чергу.
+    session_limit = min(settings.SESSION_MAX_PER_QUEUE, slots - 1)
+    if SolverSession.objects.filter(solve_queue_filter(queue), status__in=SolverSession.ACTIVE_STATUSES).count() >= session_limit:
+        return None, None, f"Ліміт резидентних сесій для черги {queue} вичерпано ({max(session_limit, 0)}). Спробуйте пізніше."
+    if planner.handles(queue):
+        node = planner.place(queue, estimate_memory_mb(matrix_size), 0.0)
+        if node is None:
+            return None, None, "Немає вільного воркера з достатньою пам'яттю для сесії. Спробуйте пізніше."
+        return {'queue': worker_direct(node)}, node, None
+    if count_running_jobs() >= settings.MAX_ACTIVE_TASKS_GLOBAL or count_running_jobs(solve_queue_filter(queue)) >= settings.SOLVE_QUEUE_LIMITS[queue]:
+        return None, None, "Усі воркери зайняті. Спробуйте створити сесію пізніше."
+    return {'queue': queue}, None, None
+
+@shared_task(
+    bind=True,
+    soft_time_limit=settings.SESSION_MAX_LIFETIME_SEC,
+    time_limit=settings.SESSION_MAX_LIFETIME_SEC + 60
+)
+def run_solver_session(self, session_id):
+    """Резидентна сесія: один раз розкладає A і відповідає на нові праві частини, доки її не закриють,
+    не мине idle-таймаут або SESSION_MAX_LIFETIME_SEC."""
+    session = SolverSession.objects.get(id=session_id)
+    if session.status != SolverSession.Status.STARTING:
+        return f"Session {session_id} is {session.status}."
+    # Спершу heartbeat, потім celery_task_id — інакше reaper може встигнути вважати сесію втраченою.
+    start_task_heartbeat([heartbeat_id(session.uuid)], self.request.id)
+    session.celery_task_id = self.request.id
+    session.worker_node = self.request.hostname
+    SolverSession.objects.filter(id=session.id).update(celery_task_id=session.celery_task_id, worker_node=session.worker_node)
+    status = SolverSession.Status.CLOSED
+    try:
+        A = np.loadtxt(os.path.join(settings.MEDIA_ROOT, session.matrix_file.name), ndmin=2)
+        factors = ResidentFactors.factorize(
+            A, symmetric=settings.LU_CHOLESKY_ENABLED and bool(session.matrix_symmetric), pivot_tol=settings.LU_PIVOT_TOLERANCE
+        )
+        del A
+        session.factorization = factors.method
+        session.mark_status(SolverSession.Status.READY, f"Множники в пам'яті ({factors.nbytes / (1024 * 1024):.1f} МБ). Очікування правих частин.")
+        print(f"Session {session_id} ready on {session.worker_node} ({factors.method}, n={factors.n}).")
+        def on_solved():
+            SolverSession.objects.filter(id=session.id).update(solves=F('solves') + 1, last_activity_at=timezone.now())
+        reason = serve_requests(session.uuid, factors, session.idle_timeout_sec, settings.SESSION_REPLY_TTL, on_solved)
+        message = "Сесію закрито користувачем." if reason == "closed" else f"Сесію закрито після {session.idle_timeout_sec} c без запитів."
+    except SoftTimeLimitExceeded:
+        message = f"Сесію закрито: досягнуто максимальної тривалості ({settings.SESSION_MAX_LIFETIME_SEC} c)."
+    except np.linalg.LinAlgError as e:
+        status, message = SolverSession.Status.FAILED, f"Матриця сингулярна або вироджена. {e}"
+    except Exception as e:
+        status, message = SolverSession.Status.FAILED, f"Помилка сесії: {e}"
+    try:
+        session.refresh_from_db(fields=['solves', 'last_activity_at'])
+        session.mark_status(status, message)
+        drain_requests(session.uuid, message, settings.SESSION_REPLY_TTL)
+    finally:
+        stop_task_heartbeat([heartbeat_id(session.uuid)], self.request.id)
+        try_run_next_task_from_queue.delay()
+    return f"Session {session_id}: {message}"
+
+def reap_stale_sessions(r, now):
+    """Завершує сесії, воркер яких зник, і ті, які жоден воркер не прийняв за ADMISSION_DISPATCH_TIMEOUT_SEC."""
+    sessions = list(SolverSession.objects.filter(status__in=SolverSession.ACTIVE_STATUSES))
+    started = [s for s in sessions if s.celery_task_id]
+    owners = r.mget([task_heartbeat_key(heartbeat_id(s.uuid), s.celery_task_id) for s in started]) if started else []
+    lost = [s for s, owner in zip(started, owners) if owner is None]
+    cutoff = now - timedelta(seconds=settings.ADMISSION_DISPATCH_TIMEOUT_SEC)
+    never_started = [s for s in sessions if not s.celery_task_id and s.created_at < cutoff]
+    for session in lost:
+        session.mark_status(SolverSession.Status.FAILED, "Воркер сесії перестав відповідати. Створіть сесію заново.")
+    for session in never_started:
+        session.mark_status(SolverSession.Status.FAILED, "Сесію не вдалося запустити: жоден воркер її не прийняв.")
+    return len(lost) + len(never_started)
+
+@shared_task(ignore_result=True)
+def reap_stale_tasks():
+    """Знаходить задачі RUNNING без heartbeat (воркер зник: OOM, втрата вузла, масштабування) і повертає їх у чергу
+    з контрольної точки або, після TASK_MAX_ATTEMPTS спроб, завершує з помилкою. Також знімає резерв із вузлів, що зникли,
+    і закриває втрачені резидентні сесії."""
+    try:
+        live_nodes = {state["node"] for state in get_worker_runtime_states() if state.get("node")}
+        r = get_redis_connection()
+        now = timezone.now()
+        requeued, failed, logs = [], [], []
+        with transaction.atomic():
+            # Задачі, які саме зараз стартують, заблоковані воркером — їх пропускаємо.
+            running = list(Task.objects.select_for_update(skip_locked=True).filter(status=Task.Status.RUNNING))
+            owners = r.mget([task_heartbeat_key(t.id, t.celery_task_id) for t in running]) if running else []
+            for task, owner in zip(running, owners):
+                if owner is not None:
+                    continue
+                node = task.worker_node or "невідомий вузол"
+                if task.attempts >= settings.TASK_MAX_ATTEMPTS:
+                    task.status = Task.Status.FAILED
+                    task.result_message = f"Воркер зупинявся під час обчислень {task.attempts} раз(и). Задачу припинено."
+                    task.completed_at = now
+                    failed.append(task)
+                    logs.append(TaskLog(task=task, message=task.result_message, level="ERROR"))
+                else:
+                    task.status = Task.Status.QUEUED
+                    resume_note = " Обчислення продовжиться з контрольної точки." if os.path.exists(checkpoint_path(task)) else ""
+                    logs.append(TaskLog(task=task, message=f"Воркер ({node}) перестав відповідати. Задачу повернуто в чергу.{resume_note}", level="WARNING"))
+                    requeued.append(task)
+                task.celery_task_id = None
+                task.worker_node = None
+                task.dispatched_at = None
+            Task.objects.bulk_update(requeued + failed, ['status', 'result_message', 'completed_at', 'celery_task_id', 'worker_node', 'dispatched_at'])
+            TaskLog.objects.bulk_create(logs)
+            released = Task.objects.filter(status=Task.Status.QUEUED, worker_node__isnull=False).exclude(
+                worker_node__in=live_nodes
+            ).update(worker_node=None, dispatched_at=None, celery_task_id=None)
+        for task in failed:
+            if os.path.exists(checkpoint_path(task)):
+                os.remove(checkpoint_path(task))
+        for task in requeued + failed:
+            task.send_websocket_update()
+        Task.resolve_followers(failed)
+        lost_sessions = reap_stale_sessions(r, now)
+        if requeued or failed or released or lost_sessions:
+            print(f"Reaper: requeued {len(requeued)}, failed {len(failed)}, released {released} dispatch(es) from lost nodes, closed {lost_sessions} session(s).")
+            try_run_next_task_from_queue.delay()
+    except Exception as e:
+        print(f"Error in reap_stale_tasks: {e}")
\ No newline at end of file
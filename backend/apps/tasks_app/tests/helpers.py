@@ -0,0 +1,153 @@
+import fnmatch
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.test import override_settings
+
+from apps.tasks_app import utils
+
+
+def _bytes(value):
+    return value if isinstance(value, bytes) else str(value).encode()
+
+
+class InMemoryRedis:
+    """Команди Redis, якими користується застосунок, в пам'яті процесу — для тестів без сервера Redis."""
+
+    def __init__(self):
+        self.data = {}
+        self.cond = threading.Condition()
+
+    def _key(self, key):
+        return key.decode() if isinstance(key, bytes) else key
+
+    def get(self, key):
+        return self.data.get(self._key(key))
+
+    def set(self, key, value, ex=None, nx=False):
+        key = self._key(key)
+        if nx and key in self.data:
+            return None
+        self.data[key] = _bytes(value)
+        return True
+
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+    def delete(self, *keys):
+        return sum(self.data.pop(self._key(key), None) is not None for key in keys)
+
+    def expire(self, key, seconds):
+        return self._key(key) in self.data
+
+    def scan_iter(self, match="*"):
+        return [key.encode() for key in list(self.data) if fnmatch.fnmatch(key, match)]
+
+    def hset(self, key, mapping=None, **kwargs):
+        self.data.setdefault(self._key(key), {}).update({_bytes(k): _bytes(v) for k, v in (mapping or {}).items()})
+
+    def hget(self, key, field):
+        return self.data.get(self._key(key), {}).get(_bytes(field))
+
+    def hgetall(self, key):
+        return dict(self.data.get(self._key(key), {}))
+
+    def hincrby(self, key, field, amount=1):
+        values = self.data.setdefault(self._key(key), {})
+        values[_bytes(field)] = _bytes(int(values.get(_bytes(field), b"0")) + amount)
+        return int(values[_bytes(field)])
+
+    def hincrbyfloat(self, key, field, amount):
+        values = self.data.setdefault(self._key(key), {})
+        values[_bytes(field)] = _bytes(float(values.get(_bytes(field), b"0")) + amount)
+        return float(values[_bytes(field)])
+
+    def rpush(self, key, *values):
+        with self.cond:
+            items = self.data.setdefault(self._key(key), [])
+            items.extend(_bytes(value) for value in values)
+            self.cond.notify_all()
+            return len(items)
+
+    def lpop(self, key):
+        items = self.data.get(self._key(key))
+        return items.pop(0) if items else None
+
+    def blpop(self, keys, timeout=0):
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                for key in keys:
+                    if self.data.get(self._key(key)):
+                        return _bytes(key), self.data[self._key(key)].pop(0)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+    def llen(self, key):
+        return len(self.data.get(self._key(key), []))
+
+    def lrange(self, key, start, end):
+        items = self.data.get(self._key(key), [])
+        return items[start:] if end == -1 else items[start:end + 1]
+
+    def ltrim(self, key, start, end):
+        items = self.data.get(self._key(key), [])
+        self.data[self._key(key)] = items[start:] if end == -1 else items[start:end + 1]
+
+    def zadd(self, key, mapping):
+        self.data.setdefault(self._key(key), {}).update(mapping)
+
+    def zrem(self, key, *members):
+        for member in members:
+            self.data.get(self._key(key), {}).pop(member, None)
+
+    def zcard(self, key):
+        return len(self.data.get(self._key(key), {}))
+
+    def zremrangebyscore(self, key, low, high):
+        members = self.data.get(self._key(key), {})
+        for member in [m for m, score in members.items() if low <= score <= high]:
+            del members[member]
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((getattr(self.redis, name), args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        calls, self.calls = self.calls, []
+        return [method(*args, **kwargs) for method, args, kwargs in calls]
+
+
+class IsolatedServicesMixin:
+    """Redis у пам'яті, channel layer у пам'яті й тимчасовий MEDIA_ROOT для кожного тесту."""
+
+    def setUp(self):
+        super().setUp()
+        self.redis = InMemoryRedis()
+        redis_patch = mock.patch.object(utils, "_redis_connection", self.redis)
+        redis_patch.start()
+        self.addCleanup(redis_patch.stop)
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+        services = override_settings(
+            MEDIA_ROOT=self.media_root,
+            CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+        )
+        services.enable()
+        self.addCleanup(services.disable)
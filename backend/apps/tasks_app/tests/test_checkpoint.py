@@ -0,0 +1,58 @@
+import os
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from apps.tasks_app import tasks as task_module
+from apps.tasks_app.models import Task
+from apps.tasks_app.parsing import checkpoint_path, task_dir_path
+
+from .helpers import IsolatedServicesMixin
+
+
+@override_settings(CELERY_TASK_TIME_LIMIT=600, LU_CHECKPOINT_MIN_N=1)
+class CheckpointResumeTests(IsolatedServicesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        owner = get_user_model().objects.create(username="checkpoint", email="checkpoint@example.com")
+        self.task = Task.objects.create(owner=owner, status=Task.Status.QUEUED, matrix_size=4)
+        os.makedirs(task_dir_path(self.task), exist_ok=True)
+        for field, data in (("matrix_file", np.eye(4)), ("vector_file", np.ones(4))):
+            path = os.path.join(task_dir_path(self.task), f"{field}.txt")
+            np.savetxt(path, data)
+            getattr(self.task, field).name = os.path.relpath(path, self.media_root)
+        self.task.save()
+        with open(checkpoint_path(self.task), "wb") as f:
+            f.write(b"checkpoint")
+
+    def run_until_time_limit(self):
+        with mock.patch.object(task_module, "solve_lu_system", side_effect=task_module.SoftTimeLimitExceeded()), \
+                mock.patch.object(task_module, "start_task_heartbeat"), \
+                mock.patch.object(task_module, "stop_task_heartbeat"), \
+                mock.patch.object(task_module.try_run_next_task_from_queue, "delay"):
+            result = task_module.run_lu_task.apply(args=[self.task.id], task_id="attempt-1").get()
+        self.task.refresh_from_db()
+        return result
+
+    @override_settings(LU_COMPUTE_BUDGET_SEC=3600)
+    def test_attempt_limit_requeues_and_keeps_checkpoint(self):
+        result = self.run_until_time_limit()
+        self.assertIn("resume", result)
+        self.assertEqual(self.task.status, Task.Status.QUEUED)
+        self.assertIsNone(self.task.celery_task_id)
+        self.assertTrue(os.path.exists(checkpoint_path(self.task)))
+
+    @override_settings(LU_COMPUTE_BUDGET_SEC=600)
+    def test_exhausted_budget_fails_and_clears_checkpoint(self):
+        self.run_until_time_limit()
+        self.assertEqual(self.task.status, Task.Status.FAILED)
+        self.assertFalse(os.path.exists(checkpoint_path(self.task)))
+
+    @override_settings(LU_COMPUTE_BUDGET_SEC=3600)
+    def test_attempt_limit_follows_remaining_budget(self):
+        self.task.compute_seconds = 3300
+        self.assertEqual(task_module.attempt_time_limits(self.task), {"soft_time_limit": 300, "time_limit": 360})
+        self.task.compute_seconds = 0
+        self.assertEqual(task_module.attempt_time_limits(self.task)["soft_time_limit"], 600)
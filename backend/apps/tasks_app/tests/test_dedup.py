@@ -0,0 +1,73 @@
+import os
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db.models.fields.files import FieldFile
+from django.test import TestCase
+
+from apps.tasks_app import tasks as task_module
+from apps.tasks_app.models import Task, TaskBatch
+from apps.tasks_app.parsing import batch_input_path, task_dir_path
+
+from .helpers import IsolatedServicesMixin
+
+
+class ResolveFollowersTests(TestCase):
+    def setUp(self):
+        self.owner = get_user_model().objects.create(username="dedup", email="dedup@example.com")
+
+    def test_follower_gets_factorization_and_products_of_leader(self):
+        leader = Task.objects.create(
+            owner=self.owner, status=Task.Status.COMPLETED, matrix_size=3, matrix_symmetric=True,
+            factorization=Task.Factorization.CHOLESKY, residual_norm=1e-15, condition_number=4.0,
+            determinant_sign=1, log_abs_determinant=2.5,
+        )
+        for field, name in (("result_file", "x.txt"), ("factors_file", "factors.npz"), ("inverse_file", "A_inv.npy")):
+            getattr(leader, field).name = f"tasks/{leader.uuid}/{name}"
+        leader.save()
+        follower = Task.objects.create(owner=self.owner, status=Task.Status.QUEUED, matrix_size=3, deduplicated_from=leader)
+        with mock.patch.object(Task, "send_websocket_update"):
+            Task.resolve_followers([leader])
+        follower.refresh_from_db()
+        self.assertEqual(follower.status, Task.Status.COMPLETED)
+        for field in Task.RESULT_FIELDS:
+            leader_value, follower_value = getattr(leader, field), getattr(follower, field)
+            if isinstance(leader_value, FieldFile):
+                leader_value, follower_value = leader_value.name or "", follower_value.name or ""
+            self.assertEqual(follower_value, leader_value, field)
+
+
+class BatchDeduplicationTests(IsolatedServicesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = get_user_model().objects.create(username="batch-dedup", email="batch-dedup@example.com")
+        self.leader = Task.objects.create(
+            owner=self.owner, status=Task.Status.COMPLETED, matrix_size=2, factorization=Task.Factorization.LU, residual_norm=1e-16
+        )
+        self.leader.result_file.name = f"tasks/{self.leader.uuid}/result_X.txt"
+        self.leader.save()
+        self.batch = TaskBatch.objects.create(owner=self.owner, total_tasks=1)
+        self.task = Task.objects.create(owner=self.owner, batch=self.batch, status=Task.Status.PENDING)
+        os.makedirs(task_dir_path(self.task), exist_ok=True)
+        with open(batch_input_path(self.task), "w") as f:
+            f.write("2 0 1\n0 2 1\n")
+
+    def parse(self, source):
+        with mock.patch.object(task_module, "find_duplicate_source", return_value=source), \
+                mock.patch.object(task_module.try_run_next_task_from_queue, "delay"):
+            task_module.parse_task_batch.run(self.batch.id)
+        self.task.refresh_from_db()
+
+    def test_completed_leader_result_is_copied(self):
+        self.parse(self.leader)
+        self.assertEqual(self.task.status, Task.Status.COMPLETED)
+        self.assertEqual(self.task.factorization, Task.Factorization.LU)
+        self.assertEqual(self.task.result_file.name, self.leader.result_file.name)
+
+    def test_leader_finished_during_parsing_resolves_follower(self):
+        # Пошук бачив лідера ще в черзі; до збереження послідовника лідер уже завершився.
+        in_flight = Task.objects.get(id=self.leader.id)
+        in_flight.status = Task.Status.RUNNING
+        self.parse(in_flight)
+        self.assertEqual(self.task.status, Task.Status.COMPLETED)
+        self.assertEqual(self.task.factorization, Task.Factorization.LU)
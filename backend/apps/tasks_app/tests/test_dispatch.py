@@ -0,0 +1,106 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.tasks_app import admission, tasks as task_module
+from apps.tasks_app.admission import AdmissionPlanner
+from apps.tasks_app.models import Task
+
+from .helpers import IsolatedServicesMixin
+
+
+def no_capacity_reports():
+    # Жоден вузол не повідомив ємність — диспетчер працює за лімітами кількості.
+    return mock.patch.object(task_module.AdmissionPlanner, "from_workers", return_value=AdmissionPlanner({}))
+
+
+@override_settings(MICRO_BATCH_WINDOW_SEC=0, MICRO_BATCH_MAX_SIZE=8, MICRO_BATCH_MAX_N=100, MAX_ACTIVE_TASKS_GLOBAL=4,
+                   SOLVE_QUEUE_LIMITS={"solve_small": 4, "solve_large": 1})
+class CountModeDispatchTests(IsolatedServicesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = get_user_model().objects.create(username="dispatch", email="dispatch@example.com")
+
+    def queued(self, count, n=10):
+        return [Task.objects.create(owner=self.owner, status=Task.Status.QUEUED, matrix_size=n) for _ in range(count)]
+
+    def dispatch(self):
+        with no_capacity_reports(), \
+                mock.patch.object(task_module.run_small_task_batch, "apply_async") as send_batch, \
+                mock.patch.object(task_module.run_lu_task, "apply_async") as send_task, \
+                self.captureOnCommitCallbacks(execute=True):
+            task_module.try_run_next_task_from_queue()
+        return send_batch, send_task
+
+    def test_dispatched_batch_is_not_selected_again(self):
+        group = self.queued(3)
+        first_batch, _ = self.dispatch()
+        second_batch, second_task = self.dispatch()
+        self.assertEqual(first_batch.call_count, 1)
+        self.assertEqual(sorted(first_batch.call_args.kwargs["args"][0]), [t.id for t in group])
+        self.assertFalse(second_batch.called)
+        self.assertFalse(second_task.called)
+        celery_task_id = first_batch.call_args.kwargs["task_id"]
+        self.assertEqual(set(Task.objects.values_list("celery_task_id", flat=True)), {celery_task_id})
+
+    def test_dispatched_jobs_take_slots_until_they_start(self):
+        self.queued(1, n=2000)
+        self.queued(1, n=2000)
+        _, first = self.dispatch()
+        _, second = self.dispatch()
+        self.assertEqual(first.call_count, 1)
+        self.assertFalse(second.called)
+
+    def test_stale_delivery_is_skipped(self):
+        task, = self.queued(1, n=2000)
+        Task.objects.filter(id=task.id).update(celery_task_id="current-dispatch")
+        with mock.patch.object(task_module.try_run_next_task_from_queue, "delay"):
+            result = task_module.run_lu_task.apply(args=[task.id], task_id="previous-dispatch").get()
+        self.assertIn("re-placed", result)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.Status.QUEUED)
+
+    def test_batch_retry_does_not_redispatch(self):
+        group = self.queued(2)
+        Task.objects.create(owner=self.owner, status=Task.Status.RUNNING, matrix_size=10, celery_task_id="busy")
+        with override_settings(MAX_ACTIVE_TASKS_GLOBAL=1), \
+                mock.patch.object(task_module.run_small_task_batch, "retry", side_effect=task_module.Retry()), \
+                mock.patch.object(task_module.try_run_next_task_from_queue, "delay") as dispatcher, \
+                mock.patch.object(task_module, "stop_task_heartbeat"):
+            with self.assertRaises(task_module.Retry):
+                task_module.run_small_task_batch.run([t.id for t in group])
+        self.assertFalse(dispatcher.called)
+        self.assertEqual(Task.objects.filter(id__in=[t.id for t in group], status=Task.Status.QUEUED).count(), 2)
+
+
+@override_settings(ADMISSION_MEMORY_FRACTION=1.0, ADMISSION_WORKER_BASE_MB=100, WORKER_BUFFER_POOL_MAX_MB=1024,
+                   WORKER_BUFFER_POOL_MEMORY_FRACTION=0.1)
+class AdmissionCapacityTests(TestCase):
+    def capacity(self, *states):
+        base = {"node": "celery@solve", "ready": "1", "queues": "solve_large", "memory_limit_mb": "4000"}
+        with mock.patch.object(admission, "get_worker_runtime_states", return_value=[{**base, **state} for state in states]):
+            return AdmissionPlanner.from_workers().max_memory_mb("solve_large")
+
+    def test_reported_buffer_pool_is_not_admitted(self):
+        self.assertEqual(self.capacity({"buffer_pool_max_bytes": str(300 * admission.MB)}), 4000 - 100 - 300)
+
+    def test_unreported_buffer_pool_uses_the_cap(self):
+        # Частка 0.1 від 4000 МБ ділиться між двома процесами: по 200 МБ на кожен.
+        self.assertEqual(self.capacity({}, {}), 4000 - 2 * 100 - 2 * 200)
+
+
+@override_settings(MAX_ACTIVE_TASKS_GLOBAL=1, MAX_ACTIVE_TASKS_PER_USER=5)
+class TaskCreationTests(IsolatedServicesMixin, TestCase):
+    def test_global_load_is_left_to_the_dispatcher(self):
+        other = get_user_model().objects.create(username="busy", email="busy@example.com")
+        Task.objects.create(owner=other, status=Task.Status.RUNNING, matrix_size=10)
+        owner = get_user_model().objects.create(username="creator", email="creator@example.com")
+        client = APIClient()
+        client.force_authenticate(owner)
+        with mock.patch.object(task_module.parse_and_prepare_task_data, "delay") as parse:
+            response = client.post("/api/tasks/", {"matrix_text": "2 0 1\n0 2 1\n"}, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(parse.called)
+        self.assertEqual(Task.objects.get(owner=owner).status, Task.Status.PENDING)
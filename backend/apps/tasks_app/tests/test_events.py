@@ -0,0 +1,56 @@
+import asyncio
+import random
+
+from django.test import SimpleTestCase
+
+from apps.tasks_app.events import EventPublisher
+
+
+class RecordingLayer:
+    """Channel layer з випадковою затримкою: паралельні group_send завершуються в довільному порядку."""
+
+    def __init__(self):
+        self.received = []
+
+    async def group_send(self, group, event):
+        await asyncio.sleep(random.random() / 1000)
+        self.received.append((group, dict(event)))
+
+
+def task_event(status, percentage=None, log_message=None, task_id="t1"):
+    return {"type": "task_update", "task_id": task_id, "status": status, "percentage": percentage, "log_message": log_message}
+
+
+class EventPublisherTests(SimpleTestCase):
+    def setUp(self):
+        self.layer = RecordingLayer()
+        self.publisher = EventPublisher(channel_layer=self.layer, max_pending=1000, batch_interval=0)
+
+    def send_batch(self):
+        batch = self.publisher._take_batch()
+        asyncio.run(self.publisher._send(batch))
+
+    def test_events_of_one_group_keep_their_order(self):
+        random.seed(0)
+        for percentage in range(50):
+            self.publisher.publish(("task_t1",), task_event("running", percentage, log_message=f"step {percentage}"))
+        self.publisher.publish(("task_t1",), task_event("completed", 100))
+        self.send_batch()
+        statuses = [event["status"] for _, event in self.layer.received]
+        self.assertEqual(statuses[-1], "completed")
+        self.assertEqual([event["percentage"] for _, event in self.layer.received], list(range(50)) + [100])
+
+    def test_progress_is_not_merged_ahead_of_a_later_event(self):
+        for event in (task_event("running", 10), task_event("running", 20), task_event("running", 25),
+                      task_event("running", log_message="checkpoint"), task_event("running", 30), task_event("running", 40)):
+            self.publisher.publish(("task_t1",), event)
+        self.send_batch()
+        received = [(event["percentage"], event["log_message"]) for _, event in self.layer.received]
+        self.assertEqual(received, [(10, None), (25, None), (None, "checkpoint"), (40, None)])
+        self.assertEqual(self.publisher.merged, 2)
+
+    def test_terminal_status_releases_task_state(self):
+        for task_id in ("a", "b", "c"):
+            self.publisher.publish(("g",), task_event("running", 50, task_id=task_id))
+            self.publisher.publish(("g",), task_event("completed", 100, task_id=task_id))
+        self.assertEqual(self.publisher._last_status, {})
@@ -0,0 +1,75 @@
+import socket
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from apps.tasks_app import tasks as task_module
+from apps.tasks_app.admission import AdmissionPlanner
+from apps.tasks_app.models import Task
+from apps.tasks_app.worker_runtime import soft_time_limit
+
+from .helpers import IsolatedServicesMixin
+
+
+def node(queue, rss_mb=0.0, memory_limit_mb=4000.0, processes=2):
+    return {
+        "queues": {queue}, "memory_limit_mb": memory_limit_mb, "memory_mb": memory_limit_mb, "processes": processes,
+        "jobs": 0, "reserved_mb": 0.0, "cpu_cost": 0.0, "buffer_pool_mb": 0.0, "rss_mb": rss_mb,
+    }
+
+
+# Злите розв'язання в тестах іде через apply(), де hostname — ім'я поточного хоста.
+PARSE_NODE = socket.gethostname()
+
+
+@override_settings(ADMISSION_MEMORY_FRACTION=1.0, ADMISSION_WORKER_BASE_MB=100, FUSED_SOLVE_ENABLED=True, FUSED_SOLVE_MAX_N=100, MICRO_BATCH_MAX_N=0, MAX_ACTIVE_TASKS_GLOBAL=4,
+                   SOLVE_QUEUE_LIMITS={"solve_small": 1, "solve_large": 1})
+class FusedSlotTests(IsolatedServicesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = get_user_model().objects.create(username="fused", email="fused@example.com")
+
+    def parse(self, planner=None):
+        task = Task.objects.create(owner=self.owner, status=Task.Status.PENDING)
+        with mock.patch.object(task_module.AdmissionPlanner, "from_workers", return_value=planner or AdmissionPlanner({})), \
+                mock.patch.object(task_module.run_lu_task, "apply") as solve, \
+                mock.patch.object(task_module.try_run_next_task_from_queue, "delay"):
+            task_module.parse_and_prepare_task_data.apply(args=[task.id], kwargs={"matrix_text": "2 0 1\n0 2 1\n"})
+        task.refresh_from_db()
+        return task, solve
+
+    def test_count_mode_takes_a_free_queue_slot(self):
+        task, solve = self.parse()
+        self.assertEqual(solve.call_count, 1)
+        self.assertEqual(solve.call_args.kwargs["task_id"], task.celery_task_id)
+        self.assertIsNone(task.worker_node)
+        self.assertIsNotNone(task.dispatched_at)
+
+    def test_dispatched_job_holds_the_queue_slot(self):
+        Task.objects.create(owner=self.owner, status=Task.Status.QUEUED, matrix_size=2, dispatched_at="2026-01-01T00:00Z", celery_task_id="sent")
+        task, solve = self.parse()
+        self.assertFalse(solve.called)
+        self.assertIsNone(task.dispatched_at)
+
+    def test_capacity_mode_runs_on_the_parse_node(self):
+        planner = AdmissionPlanner({"celery@solve": node("solve_small"), PARSE_NODE: node("parse", rss_mb=500)})
+        task, solve = self.parse(planner)
+        self.assertTrue(solve.called)
+        self.assertEqual(task.worker_node, PARSE_NODE)
+        self.assertEqual(planner.nodes["celery@solve"]["jobs"], 0)
+
+    def test_busy_parse_node_leaves_the_solve_to_the_queue(self):
+        task, solve = self.parse(AdmissionPlanner({"celery@solve": node("solve_small"), PARSE_NODE: node("parse", rss_mb=4000)}))
+        self.assertFalse(solve.called)
+        self.assertIsNone(task.worker_node)
+
+    def test_capacity_mode_needs_a_reported_parse_node(self):
+        _, solve = self.parse(AdmissionPlanner({"celery@solve": node("solve_small")}))
+        self.assertFalse(solve.called)
+
+    def test_soft_time_limit_interrupts_in_process_solve(self):
+        with self.assertRaises(task_module.SoftTimeLimitExceeded):
+            with soft_time_limit(0.05):
+                time.sleep(2)
@@ -0,0 +1,73 @@
+import os
+import time
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from apps.tasks_app import models as task_models
+from apps.tasks_app import tasks as task_module
+from apps.tasks_app.http_cache import task_cache_key
+from apps.tasks_app.lu_solver import ResidentFactors
+from apps.tasks_app.models import Task
+
+from .helpers import IsolatedServicesMixin
+
+
+class TaskVersionTests(IsolatedServicesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = get_user_model().objects.create(username="cache", email="cache@example.com")
+
+    def version(self, task):
+        return Task.objects.values_list("version", flat=True).get(id=task.id)
+
+    @override_settings(TASK_TOUCH_COALESCE_SEC=60)
+    def test_progress_touches_are_coalesced_until_a_status_change(self):
+        task = Task.objects.create(owner=self.owner, status=Task.Status.RUNNING, matrix_size=3)
+        task_models._touch_state["flushed_at"] = time.monotonic()
+        self.redis.set(task_cache_key(task.id, "events"), "{}")
+        with self.captureOnCommitCallbacks(execute=True):
+            for percentage in range(10, 60, 10):
+                task.update_progress("LU", percentage)
+                task.add_log(f"{percentage}%")
+        self.assertEqual(self.version(task), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            task.mark_status(Task.Status.COMPLETED, "done")
+        self.assertEqual(self.version(task), 1)
+        self.assertIsNone(self.redis.get(task_cache_key(task.id, "events")))
+        self.assertEqual(task_models._pending_touches, set())
+
+    def test_heartbeat_flushes_pending_touches_without_new_events(self):
+        task = Task.objects.create(owner=self.owner, status=Task.Status.RUNNING, matrix_size=3)
+        task_models._touch_state["flushed_at"] = time.monotonic()
+        with override_settings(TASK_TOUCH_COALESCE_SEC=60), self.captureOnCommitCallbacks(execute=True):
+            task.update_progress("LU", 40)
+            Task.flush_pending_touches()
+        self.assertEqual(self.version(task), 0)
+        # Етап триває без нових подій: наступний тик heartbeat після інтервалу застосовує відкладене.
+        with override_settings(TASK_TOUCH_COALESCE_SEC=0), self.captureOnCommitCallbacks(execute=True):
+            Task.flush_pending_touches()
+        self.assertEqual(self.version(task), 1)
+        self.assertEqual(task_models._pending_touches, set())
+
+    def test_products_bump_the_version_after_they_are_saved(self):
+        A = np.array([[4.0, 1.0], [2.0, 3.0]])
+        task = Task.objects.create(owner=self.owner, status=Task.Status.COMPLETED, matrix_size=2, keep_factors=True)
+        factors_path = os.path.join(self.media_root, "factors.npz")
+        ResidentFactors.factorize(A).save(factors_path)
+        task.factors_file.name = "factors.npz"
+        task.save(update_fields=["factors_file"])
+        seen = []
+        original_touch = Task.touch.__func__
+
+        def recording_touch(cls, task_ids):
+            task_ids = list(task_ids)
+            if task.id in task_ids:
+                seen.append(Task.objects.values_list("log_abs_determinant", flat=True).get(id=task.id))
+            return original_touch(cls, task_ids)
+
+        with mock.patch.object(Task, "touch", classmethod(recording_touch)):
+            task_module.compute_task_products.run(task.id, ["determinant"])
+        self.assertAlmostEqual(seen[-1], np.log(10.0))
@@ -0,0 +1,44 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+import billiard
+import numpy as np
+from django.test import SimpleTestCase
+
+from apps.tasks_app.parsing import parse_augmented_file_parallel
+
+
+def parse_in_child(path, out_path, results):
+    try:
+        A, b = parse_augmented_file_parallel(path, 100, 2, out_path, chunk_bytes=64)
+        results.put(("ok", np.asarray(A).tolist(), np.asarray(b).tolist()))
+    except Exception as e:
+        results.put(("error", repr(e), None))
+
+
+class ParallelParseTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.system = np.random.default_rng(0).random((12, 13))
+        self.path = os.path.join(self.dir, "system.txt")
+        np.savetxt(self.path, self.system)
+
+    def parse_in_daemon(self, context):
+        # Prefork-воркер Celery виконує задачі в daemon-процесах; розбір має працювати і там.
+        results = context.Queue()
+        child = context.Process(target=parse_in_child, args=(self.path, os.path.join(self.dir, "parsed.npy"), results), daemon=True)
+        child.start()
+        status, A, b = results.get(timeout=60)
+        child.join(10)
+        self.assertEqual(status, "ok", A)
+        np.testing.assert_allclose(A, self.system[:, :-1])
+        np.testing.assert_allclose(b, self.system[:, -1])
+
+    def test_parses_inside_multiprocessing_daemon(self):
+        self.parse_in_daemon(multiprocessing.get_context("fork"))
+
+    def test_parses_inside_billiard_daemon(self):
+        self.parse_in_daemon(billiard.get_context("fork"))
@@ -0,0 +1,67 @@
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.tasks_app import sessions, tasks as task_module
+from apps.tasks_app.admission import AdmissionPlanner
+from apps.tasks_app.models import SolverSession
+
+from .helpers import IsolatedServicesMixin
+
+
+class FakeFactors:
+    n = 2
+
+    def solve(self, b):
+        return 2 * b
+
+
+@override_settings(SESSION_MAX_PER_QUEUE=2, MAX_ACTIVE_TASKS_GLOBAL=8, SOLVE_QUEUE_LIMITS={"solve_small": 2, "solve_large": 1})
+class SessionSlotTests(TestCase):
+    def setUp(self):
+        self.owner = get_user_model().objects.create(username="sessions", email="sessions@example.com")
+
+    def reserve(self, n=10):
+        with mock.patch.object(task_module.AdmissionPlanner, "from_workers", return_value=AdmissionPlanner({})):
+            return task_module.reserve_session_slot(n)
+
+    def test_sessions_leave_a_slot_for_tasks(self):
+        options, _, error = self.reserve()
+        self.assertIsNone(error)
+        SolverSession.objects.create(owner=self.owner, matrix_size=10)
+        options, _, error = self.reserve()
+        self.assertIsNone(options)
+        self.assertIn("solve_small", error)
+
+    def test_single_slot_queue_takes_no_sessions(self):
+        options, _, error = self.reserve(n=5000)
+        self.assertIsNone(options)
+        self.assertIsNotNone(error)
+
+
+class SessionSolveTests(IsolatedServicesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        owner = get_user_model().objects.create(username="solver", email="solver@example.com")
+        self.session = SolverSession.objects.create(owner=owner, matrix_size=2, status=SolverSession.Status.READY)
+        self.client = APIClient()
+        self.client.force_authenticate(owner)
+        self.url = f"/api/tasks/sessions/{self.session.uuid}/solve/"
+
+    def test_solve_returns_request_id_and_result_is_polled(self):
+        response = self.client.post(self.url, {"b": [1.0, 2.0]}, format="json")
+        self.assertEqual(response.status_code, 202)
+        reply_url = f"{self.url}{response.json()['request_id']}/"
+        self.assertEqual(self.client.get(reply_url).status_code, 202)
+        self.redis.rpush(sessions.requests_key(self.session.uuid), '{"command": "close"}')
+        sessions.serve_requests(self.session.uuid, FakeFactors(), idle_timeout=5, reply_ttl=60, on_solved=lambda: None)
+        for _ in range(2):
+            response = self.client.get(reply_url)
+            self.assertEqual(response.status_code, 200)
+            np.testing.assert_allclose(response.json()["x"], [2.0, 4.0])
+
+    def test_unknown_request_is_not_found(self):
+        self.assertEqual(self.client.get(f"{self.url}{'0' * 32}/").status_code, 404)
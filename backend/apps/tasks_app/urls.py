@@ -5,9 +5,16 @@ app_name = 'tasks_app'
 
 urlpatterns = [
     path("", views.TaskListCreateView.as_view(), name="task-list-create"),
+    path("batch/", views.TaskBatchCreateView.as_view(), name="task-batch-create"),
+    path("batch/<uuid:batch_uuid>/", views.TaskBatchDetailView.as_view(), name="task-batch-detail"),
     path("<int:id>/", views.TaskDetailView.as_view(), name="task-detail"),
     path("<int:id>/cancel/", views.TaskCancelView.as_view(), name="task-cancel"),
     path("<int:id>/download/", views.TaskDownloadView.as_view(), name="task-download"),
     path("<int:id>/progress/", views.TaskProgressListView.as_view(), name="task-progress"),
     path("<int:id>/logs/", views.TaskLogListView.as_view(), name="task-logs"),
+    path("<int:id>/products/", views.TaskProductsView.as_view(), name="task-products"),
+    path("sessions/", views.SolverSessionListCreateView.as_view(), name="session-list-create"),
+    path("sessions/<uuid:session_uuid>/", views.SolverSessionDetailView.as_view(), name="session-detail"),
+    path("sessions/<uuid:session_uuid>/solve/", views.SolverSessionSolveView.as_view(), name="session-solve"),
+    path("sessions/<uuid:session_uuid>/solve/<str:request_id>/", views.SolverSessionReplyView.as_view(), name="session-reply"),
 ]
\ No newline at end of file
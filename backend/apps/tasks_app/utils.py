@@ -1,10 +1,19 @@
 import os
 import numpy as np
 import io
+import redis
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from .models import Task
 
+_redis_connection = None
+
+def get_redis_connection():
+    global _redis_connection
+    if _redis_connection is None:
+        _redis_connection = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis_connection
+
 def parse_and_save_input_data(task_id, source_file=None, matrix_text=None) -> (str, str, int):
     try:
         task = Task.objects.get(id=task_id)
@@ -1,24 +1,40 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.parsers import JSONParser, FormParser, MultiPartParser
 from django.shortcuts import get_object_or_404
 from django.http import FileResponse, Http404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from rest_framework.exceptions import ValidationError
 from django.db.models import Q
 from django.db import transaction 
+from django.conf import settings
 from celery.result import AsyncResult
-from .models import Task, TaskProgress, TaskLog
+import os
+import numpy as np
+from .models import Task, TaskBatch, TaskProgress, TaskLog, SolverSession
+from .parsing import iter_archive_members, batch_input_path, save_upload, upload_path, rhs_matrix_path
+from .parsers import CompressedMatrixParser
+from .http_cache import load_task_cache, store_task_cache, task_etag
 from .serializers import (
     TaskCreateSerializer, TaskListSerializer, TaskDetailSerializer,
-    TaskProgressSerializer, TaskLogSerializer
+    TaskProgressSerializer, TaskLogSerializer,
+    TaskBatchCreateSerializer, TaskBatchSerializer, TaskProductsSerializer,
+    SolverSessionCreateSerializer, SolverSessionSerializer
 )
-from .tasks import parse_and_prepare_task_data, try_run_next_task_from_queue, run_lu_task
+from .tasks import (
+    parse_and_prepare_task_data, parse_task_batch, try_run_next_task_from_queue, run_lu_task,
+    run_solver_session, reserve_session_slot, compute_task_products, get_solve_queue
+)
+from .admission import estimate_memory_mb
+from .sessions import PENDING, parse_rhs, submit_request, poll_reply, close_session
 from config.celery import app as celery_app
 
-MAX_ACTIVE_TASKS_PER_USER = 2
-MAX_ACTIVE_TASKS_GLOBAL = 4
-
 class TaskListCreateView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [JSONParser, FormParser, MultiPartParser, CompressedMatrixParser]
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -32,27 +48,26 @@ class TaskListCreateView(generics.ListCreateAPIView):
         user = self.request.user
         active_statuses = [Task.Status.PENDING, Task.Status.QUEUED, Task.Status.RUNNING]
         user_active_tasks = Task.objects.filter(owner=user, status__in=active_statuses).count()
-        global_active_tasks = Task.objects.filter(status__in=active_statuses).count()
+        # Загальну ємність визначає диспетчер (за пам'яттю вузлів або лімітами черг), тут — лише ліміт користувача.
         initial_status = Task.Status.PENDING
         queue_message = None
-        if user_active_tasks >= MAX_ACTIVE_TASKS_PER_USER:
+        if user_active_tasks >= settings.MAX_ACTIVE_TASKS_PER_USER:
             initial_status = Task.Status.QUEUED
-            queue_message = f"Ви досягли ліміту ({MAX_ACTIVE_TASKS_PER_USER}) одночасно активних задач. Ваша задача додана в чергу."
-        elif global_active_tasks >= MAX_ACTIVE_TASKS_GLOBAL:
-            initial_status = Task.Status.QUEUED
-            queue_message = f"Система зараз завантажена (ліміт {MAX_ACTIVE_TASKS_GLOBAL} активних задач). Ваша задача додана в чергу."
+            queue_message = f"Ви досягли ліміту ({settings.MAX_ACTIVE_TASKS_PER_USER}) одночасно активних задач. Ваша задача додана в чергу."
 
         source_file_obj = serializer.validated_data.pop('source_file', None)
         matrix_text = serializer.validated_data.pop('matrix_text', None)
+        modification = serializer.validated_data.pop('modification', None)
+        rhs_matrix = serializer.validated_data.pop('rhs_matrix', None)
         task = serializer.save(owner=user, status=initial_status)
-        source_file_content = None
+        source_path = None
         if source_file_obj:
             try:
-                source_file_content = source_file_obj.read().decode('utf-8')
+                source_path = os.path.relpath(save_upload(source_file_obj, upload_path(task)), settings.MEDIA_ROOT)
             except Exception as e:
                 task.mark_status(Task.Status.FAILED, f"Помилка читання файлу: {e}")
                 return Response({"error": f"Не вдалося прочитати завантажений файл: {e}"}, status=status.HTTP_400_BAD_REQUEST)
-        parse_and_prepare_task_data.delay(task.id, source_file_content, matrix_text)
+        parse_and_prepare_task_data.delay(task.id, matrix_text=matrix_text, source_path=source_path, modification=modification, rhs_matrix=rhs_matrix)
 
         if initial_status == Task.Status.QUEUED:
             task.refresh_from_db() 
@@ -64,14 +79,128 @@ class TaskListCreateView(generics.ListCreateAPIView):
             return Response(TaskCreateSerializer(task).data, status=status.HTTP_201_CREATED)
 
 
-class TaskDetailView(generics.RetrieveAPIView):
+class TaskBatchCreateView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = TaskBatchCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            if data.get('archive'):
+                systems = list(iter_archive_members(data['archive']))
+            else:
+                systems = [(f.name, f.read()) for f in data['files']]
+        except (ValueError, OSError) as e:
+            return Response({"error": f"Не вдалося прочитати архів: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+        if not systems:
+            return Response({"error": "Пакет не містить жодної системи."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(systems) > settings.BATCH_MAX_TASKS:
+            return Response({"error": f"Пакет містить {len(systems)} систем, ліміт {settings.BATCH_MAX_TASKS}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        batch_name = data.get('name') or f"Пакет з {len(systems)} задач"
+        max_n = min(data.get('max_n') or settings.MAX_MATRIX_N_SIZE, settings.MAX_MATRIX_N_SIZE)
+        with transaction.atomic():
+            batch = TaskBatch.objects.create(owner=request.user, name=batch_name, total_tasks=len(systems))
+            tasks = Task.objects.bulk_create([
+                Task(
+                    owner=request.user,
+                    batch=batch,
+                    name=os.path.basename(system_name)[:255],
+                    max_n=max_n,
+                    save_matrices=data['save_matrices'],
+                    verify_solution=data['verify_solution'],
+                    engine=data['engine'],
+                    solver_options=data['solver_options'],
+                )
+                for system_name, _ in systems
+            ], batch_size=500)
+        try:
+            for task, (_, content) in zip(tasks, systems):
+                input_path = batch_input_path(task)
+                os.makedirs(os.path.dirname(input_path), exist_ok=True)
+                with open(input_path, 'wb') as f:
+                    f.write(content)
+        except OSError as e:
+            batch.tasks.update(status=Task.Status.FAILED, result_message=f"Помилка збереження вхідних даних: {e}")
+            return Response({"error": f"Не вдалося зберегти вхідні дані: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        parse_task_batch.delay(batch.id)
+        return Response(TaskBatchSerializer(batch).data, status=status.HTTP_201_CREATED)
+
+
+class TaskBatchDetailView(generics.RetrieveAPIView):
+    serializer_class = TaskBatchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_field = 'uuid'
+    lookup_url_kwarg = 'batch_uuid'
+    def get_queryset(self):
+        if self.request.user.is_staff: return TaskBatch.objects.all()
+        return TaskBatch.objects.filter(owner=self.request.user)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['include_tasks'] = self.request.query_params.get('tasks') in ('1', 'true')
+        return context
+
+
+TERMINAL_STATUSES = [Task.Status.COMPLETED, Task.Status.FAILED, Task.Status.CANCELLED]
+
+
+class ConditionalTaskMixin:
+    """ETag/Last-Modified для ендпоінтів задачі: незмінене опитування коштує одного звернення до Redis."""
+    cache_kind = "events"
+    cache_body = False
+
+    def with_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def cached_response(self, request, task_id):
+        entry = load_task_cache(task_id, self.cache_kind)
+        if not entry or not (request.user.is_staff or entry['owner_id'] == request.user.id):
+            return None
+        if self.cache_body and entry['status'] in [Task.Status.PENDING, Task.Status.QUEUED]:
+            return None
+        not_modified = get_conditional_response(request, etag=entry['etag'], last_modified=int(entry['last_modified']))
+        if not_modified is not None:
+            return self.with_validators(not_modified, entry['etag'], entry['last_modified'])
+        if self.cache_body and entry['body'] is not None:
+            return self.with_validators(Response(entry['body']), entry['etag'], entry['last_modified'])
+        return None
+
+    def conditional_response(self, request, task, build_data):
+        etag, last_modified = task_etag(task), task.updated_at.timestamp()
+        not_modified = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+        if not_modified is not None:
+            store_task_cache(task, self.cache_kind)
+            return self.with_validators(not_modified, etag, last_modified)
+        data = build_data()
+        store_task_cache(task, self.cache_kind, body=data if self.cache_body and task.status in TERMINAL_STATUSES else None)
+        return self.with_validators(Response(data), etag, last_modified)
+
+
+class TaskDetailView(ConditionalTaskMixin, generics.RetrieveAPIView):
     serializer_class = TaskDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
     lookup_field = 'id'
+    cache_kind = "detail"
+    cache_body = True
     def get_queryset(self):
         if self.request.user.is_staff: return Task.objects.all()
         return Task.objects.filter(owner=self.request.user)
 
+    def retrieve(self, request, *args, **kwargs):
+        cached = self.cached_response(request, kwargs['id'])
+        if cached is not None:
+            return cached
+        task = self.get_object()
+        if task.status in [Task.Status.PENDING, Task.Status.QUEUED]:
+            # Позиція в черзі та ETA змінюються без зміни самої задачі, тож їх не кешуємо.
+            return Response(self.get_serializer(task).data)
+        return self.conditional_response(request, task, lambda: self.get_serializer(task).data)
+
 class TaskCancelView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     def post(self, request, id, *args, **kwargs):
@@ -95,33 +224,190 @@ class TaskCancelView(APIView):
             print(f"Error during task cancellation for {id}: {e}")
             return Response({"error": f"Помилка скасування: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class TaskProgressListView(generics.ListAPIView):
-    serializer_class = TaskProgressSerializer
+class TaskEventListView(ConditionalTaskMixin, generics.ListAPIView):
+    """Прогрес або логи задачі; `?since=<id|ISO-час>` повертає лише новіші записи."""
     permission_classes = [permissions.IsAuthenticated]
-    def get_queryset(self):
+    model = None
+
+    def get_task(self):
         task_id = self.kwargs['id']
-        if self.request.user.is_staff: task = get_object_or_404(Task, id=task_id)
-        else: task = get_object_or_404(Task, id=task_id, owner=self.request.user)
-        return TaskProgress.objects.filter(task=task)
+        if self.request.user.is_staff: return get_object_or_404(Task, id=task_id)
+        return get_object_or_404(Task, id=task_id, owner=self.request.user)
 
-class TaskLogListView(generics.ListAPIView):
-    serializer_class = TaskLogSerializer
-    permission_classes = [permissions.IsAuthenticated]
     def get_queryset(self):
-        task_id = self.kwargs['id']
-        if self.request.user.is_staff: task = get_object_or_404(Task, id=task_id)
-        else: task = get_object_or_404(Task, id=task_id, owner=self.request.user)
-        return TaskLog.objects.filter(task=task)
+        queryset = self.model.objects.filter(task=self.task)
+        since = self.request.query_params.get('since')
+        if not since:
+            return queryset
+        if since.isdigit():
+            return queryset.filter(id__gt=int(since))
+        since_dt = parse_datetime(since.replace(' ', '+'))
+        if since_dt is None:
+            raise ValidationError({"since": "Очікується id запису або час у форматі ISO 8601."})
+        return queryset.filter(timestamp__gt=since_dt)
+
+    def list(self, request, *args, **kwargs):
+        cached = self.cached_response(request, kwargs['id'])
+        if cached is not None:
+            return cached
+        self.task = self.get_task()
+        return self.conditional_response(request, self.task, lambda: self.get_serializer(self.get_queryset(), many=True).data)
+
+class TaskProgressListView(TaskEventListView):
+    serializer_class = TaskProgressSerializer
+    model = TaskProgress
+
+class TaskLogListView(TaskEventListView):
+    serializer_class = TaskLogSerializer
+    model = TaskLog
 
 class TaskDownloadView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    FILES = {'result': 'result_file', 'inverse': 'inverse_file', 'matrix_solve': 'matrix_solution_file'}
+
     def get(self, request, id, *args, **kwargs):
         if request.user.is_staff: task = get_object_or_404(Task, id=id)
         else: task = get_object_or_404(Task, id=id, owner=request.user)
-        if not task.result_file or not task.result_file.storage.exists(task.result_file.name):
+        # ?file=inverse|matrix_solve — похідні величини (.npy), за замовчуванням вектор X.
+        field = self.FILES.get(request.query_params.get('file', 'result'))
+        if field is None:
+            return Response({"detail": f"Невідомий файл. Доступні: {', '.join(self.FILES)}."}, status=status.HTTP_400_BAD_REQUEST)
+        file = getattr(task, field)
+        if not file or not file.storage.exists(file.name):
             return Response({"detail": "Файл результату не знайдено або ще не створений."}, status=status.HTTP_404_NOT_FOUND)
         try:
-            response = FileResponse(task.result_file.open('rb'), as_attachment=True, filename='result_X.txt')
+            filename = 'result_X.txt' if field == 'result_file' else os.path.basename(file.name)
+            response = FileResponse(file.open('rb'), as_attachment=True, filename=filename)
             return response
         except Exception as e:
-            return Response({"detail": f"Помилка при відкритті файлу результату: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            return Response({"detail": f"Помилка при відкритті файлу результату: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class TaskProductsView(APIView):
+    """POST {"products": [...], "rhs_matrix": [[...]]} — det, A⁻¹ або X для AX = B зі збереженого розкладу завершеної задачі."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, id, *args, **kwargs):
+        task = get_object_or_404(Task, id=id, owner=request.user)
+        if task.status != Task.Status.COMPLETED or not task.factors_file or not task.factors_file.storage.exists(task.factors_file.name):
+            return Response({"error": "Задача має бути завершеною і зберігати розклад (keep_factors)."}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = TaskProductsSerializer(data=request.data, context={'task': task})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if data.get('rhs_matrix') is not None:
+            B = np.asarray(data['rhs_matrix'], dtype=np.float64)
+            if B.ndim == 1:
+                B = B[:, None]
+            if B.ndim != 2 or not np.all(np.isfinite(B)):
+                return Response({"error": "B має бути матрицею скінченних чисел."}, status=status.HTTP_400_BAD_REQUEST)
+            np.save(rhs_matrix_path(task), B)
+        task.products = sorted(set(task.products) | set(data['products']))
+        task.save(update_fields=['products'])
+        Task.touch([task.id])
+        compute_task_products.apply_async(args=[task.id, data['products']], queue=get_solve_queue(task.matrix_size))
+        return Response({"message": "Обчислення похідних величин заплановано.", "products": data['products']}, status=status.HTTP_202_ACCEPTED)
+
+
+class SolverSessionListCreateView(APIView):
+    """Резидентні сесії користувача; POST розкладає A вже розпарсеної задачі на воркері і тримає множники в пам'яті."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        sessions = SolverSession.objects.filter(owner=request.user).order_by('-created_at')
+        return Response(SolverSessionSerializer(sessions, many=True).data)
+
+    def post(self, request, *args, **kwargs):
+        serializer = SolverSessionCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        task = get_object_or_404(Task, id=data['task_id'], owner=request.user)
+        if not task.matrix_file or not task.matrix_size:
+            return Response({"error": "Задача ще не має розпарсеної матриці A."}, status=status.HTTP_400_BAD_REQUEST)
+        memory_mb = estimate_memory_mb(task.matrix_size)
+        if memory_mb > settings.SESSION_MEMORY_BUDGET_MB:
+            return Response(
+                {"error": f"Множники матриці {task.matrix_size}x{task.matrix_size} потребують ~{memory_mb:.0f} МБ, ліміт сесії {settings.SESSION_MEMORY_BUDGET_MB:.0f} МБ."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        active = SolverSession.objects.filter(owner=request.user, status__in=SolverSession.ACTIVE_STATUSES).count()
+        if active >= settings.SESSION_MAX_PER_USER:
+            return Response(
+                {"error": f"Ви досягли ліміту ({settings.SESSION_MAX_PER_USER}) одночасно відкритих сесій. Закрийте одну з них."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+        options, node, error = reserve_session_slot(task.matrix_size)
+        if error:
+            return Response({"error": error}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        with transaction.atomic():
+            session = SolverSession.objects.create(
+                owner=request.user,
+                source_task=task,
+                matrix_file=task.matrix_file.name,
+                matrix_size=task.matrix_size,
+                matrix_symmetric=task.matrix_symmetric,
+                idle_timeout_sec=data.get('idle_timeout_sec', settings.SESSION_IDLE_TIMEOUT_SEC),
+                worker_node=node,
+                message="Розклад матриці A на воркері.",
+            )
+            transaction.on_commit(lambda: run_solver_session.apply_async(args=[session.id], **options))
+        return Response(SolverSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+
+class SolverSessionDetailView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_session(self, request, session_uuid):
+        session = get_object_or_404(SolverSession, uuid=session_uuid)
+        if not (session.owner == request.user or request.user.is_staff):
+            raise Http404
+        return session
+
+    def get(self, request, session_uuid, *args, **kwargs):
+        return Response(SolverSessionSerializer(self.get_session(request, session_uuid)).data)
+
+    def delete(self, request, session_uuid, *args, **kwargs):
+        session = self.get_session(request, session_uuid)
+        if session.status not in SolverSession.ACTIVE_STATUSES:
+            return Response({"error": "Сесію вже закрито."}, status=status.HTTP_400_BAD_REQUEST)
+        if session.status == SolverSession.Status.STARTING and not session.celery_task_id:
+            # Воркер ще не взяв сесію — коли візьме, побачить статус і одразу вийде.
+            session.mark_status(SolverSession.Status.CLOSED, "Сесію закрито користувачем.")
+            try_run_next_task_from_queue.delay()
+        else:
+            close_session(session.uuid)
+        return Response({"message": "Запит на закриття сесії виконано."}, status=status.HTTP_202_ACCEPTED)
+
+
+class SolverSessionSolveView(SolverSessionDetailView):
+    """POST {"b": [...]} ставить праву частину в чергу сесії й одразу повертає request_id;
+    результат — через GET .../solve/<request_id>/ або WebSocket."""
+    http_method_names = ['post', 'options']
+
+    def post(self, request, session_uuid, *args, **kwargs):
+        session = self.get_session(request, session_uuid)
+        if session.status not in SolverSession.ACTIVE_STATUSES:
+            return Response({"error": f"Сесія має статус {session.status}. {session.message or ''}".strip()}, status=status.HTTP_409_CONFLICT)
+        try:
+            b = parse_rhs(request.data.get('b'), session.matrix_size)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        request_id = submit_request(session.uuid, b.tolist(), pending_ttl=settings.SESSION_MAX_LIFETIME_SEC)
+        return Response(
+            {"session_id": str(session.uuid), "request_id": request_id, "status": PENDING},
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class SolverSessionReplyView(SolverSessionDetailView):
+    """GET — результат запиту до сесії: 202, поки воркер його не обробив."""
+    http_method_names = ['get', 'options']
+
+    def get(self, request, session_uuid, request_id, *args, **kwargs):
+        session = self.get_session(request, session_uuid)
+        reply = poll_reply(session.uuid, request_id)
+        if reply is None:
+            return Response({"error": "Запит не знайдено або його результат уже видалено."}, status=status.HTTP_404_NOT_FOUND)
+        if reply == PENDING:
+            return Response({"session_id": str(session.uuid), "request_id": request_id, "status": PENDING}, status=status.HTTP_202_ACCEPTED)
+        if reply.get('error'):
+            return Response({"error": reply['error']}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"session_id": str(session.uuid), **reply})
@@ -0,0 +1,422 @@
+import os
+import signal
+import socket
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import psutil
+from celery.concurrency.prefork import TaskPool as PreforkTaskPool
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown, worker_ready, worker_shutdown, task_prerun, task_postrun
+from django.conf import settings
+from django.db import connections
+
+from .events import event_publisher
+from .models import Task
+from .utils import get_redis_connection
+
+WORKER_KEY_PREFIX = "lu:worker:"
+TASK_HEARTBEAT_PREFIX = "lu:task:heartbeat:"
+CGROUP_MEMORY_LIMIT_FILES = ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes")
+# Модуль імпортується головним процесом воркера до fork, тож це PID процесу, що стартував першим.
+_MAIN_PID = os.getpid()
+
+
+def aligned_empty(nbytes, alignment=64):
+    raw = np.empty(nbytes + alignment, dtype=np.uint8)
+    offset = (-raw.ctypes.data) % alignment
+    return raw[offset:offset + nbytes]
+
+
+class Workspace:
+    def __init__(self, pool):
+        self.pool = pool
+        self._leases = []
+
+    def empty(self, shape, dtype=np.float64):
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        raw = self.pool.lease(nbytes)
+        self._leases.append(raw)
+        return raw[:nbytes].view(dtype).reshape(shape)
+
+    def zeros(self, shape, dtype=np.float64):
+        array = self.empty(shape, dtype)
+        array.fill(0)
+        return array
+
+    def release(self):
+        for raw in self._leases:
+            self.pool.give_back(raw)
+        self._leases = []
+
+
+class BufferPool:
+    def __init__(self, max_bytes, alignment=64, min_bucket_bytes=1 << 16):
+        self.max_bytes = max_bytes
+        self.alignment = alignment
+        self.min_bucket_bytes = min_bucket_bytes
+        self._free = OrderedDict()
+        self._free_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def bucket_size(self, nbytes):
+        # Вісім класів розміру на кожну степінь двійки: втрати не більше 12.5% замість до 100% (n=5000 → 201 МБ, а не 256 МБ).
+        if nbytes <= self.min_bucket_bytes:
+            return self.min_bucket_bytes
+        step = 1 << max((nbytes - 1).bit_length() - 3, 0)
+        return -(-nbytes // step) * step
+
+    def lease(self, nbytes):
+        bucket = self.bucket_size(nbytes)
+        with self._lock:
+            buffers = self._free.get(bucket)
+            if buffers:
+                self.hits += 1
+                self._free_bytes -= bucket
+                self._free.move_to_end(bucket)
+                return buffers.pop()
+            self.misses += 1
+        return aligned_empty(bucket, self.alignment)
+
+    def give_back(self, raw):
+        bucket = raw.nbytes
+        if bucket > self.max_bytes:
+            return
+        with self._lock:
+            while self._free_bytes + bucket > self.max_bytes and self._free:
+                oldest_bucket, buffers = next(iter(self._free.items()))
+                buffers.pop()
+                self._free_bytes -= oldest_bucket
+                if not buffers:
+                    del self._free[oldest_bucket]
+            self._free.setdefault(bucket, []).append(raw)
+            self._free.move_to_end(bucket)
+            self._free_bytes += bucket
+
+    @contextmanager
+    def workspace(self):
+        workspace = Workspace(self)
+        try:
+            yield workspace
+        finally:
+            workspace.release()
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self._free_bytes > self.max_bytes and self._free:
+                oldest_bucket, buffers = next(iter(self._free.items()))
+                buffers.pop()
+                self._free_bytes -= oldest_bucket
+                if not buffers:
+                    del self._free[oldest_bucket]
+
+    def stats(self):
+        return {
+            "max_bytes": self.max_bytes,
+            "free_bytes": self._free_bytes,
+            "buckets": len(self._free),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+buffer_pool = BufferPool(settings.WORKER_BUFFER_POOL_MAX_MB * 1024 * 1024)
+
+_runtime = {
+    "ready": False,
+    "busy": False,
+    "tasks_done": 0,
+    "process_started_at": None,
+    "node": None,
+    "queues": None,
+    "concurrency": 1,
+}
+_heartbeat_stop = threading.Event()
+# (Task.id, celery_task_id) задач, які зараз обчислює цей процес; їхні heartbeat оновлює той самий потік, що й стан воркера.
+_active_tasks = set()
+
+
+def worker_key():
+    return f"{WORKER_KEY_PREFIX}{socket.gethostname()}:{os.getpid()}"
+
+
+def publish_worker_state(**fields):
+    try:
+        r = get_redis_connection()
+        key = worker_key()
+        mapping = {k: str(v) for k, v in fields.items() if v is not None}
+        mapping["heartbeat"] = str(time.time())
+        pipe = r.pipeline()
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, settings.WORKER_HEARTBEAT_TTL)
+        pipe.execute()
+    except Exception as e:
+        print(f"Warning: could not publish worker state: {e}")
+
+
+def task_heartbeat_key(task_id, celery_task_id):
+    # celery_task_id у ключі: якщо задачу вже передали іншому виконавцю, heartbeat старого її не «оживить».
+    return f"{TASK_HEARTBEAT_PREFIX}{task_id}:{celery_task_id}"
+
+
+def publish_task_heartbeats(entries):
+    if not entries:
+        return
+    try:
+        r = get_redis_connection()
+        owner = f"{_runtime['node'] or socket.gethostname()}:{os.getpid()}"
+        pipe = r.pipeline()
+        for task_id, celery_task_id in entries:
+            pipe.set(task_heartbeat_key(task_id, celery_task_id), owner, ex=settings.TASK_HEARTBEAT_TTL)
+        pipe.execute()
+    except Exception as e:
+        print(f"Warning: could not publish task heartbeat: {e}")
+
+
+def start_task_heartbeat(task_ids, celery_task_id):
+    entries = [(task_id, celery_task_id) for task_id in task_ids]
+    _active_tasks.update(entries)
+    publish_task_heartbeats(entries)
+
+
+def stop_task_heartbeat(task_ids, celery_task_id):
+    entries = [(task_id, celery_task_id) for task_id in task_ids]
+    if not entries:
+        return
+    _active_tasks.difference_update(entries)
+    try:
+        get_redis_connection().delete(*[task_heartbeat_key(*entry) for entry in entries])
+    except Exception as e:
+        print(f"Warning: could not clear task heartbeat: {e}")
+
+
+@contextmanager
+def soft_time_limit(seconds):
+    """SoftTimeLimitExceeded через seconds секунд для коду, який виконується в поточному процесі через task.apply:
+    ліміти Celery діють лише на повідомлення, отримані з брокера."""
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    def on_timeout(signum, frame):
+        raise SoftTimeLimitExceeded()
+    previous = signal.signal(signal.SIGALRM, on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def warm_up():
+    from . import lu_solver
+    rng = np.random.default_rng(0)
+    a = rng.random((256, 256)) + 256 * np.eye(256)
+    np.dot(a, a)
+    np.linalg.solve(a, a[:, 0])
+    small = a[:32, :32]
+    L, U, P = lu_solver.lu_decomposition(small, lambda percentage: None)
+    lu_solver.lu_solve(L, U, P, small[:, 0])
+
+
+def resource_usage():
+    process = psutil.Process(os.getpid())
+    memory = psutil.virtual_memory()
+    return {
+        "cpu_percent": round(process.cpu_percent(interval=None), 1),
+        "rss_mb": round(process.memory_info().rss / (1024 * 1024), 1),
+        "host": socket.gethostname(),
+        "host_cpu_percent": round(psutil.cpu_percent(interval=None), 1),
+        "host_ram_total_mb": round(memory.total / (1024 * 1024), 1),
+        "host_ram_used_mb": round(memory.used / (1024 * 1024), 1),
+    }
+
+
+def memory_limit_mb():
+    """Ліміт пам'яті контейнера (cgroup), а якщо його немає — уся пам'ять хоста."""
+    total = psutil.virtual_memory().total
+    for path in CGROUP_MEMORY_LIMIT_FILES:
+        try:
+            with open(path) as f:
+                raw = f.read().strip()
+        except OSError:
+            continue
+        if raw.isdigit() and int(raw) < total:
+            return round(int(raw) / (1024 * 1024), 1)
+    return round(total / (1024 * 1024), 1)
+
+
+def buffer_pool_cap_mb(limit_mb=None, processes=None):
+    """Скільки пам'яті один процес воркера може тримати у вільних буферах: частка ліміту контейнера,
+    поділена між процесами, але не більше WORKER_BUFFER_POOL_MAX_MB."""
+    limit_mb = memory_limit_mb() if limit_mb is None else limit_mb
+    processes = max(1, processes or _runtime["concurrency"])
+    return min(settings.WORKER_BUFFER_POOL_MAX_MB, limit_mb * settings.WORKER_BUFFER_POOL_MEMORY_FRACTION / processes)
+
+
+def _heartbeat_loop():
+    next_heartbeat = time.monotonic() + settings.WORKER_HEARTBEAT_INTERVAL
+    while not _heartbeat_stop.wait(min(settings.WORKER_HEARTBEAT_INTERVAL, settings.TASK_TOUCH_COALESCE_SEC)):
+        # Довгий етап обчислень може не давати нових подій: відкладені touch застосовуємо звідси,
+        # тож версія задачі відстає від прогресу не більше ніж на ~2×TASK_TOUCH_COALESCE_SEC.
+        try:
+            Task.flush_pending_touches()
+        except Exception as e:
+            print(f"Warning: could not flush pending task touches: {e}")
+            connections.close_all()
+        if time.monotonic() < next_heartbeat:
+            continue
+        next_heartbeat = time.monotonic() + settings.WORKER_HEARTBEAT_INTERVAL
+        publish_worker_state(
+            ready=int(_runtime["ready"]), busy=int(_runtime["busy"]), tasks_done=_runtime["tasks_done"],
+            buffer_pool_free_bytes=buffer_pool.stats()["free_bytes"], **resource_usage()
+        )
+        publish_task_heartbeats(list(_active_tasks))
+
+
+def _write_ready_file():
+    try:
+        with open(settings.WORKER_READY_FILE, "w") as f:
+            f.write(str(os.getpid()))
+    except OSError as e:
+        print(f"Warning: could not write readiness file: {e}")
+
+
+def _remove_ready_file():
+    try:
+        os.remove(settings.WORKER_READY_FILE)
+    except OSError:
+        pass
+
+
+def mark_worker_ready():
+    if _runtime["ready"]:
+        return
+    try:
+        process_started_at = psutil.Process(_MAIN_PID).create_time()
+    except psutil.Error:
+        process_started_at = psutil.Process(os.getpid()).create_time()
+    _runtime["process_started_at"] = process_started_at
+    limit_mb = memory_limit_mb()
+    buffer_pool.resize(int(buffer_pool_cap_mb(limit_mb) * 1024 * 1024))
+    warm_started = time.time()
+    if settings.WORKER_WARM_START:
+        try:
+            warm_up()
+        except Exception as e:
+            print(f"Warning: worker warm-up failed: {e}")
+    now = time.time()
+    _runtime["ready"] = True
+    _runtime["boot_seconds"] = now - process_started_at
+    publish_worker_state(
+        ready=1,
+        pool=settings.WORKER_POOL,
+        warm=int(settings.WORKER_WARM_START),
+        pid=os.getpid(),
+        boot_seconds=round(_runtime["boot_seconds"], 3),
+        warmup_seconds=round(now - warm_started, 3),
+        ready_at=now,
+        busy=0,
+        tasks_done=0,
+        node=_runtime["node"],
+        queues=_runtime["queues"],
+        memory_limit_mb=limit_mb,
+        buffer_pool_max_bytes=buffer_pool.max_bytes,
+        **resource_usage(),
+    )
+    _write_ready_file()
+    if settings.WORKER_ASYNC_EVENTS:
+        event_publisher.start()
+    threading.Thread(target=_heartbeat_loop, name="lu-worker-heartbeat", daemon=True).start()
+    print(f"Worker process {os.getpid()} ready in {_runtime['boot_seconds']:.2f}s (warm={settings.WORKER_WARM_START}).")
+
+
+@worker_init.connect
+def on_worker_init(sender=None, **kwargs):
+    # Закриваємо з'єднання головного процесу до fork, щоб дочірні не успадкували спільний сокет Postgres
+    # (закривати його в дочірньому не можна — це розірве сесію батьківського).
+    connections.close_all()
+    # Ім'я вузла і черги потрібні планувальнику, щоб надсилати задачі конкретному вузлу (worker_direct).
+    if sender is not None:
+        _runtime["node"] = sender.hostname
+        _runtime["queues"] = ",".join(sorted(q for q in sender.app.amqp.queues.consume_from if not q.endswith(".dq")))
+        _runtime["concurrency"] = getattr(sender, "concurrency", None) or 1
+    # Файл готовності належить усьому воркеру: прибираємо залишок попереднього запуску, доки жоден процес не прогрівся.
+    _remove_ready_file()
+
+
+@worker_process_init.connect
+def on_worker_process_init(**kwargs):
+    mark_worker_ready()
+
+
+@worker_ready.connect
+def on_worker_ready(sender=None, **kwargs):
+    # У prefork готовність повідомляють дочірні процеси після прогріву.
+    if isinstance(getattr(sender, "pool", None), PreforkTaskPool):
+        return
+    mark_worker_ready()
+
+
+@worker_process_shutdown.connect
+def on_worker_process_shutdown(**kwargs):
+    # Завершення одного дочірнього процесу (перезапуск за max-tasks-per-child) не робить неготовим увесь воркер.
+    _heartbeat_stop.set()
+    event_publisher.stop()
+    try:
+        get_redis_connection().delete(worker_key())
+    except Exception:
+        pass
+
+
+@worker_shutdown.connect
+def on_worker_shutdown(**kwargs):
+    on_worker_process_shutdown()
+    _remove_ready_file()
+
+
+@task_prerun.connect
+def on_task_prerun(**kwargs):
+    fields = {"busy": 1}
+    if "first_task_latency_sec" not in _runtime and _runtime["process_started_at"] is not None:
+        # Від старту процесу (разом із прогрівом) до початку першої задачі — саме цю затримку прибирає теплий старт.
+        _runtime["first_task_latency_sec"] = round(time.time() - _runtime["process_started_at"], 3)
+        fields["first_task_latency_sec"] = _runtime["first_task_latency_sec"]
+    _runtime["busy"] = True
+    publish_worker_state(**fields)
+
+
+@task_postrun.connect
+def on_task_postrun(**kwargs):
+    # Відкладені touch прогресу/логів задачі застосовуються до кінця задачі, а не до наступної події.
+    try:
+        Task.touch(())
+    except Exception as e:
+        print(f"Warning: could not flush task versions: {e}")
+    _runtime["tasks_done"] += 1
+    _runtime["busy"] = False
+    fields = {"busy": 0, "tasks_done": _runtime["tasks_done"], "buffer_pool_free_bytes": buffer_pool.stats()["free_bytes"]}
+    if event_publisher.running:
+        events = event_publisher.stats()
+        fields.update(events_merged=events["merged"], events_dropped=events["dropped"])
+    publish_worker_state(**fields)
+
+
+def get_worker_runtime_states():
+    r = get_redis_connection()
+    states = []
+    for key in r.scan_iter(match=f"{WORKER_KEY_PREFIX}*"):
+        data = r.hgetall(key)
+        if not data:
+            continue
+        state = {k.decode(): v.decode() for k, v in data.items()}
+        state["worker"] = key.decode()[len(WORKER_KEY_PREFIX):]
+        states.append(state)
+    return states
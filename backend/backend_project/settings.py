@@ -65,6 +65,10 @@ POSTGRES_USER = os.environ.get('POSTGRES_USER')
 POSTGRES_PASSWORD = os.environ.get('POSTGRES_PASSWORD')
 POSTGRES_HOST = os.environ.get('POSTGRES_HOST')
 POSTGRES_PORT = os.environ.get('POSTGRES_PORT')
+# Постійні з'єднання: 0 — закривати після кожного запиту/задачі, None — без обмеження.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+# За pgbouncer у режимі transaction серверні курсори між транзакціями не живуть.
+DB_USE_PGBOUNCER = os.environ.get('DB_USE_PGBOUNCER', 'False').lower() == 'true'
 
 DATABASES = {
     'default': {
@@ -74,6 +78,9 @@ DATABASES = {
         'PASSWORD': POSTGRES_PASSWORD,
         'HOST': POSTGRES_HOST,
         'PORT': POSTGRES_PORT,
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': DB_USE_PGBOUNCER,
     }
 }
 
@@ -128,6 +135,24 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_TASK_DEFAULT_QUEUE = 'control'
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_WORKER_DIRECT = True
+CELERY_TASK_ROUTES = {
+    'apps.tasks_app.tasks.try_run_next_task_from_queue': {'queue': 'control'},
+    'apps.monitoring.tasks.collect_monitoring_snapshot': {'queue': 'control'},
+    'apps.tasks_app.tasks.reap_stale_tasks': {'queue': 'control'},
+    'apps.tasks_app.tasks.parse_and_prepare_task_data': {'queue': 'parse'},
+    'apps.tasks_app.tasks.parse_task_batch': {'queue': 'parse'},
+    # run_lu_task отримує чергу solve_small/solve_large за matrix_size під час відправки (tasks.get_solve_queue).
+    'apps.tasks_app.tasks.run_lu_task': {'queue': 'solve_large'},
+    'apps.tasks_app.tasks.run_small_task_batch': {'queue': 'solve_small'},
+    # Як і run_lu_task, сесія отримує чергу (або worker_direct вузла) під час відправки.
+    'apps.tasks_app.tasks.run_solver_session': {'queue': 'solve_large'},
+    'apps.tasks_app.tasks.compute_task_products': {'queue': 'solve_large'},
+}
+
+REDIS_URL = os.environ.get('REDIS_URL', f"redis://{os.environ.get('REDIS_HOST', 'redis')}:6379/2")
 
 CHANNEL_LAYERS = {
     "default": {
@@ -139,7 +164,88 @@ CHANNEL_LAYERS = {
 }
 
 MAX_ACTIVE_TASKS_GLOBAL = int(os.environ.get('MAX_ACTIVE_TASKS_GLOBAL', 4))
+MAX_ACTIVE_TASKS_PER_USER = int(os.environ.get('MAX_ACTIVE_TASKS_PER_USER', 2))
+ADMISSION_MEMORY_FRACTION = float(os.environ.get('ADMISSION_MEMORY_FRACTION', 0.8))
+ADMISSION_WORKER_BASE_MB = float(os.environ.get('ADMISSION_WORKER_BASE_MB', 200))
+ADMISSION_DISPATCH_TIMEOUT_SEC = int(os.environ.get('ADMISSION_DISPATCH_TIMEOUT_SEC', 120))
+SOLVE_SMALL_MAX_N = int(os.environ.get('SOLVE_SMALL_MAX_N', 1000))
+MICRO_BATCH_MAX_N = int(os.environ.get('MICRO_BATCH_MAX_N', 100))
+MICRO_BATCH_MAX_SIZE = int(os.environ.get('MICRO_BATCH_MAX_SIZE', 64))
+MICRO_BATCH_WINDOW_SEC = float(os.environ.get('MICRO_BATCH_WINDOW_SEC', 0.2))
+SOLVE_QUEUE_LIMITS = {
+    'solve_small': int(os.environ.get('MAX_ACTIVE_SMALL_TASKS', MAX_ACTIVE_TASKS_GLOBAL)),
+    'solve_large': int(os.environ.get('MAX_ACTIVE_LARGE_TASKS', max(1, MAX_ACTIVE_TASKS_GLOBAL // 2))),
+}
 MAX_MATRIX_N_SIZE = 5000
 CELERY_TASK_TIME_LIMIT = 600
 DATA_UPLOAD_MAX_MEMORY_SIZE = 524288000
-MAX_WORKER_REPLICAS = 10
\ No newline at end of file
+MAX_WORKER_REPLICAS = 10
+LU_PIVOT_TOLERANCE = float(os.environ.get('LU_PIVOT_TOLERANCE', 1e-12))
+LU_SYMMETRY_RTOL = float(os.environ.get('LU_SYMMETRY_RTOL', 1e-12))
+LU_CHOLESKY_ENABLED = os.environ.get('LU_CHOLESKY_ENABLED', 'True').lower() == 'true'
+KRYLOV_PROGRESS_INTERVAL_SEC = float(os.environ.get('KRYLOV_PROGRESS_INTERVAL_SEC', 0.5))
+KRYLOV_SPARSE_DENSITY = float(os.environ.get('KRYLOV_SPARSE_DENSITY', 0.1))
+FUSED_SOLVE_ENABLED = os.environ.get('FUSED_SOLVE_ENABLED', 'True').lower() == 'true'
+# Злите розв'язання тримає процес парсингу: вище n≈200 LU вже довший за повторне читання файлів і надсилання в чергу.
+FUSED_SOLVE_MAX_N = int(os.environ.get('FUSED_SOLVE_MAX_N', 200))
+PARSE_PARALLEL_WORKERS = int(os.environ.get('PARSE_PARALLEL_WORKERS', min(os.cpu_count() or 1, 8)))
+PARSE_PARALLEL_MIN_MB = float(os.environ.get('PARSE_PARALLEL_MIN_MB', 32))
+LOWRANK_MAX_RANK_FRACTION = float(os.environ.get('LOWRANK_MAX_RANK_FRACTION', 0.1))
+LOWRANK_MAX_CAPACITANCE_COND = float(os.environ.get('LOWRANK_MAX_CAPACITANCE_COND', 1e10))
+LOWRANK_RESIDUAL_TOL = float(os.environ.get('LOWRANK_RESIDUAL_TOL', 1e-8))
+SESSION_IDLE_TIMEOUT_SEC = int(os.environ.get('SESSION_IDLE_TIMEOUT_SEC', 300))
+SESSION_MAX_LIFETIME_SEC = int(os.environ.get('SESSION_MAX_LIFETIME_SEC', 3600))
+SESSION_MEMORY_BUDGET_MB = float(os.environ.get('SESSION_MEMORY_BUDGET_MB', 1024))
+SESSION_MAX_PER_USER = int(os.environ.get('SESSION_MAX_PER_USER', 1))
+# Скільки резидентних сесій може одночасно займати процеси однієї черги; щонайменше один слот черги лишається задачам.
+SESSION_MAX_PER_QUEUE = int(os.environ.get('SESSION_MAX_PER_QUEUE', 1))
+SESSION_REPLY_TTL = int(os.environ.get('SESSION_REPLY_TTL', 60))
+LU_RESIDUAL_WARN_THRESHOLD = float(os.environ.get('LU_RESIDUAL_WARN_THRESHOLD', 1e-6))
+LU_CONDITION_WARN_THRESHOLD = float(os.environ.get('LU_CONDITION_WARN_THRESHOLD', 1e12))
+LU_COMPUTE_BUDGET_SEC = int(os.environ.get('LU_COMPUTE_BUDGET_SEC', CELERY_TASK_TIME_LIMIT))
+LU_CHECKPOINT_INTERVAL_SEC = float(os.environ.get('LU_CHECKPOINT_INTERVAL_SEC', 30))
+LU_CHECKPOINT_MIN_N = int(os.environ.get('LU_CHECKPOINT_MIN_N', 300))
+WORKER_WARM_START = os.environ.get('WORKER_WARM_START', 'True').lower() == 'true'
+WORKER_BUFFER_POOL_MAX_MB = int(os.environ.get('WORKER_BUFFER_POOL_MAX_MB', 1024))
+# Частка ліміту пам'яті контейнера, яку всі процеси воркера разом можуть тримати у вільних буферах.
+WORKER_BUFFER_POOL_MEMORY_FRACTION = float(os.environ.get('WORKER_BUFFER_POOL_MEMORY_FRACTION', 0.1))
+WORKER_HEARTBEAT_INTERVAL = int(os.environ.get('WORKER_HEARTBEAT_INTERVAL', 10))
+WORKER_HEARTBEAT_TTL = int(os.environ.get('WORKER_HEARTBEAT_TTL', 30))
+TASK_HEARTBEAT_TTL = int(os.environ.get('TASK_HEARTBEAT_TTL', 3 * WORKER_HEARTBEAT_INTERVAL))
+TASK_REAPER_INTERVAL = float(os.environ.get('TASK_REAPER_INTERVAL', 15))
+TASK_MAX_ATTEMPTS = int(os.environ.get('TASK_MAX_ATTEMPTS', 3))
+WORKER_READY_FILE = os.environ.get('WORKER_READY_FILE', '/tmp/lu_worker_ready')
+WORKER_POOL = os.environ.get('WORKER_POOL', 'default')
+PROMETHEUS_METRICS_TOKEN = os.environ.get('PROMETHEUS_METRICS_TOKEN')
+WS_UPDATE_MIN_INTERVAL = float(os.environ.get('WS_UPDATE_MIN_INTERVAL', 0.25))
+WS_MAX_SUBSCRIPTIONS = int(os.environ.get('WS_MAX_SUBSCRIPTIONS', 500))
+WS_ALL_TASKS_CHECK_INTERVAL = float(os.environ.get('WS_ALL_TASKS_CHECK_INTERVAL', 1.0))
+# Як group_expiry у channels_redis: довше за нього сокет не лишається в загальній групі.
+WS_ALL_TASKS_SUBSCRIBER_TTL = int(os.environ.get('WS_ALL_TASKS_SUBSCRIBER_TTL', 86400))
+WORKER_ASYNC_EVENTS = os.environ.get('WORKER_ASYNC_EVENTS', 'True').lower() == 'true'
+WORKER_EVENT_QUEUE_MAX = int(os.environ.get('WORKER_EVENT_QUEUE_MAX', 1000))
+WORKER_EVENT_BATCH_INTERVAL = float(os.environ.get('WORKER_EVENT_BATCH_INTERVAL', 0.05))
+BATCH_MAX_TASKS = int(os.environ.get('BATCH_MAX_TASKS', 5000))
+DEDUP_ENABLED = os.environ.get('DEDUP_ENABLED', 'True').lower() == 'true'
+DEDUP_TTL_SEC = int(os.environ.get('DEDUP_TTL_SEC', 86400))
+# 'user' — лише задачі того самого власника, 'global' — будь-чиї
+DEDUP_SCOPE = os.environ.get('DEDUP_SCOPE', 'user')
+MAX_RAW_UPLOAD_SIZE = int(os.environ.get('MAX_RAW_UPLOAD_SIZE', DATA_UPLOAD_MAX_MEMORY_SIZE))
+MONITORING_SNAPSHOT_INTERVAL = float(os.environ.get('MONITORING_SNAPSHOT_INTERVAL', 5))
+MONITORING_SNAPSHOT_TTL = int(os.environ.get('MONITORING_SNAPSHOT_TTL', 60))
+MONITORING_SERIES_LENGTH = int(os.environ.get('MONITORING_SERIES_LENGTH', 120))
+CELERY_BEAT_SCHEDULE = {
+    'collect-monitoring-snapshot': {
+        'task': 'apps.monitoring.tasks.collect_monitoring_snapshot',
+        'schedule': MONITORING_SNAPSHOT_INTERVAL,
+        'options': {'expires': MONITORING_SNAPSHOT_INTERVAL},
+    },
+    'reap-stale-tasks': {
+        'task': 'apps.tasks_app.tasks.reap_stale_tasks',
+        'schedule': TASK_REAPER_INTERVAL,
+        'options': {'expires': TASK_REAPER_INTERVAL},
+    },
+}
+TASK_ETAG_CACHE_TTL = int(os.environ.get('TASK_ETAG_CACHE_TTL', 10))
+TASK_DETAIL_CACHE_TTL = int(os.environ.get('TASK_DETAIL_CACHE_TTL', 300))
+TASK_TOUCH_COALESCE_SEC = float(os.environ.get('TASK_TOUCH_COALESCE_SEC', 1.0))
\ No newline at end of file
@@ -4,12 +4,14 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from apps.monitoring.views import PrometheusMetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/users/', include('apps.users.urls', namespace='users')),
     path('api/tasks/', include('apps.tasks_app.urls', namespace='tasks_app')),
     path('api/monitoring/', include('apps.monitoring.urls', namespace='monitoring')),
+    path('metrics', PrometheusMetricsView.as_view(), name='prometheus-metrics'),
 ]
 
 if settings.DEBUG:
@@ -1,26 +1,207 @@
 import os
+import sys
+import csv
+import json
+import math
 import time
-import redis
-import docker
-from docker.errors import DockerException
 
 REDIS_HOST = os.environ.get('REDIS_HOST', 'redis')
 REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
 CELERY_QUEUE_NAME = os.environ.get('CELERY_QUEUE_NAME', 'celery')
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', f'redis://{REDIS_HOST}:{REDIS_PORT}/0')
 SERVICE_TO_SCALE = os.environ.get('SERVICE_TO_SCALE')
+# Кілька пулів воркерів: "сервіс:черга:min:max[:concurrency],..." (напр. lu_celery_solve_large:solve_large:1:4).
+SCALE_TARGETS = os.environ.get('SCALE_TARGETS', '')
+SOLVE_SMALL_MAX_N = int(os.environ.get('SOLVE_SMALL_MAX_N', 1000))
 MIN_REPLICAS = int(os.environ.get('MIN_REPLICAS', 1))
 MAX_REPLICAS = int(os.environ.get('MAX_REPLICAS', 10))
-TASKS_PER_WORKER = int(os.environ.get('TASKS_PER_WORKER', 5))
 SLEEP_TIME = int(os.environ.get('SLEEP_TIME', 15))
+WORKER_STATE_DB = int(os.environ.get('WORKER_STATE_DB', 2))
+WORKER_KEY_PREFIX = os.environ.get('WORKER_KEY_PREFIX', 'lu:worker:')
 
-def get_queue_length(r):
+POSTGRES_DB = os.environ.get('POSTGRES_DB')
+POSTGRES_USER = os.environ.get('POSTGRES_USER')
+POSTGRES_PASSWORD = os.environ.get('POSTGRES_PASSWORD')
+POSTGRES_HOST = os.environ.get('POSTGRES_HOST', 'db')
+POSTGRES_PORT = os.environ.get('POSTGRES_PORT', 5432)
+
+# Ціль: очікувана затримка в черзі не перевищує TARGET_MAX_WAIT_SEC.
+TARGET_MAX_WAIT_SEC = float(os.environ.get('TARGET_MAX_WAIT_SEC', 120))
+# Гістерезис: зменшуємо кількість реплік, лише коли очікування < TARGET * SCALE_DOWN_WAIT_FRACTION.
+SCALE_DOWN_WAIT_FRACTION = float(os.environ.get('SCALE_DOWN_WAIT_FRACTION', 0.25))
+SCALE_UP_COOLDOWN = float(os.environ.get('SCALE_UP_COOLDOWN', 60))
+SCALE_DOWN_COOLDOWN = float(os.environ.get('SCALE_DOWN_COOLDOWN', 300))
+MAX_SCALE_UP_STEP = int(os.environ.get('MAX_SCALE_UP_STEP', 3))
+# Воркер виконує одну задачу за раз, тож більше реплік, ніж глобальних слотів, не дає пропускної здатності.
+MAX_CONCURRENT_TASKS = int(os.environ.get('MAX_CONCURRENT_TASKS', os.environ.get('MAX_ACTIVE_TASKS_GLOBAL', MAX_REPLICAS)))
+THROUGHPUT_WINDOW_MIN = int(os.environ.get('THROUGHPUT_WINDOW_MIN', 60))
+# Вартість задачі в одиницях n^3; швидкість однієї репліки в n^3/с, якщо історії ще немає.
+DEFAULT_COST_RATE = float(os.environ.get('DEFAULT_COST_RATE', 4e8))
+PENDING_TASK_N = int(os.environ.get('PENDING_TASK_N', 1000))
+# Пул парсингу: розмір задачі до парсингу невідомий, тож беклог рахуємо в задачах, а швидкість — у задачах/с на процес.
+PARSE_QUEUE = os.environ.get('PARSE_QUEUE', 'parse')
+DEFAULT_PARSE_RATE = float(os.environ.get('DEFAULT_PARSE_RATE', 0.5))
+SIM_BOOT_SEC = float(os.environ.get('SIM_BOOT_SEC', 30))
+
+
+def task_cost(n):
+    return float(n if n is not None else PENDING_TASK_N) ** 3
+
+
+class ScalingPolicy:
+    """Масштабування за прогнозованим часом очікування з гістерезисом та періодами охолодження."""
+
+    def __init__(self, min_replicas=MIN_REPLICAS, max_replicas=MAX_REPLICAS, target_wait=TARGET_MAX_WAIT_SEC,
+                 down_fraction=SCALE_DOWN_WAIT_FRACTION, up_cooldown=SCALE_UP_COOLDOWN,
+                 down_cooldown=SCALE_DOWN_COOLDOWN, max_up_step=MAX_SCALE_UP_STEP,
+                 max_concurrent=MAX_CONCURRENT_TASKS):
+        self.min_replicas = min_replicas
+        self.max_replicas = min(max_replicas, max(max_concurrent, min_replicas))
+        self.target_wait = target_wait
+        self.down_fraction = down_fraction
+        self.up_cooldown = up_cooldown
+        self.down_cooldown = down_cooldown
+        self.max_up_step = max_up_step
+        self.last_scale_up = -math.inf
+        self.last_scale_down = -math.inf
+
+    def required_replicas(self, backlog_cost, running, rate):
+        for_backlog = math.ceil(backlog_cost / (rate * self.target_wait)) if backlog_cost > 0 else 0
+        return max(self.min_replicas, min(self.max_replicas, running + for_backlog))
+
+    def decide(self, now, current, ready, idle, backlog_cost, running, rate):
+        """Повертає (бажана кількість реплік, прогнозоване очікування в секундах)."""
+        rate = max(rate, 1.0)
+        capacity = max(ready, 1)
+        expected_wait = backlog_cost / (rate * capacity)
+        required = self.required_replicas(backlog_cost, running, rate)
+
+        if current < self.min_replicas:
+            return self.min_replicas, expected_wait
+        if expected_wait > self.target_wait and required > current:
+            if ready < current or now - self.last_scale_up < self.up_cooldown:
+                return current, expected_wait
+            self.last_scale_up = now
+            return min(required, current + self.max_up_step, self.max_replicas), expected_wait
+        if expected_wait < self.target_wait * self.down_fraction and required < current and idle > 0:
+            if now - max(self.last_scale_up, self.last_scale_down) < self.down_cooldown:
+                return current, expected_wait
+            self.last_scale_down = now
+            return max(required, current - 1), expected_wait
+        return current, expected_wait
+
+
+def parse_scale_targets(spec):
+    targets = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        fields = item.split(':')
+        service, queue, min_replicas, max_replicas = fields[:4]
+        concurrency = int(fields[4]) if len(fields) > 4 else 1
+        targets.append({
+            'service': service,
+            'queue': queue,
+            'concurrency': concurrency,
+            'policy': ScalingPolicy(min_replicas=int(min_replicas), max_replicas=int(max_replicas)),
+        })
+    if not targets and SERVICE_TO_SCALE:
+        targets.append({'service': SERVICE_TO_SCALE, 'queue': None, 'concurrency': 1, 'policy': ScalingPolicy()})
+    return targets
+
+
+def in_solve_queue(n, queue):
+    """Відповідає маршрутизації run_lu_task за matrix_size (apps/tasks_app/tasks.py:get_solve_queue)."""
+    if queue is None:
+        return True
+    if queue not in ('solve_small', 'solve_large'):
+        return False
+    small = (n if n is not None else PENDING_TASK_N) <= SOLVE_SMALL_MAX_N
+    return small if queue == 'solve_small' else not small
+
+
+def get_queue_length(r, queue=None):
     try:
-        return r.llen(CELERY_QUEUE_NAME)
+        return r.llen(queue or CELERY_QUEUE_NAME)
     except Exception as e:
         print(f"Помилка підключення до Redis: {e}")
         return None
 
+
+def get_worker_states(r, pool=None):
+    """Повертає (готові контейнери, Celery-вузли вільних контейнерів, усі живі вузли) пулу за heartbeat-ключами воркерів."""
+    try:
+        hosts = {}
+        for key in r.scan_iter(match=f"{WORKER_KEY_PREFIX}*"):
+            state = r.hgetall(key)
+            if pool is not None and state.get(b'pool', b'').decode() != pool:
+                continue
+            host = key.decode()[len(WORKER_KEY_PREFIX):].rsplit(':', 1)[0]
+            ready = state.get(b'ready') == b'1'
+            busy = state.get(b'busy') == b'1'
+            node, host_ready, host_idle = hosts.get(host, (None, True, True))
+            hosts[host] = (node or state.get(b'node', b'').decode() or None, host_ready and ready, host_idle and ready and not busy)
+        ready = sum(1 for _, is_ready, _ in hosts.values() if is_ready)
+        idle_nodes = sorted(node for node, _, is_idle in hosts.values() if is_idle and node)
+        nodes = {node for node, _, _ in hosts.values() if node}
+        return ready, idle_nodes, nodes
+    except Exception as e:
+        print(f"Помилка читання стану воркерів: {e}")
+        return None, None, None
+
+
+def connect_db():
+    import psycopg2
+    conn = psycopg2.connect(
+        dbname=POSTGRES_DB, user=POSTGRES_USER, password=POSTGRES_PASSWORD,
+        host=POSTGRES_HOST, port=POSTGRES_PORT,
+    )
+    conn.autocommit = True
+    return conn
+
+
+def fetch_active_tasks(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT status, matrix_size FROM tasks_app_task WHERE status IN ('queued', 'pending', 'running')"
+        )
+        return cur.fetchall()
+
+
+def fetch_completed_tasks(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT matrix_size, EXTRACT(EPOCH FROM completed_at - started_at) "
+            "FROM tasks_app_task WHERE status = 'completed' AND matrix_size IS NOT NULL "
+            "AND started_at IS NOT NULL AND completed_at > NOW() - %s * INTERVAL '1 minute'",
+            [THROUGHPUT_WINDOW_MIN],
+        )
+        return cur.fetchall()
+
+
+def get_backlog(active_tasks, queue=None):
+    """Сумарна прогнозована вартість (n^3) задач у статусах QUEUED/PENDING та кількість RUNNING.
+    Для черги парсингу — кількість задач у статусі PENDING (вони ще не розібрані)."""
+    if queue == PARSE_QUEUE:
+        return float(sum(1 for status, _ in active_tasks if status == 'pending')), 0
+    rows = [(status, n) for status, n in active_tasks if in_solve_queue(n, queue)]
+    backlog_cost = sum(task_cost(n) for status, n in rows if status != 'running')
+    running = sum(1 for status, _ in rows if status == 'running')
+    return backlog_cost, running
+
+
+def get_replica_throughput(completed_tasks, queue=None):
+    """Спостережувана швидкість одного слота в одиницях n^3/с за останні THROUGHPUT_WINDOW_MIN хвилин."""
+    if queue == PARSE_QUEUE:
+        return DEFAULT_PARSE_RATE
+    rows = [(n, seconds) for n, seconds in completed_tasks if in_solve_queue(n, queue)]
+    total_cost = sum(task_cost(n) for n, _ in rows)
+    total_seconds = sum(float(seconds or 0) for _, seconds in rows)
+    if total_seconds < 1:
+        return DEFAULT_COST_RATE
+    return total_cost / total_seconds
+
+
 def get_current_replicas(client, service_name):
+    import docker
     try:
         service = client.services.get(service_name)
         replicas = service.attrs['Spec']['Mode']['Replicated']['Replicas']
@@ -32,6 +213,19 @@ def get_current_replicas(client, service_name):
         print(f"Помилка отримання реплік: {e}")
         return None
 
+
+def shutdown_node(control_app, node):
+    """Тепла зупинка конкретного воркера: він перестає брати задачі, дороблює поточну і завершується з кодом 0
+    (restart_policy on-failure його не перезапускає), а його heartbeat-ключ зникає."""
+    try:
+        print(f"Зупинка вільного воркера {node}...")
+        control_app.control.shutdown(destination=[node])
+        return True
+    except Exception as e:
+        print(f"Помилка зупинки воркера {node}: {e}")
+        return False
+
+
 def scale_service(client, service_name, new_replicas):
     """Масштабує сервіс до new_replicas."""
     try:
@@ -43,19 +237,88 @@ def scale_service(client, service_name, new_replicas):
         print(f"Помилка масштабування: {e}")
         return False
 
+
+def simulate(trace_path, policy=None, rate=DEFAULT_COST_RATE, boot_sec=SIM_BOOT_SEC, step=SLEEP_TIME,
+             initial_replicas=MIN_REPLICAS):
+    """Офлайн-прогін політики на записаному трасі надходжень (CSV: arrival_sec,n)."""
+    policy = policy or ScalingPolicy()
+    with open(trace_path, newline='') as f:
+        arrivals = sorted((float(row['arrival_sec']), int(row['n'])) for row in csv.DictReader(f))
+    if not arrivals:
+        return {"tasks": 0}
+
+    queue = []
+    replicas = [{"ready_at": 0.0, "busy_until": 0.0, "draining": False} for _ in range(initial_replicas)]
+    waits = []
+    events = []
+    drain_wait = None
+    replica_seconds = 0.0
+    next_arrival = 0
+    now = 0.0
+    while next_arrival < len(arrivals) or queue or any(r["busy_until"] > now for r in replicas):
+        while next_arrival < len(arrivals) and arrivals[next_arrival][0] <= now:
+            queue.append(arrivals[next_arrival])
+            next_arrival += 1
+        for replica in replicas:
+            if queue and not replica["draining"] and replica["ready_at"] <= now and replica["busy_until"] <= now:
+                arrival, n = queue.pop(0)
+                waits.append(now - arrival)
+                replica["busy_until"] = now + task_cost(n) / rate
+
+        # Як у main(): поки зупинений воркер не зник, інших рішень щодо пулу не приймаємо; щойно зник — зменшуємо репліки.
+        draining = [r for r in replicas if r["draining"]]
+        if draining:
+            if all(r["busy_until"] <= now for r in draining):
+                for r in draining:
+                    replicas.remove(r)
+                events.append({"t": now, "replicas": len(replicas), "expected_wait": drain_wait})
+        else:
+            ready = sum(1 for r in replicas if r["ready_at"] <= now)
+            idle = [r for r in replicas if r["ready_at"] <= now and r["busy_until"] <= now]
+            running = sum(1 for r in replicas if r["busy_until"] > now)
+            backlog_cost = sum(task_cost(n) for _, n in queue)
+            desired, expected_wait = policy.decide(now, len(replicas), ready, len(idle), backlog_cost, running, rate)
+            if desired > len(replicas):
+                replicas += [{"ready_at": now + boot_sec, "busy_until": 0.0, "draining": False} for _ in range(desired - len(replicas))]
+                events.append({"t": now, "replicas": desired, "expected_wait": round(expected_wait, 1)})
+            elif desired < len(replicas) and idle:
+                # Зупиняємо саме вільну репліку; вона зникне з наступного кроку.
+                idle[0]["draining"] = True
+                drain_wait = round(expected_wait, 1)
+        replica_seconds += len(replicas) * step
+        now += step
+
+    waits.sort()
+    return {
+        "tasks": len(waits),
+        "mean_wait_sec": round(sum(waits) / len(waits), 2),
+        "p95_wait_sec": round(waits[min(len(waits) - 1, int(0.95 * len(waits)))], 2),
+        "max_wait_sec": round(waits[-1], 2),
+        "replica_seconds": round(replica_seconds, 1),
+        "scale_events": events,
+    }
+
+
 def main():
-    if not SERVICE_TO_SCALE:
-        print("Помилка: Не вказано SERVICE_TO_SCALE. Встановіть змінну середовища.")
+    import redis
+    import docker
+    from docker.errors import DockerException
+
+    targets = parse_scale_targets(SCALE_TARGETS)
+    if not targets:
+        print("Помилка: Не вказано SCALE_TARGETS або SERVICE_TO_SCALE. Встановіть змінну середовища.")
         return
 
     print("--- Запуск сервісу Авто-масштабування ---")
-    print(f"Ціль: {SERVICE_TO_SCALE}")
-    print(f"Ліміти: {MIN_REPLICAS} (min) - {MAX_REPLICAS} (max)")
-    print(f"Тригер: {TASKS_PER_WORKER} задач на 1 воркер")
-    
+    for target in targets:
+        policy = target['policy']
+        print(f"Ціль: {target['service']} (черга: {target['queue'] or 'усі'}), ліміти: {policy.min_replicas} (min) - {policy.max_replicas} (max)")
+    print(f"Тригер: очікування в черзі > {TARGET_MAX_WAIT_SEC:.0f} c (зменшення при < {TARGET_MAX_WAIT_SEC * SCALE_DOWN_WAIT_FRACTION:.0f} c)")
+
     try:
         redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0)
         redis_client.ping()
+        state_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=WORKER_STATE_DB)
         print("Підключено до Redis.")
     except Exception as e:
         print(f"Не вдалося підключитися до Redis: {e}")
@@ -73,28 +336,61 @@ def main():
         print(f"Невідома помилка Docker: {e}")
         return
 
+    from celery import Celery
+    control_app = Celery(broker=CELERY_BROKER_URL)
+
+    db_conn = None
     while True:
-        queue_len = get_queue_length(redis_client)
-        if queue_len is None:
+        try:
+            if db_conn is None or db_conn.closed:
+                db_conn = connect_db()
+            active_tasks = fetch_active_tasks(db_conn)
+            completed_tasks = fetch_completed_tasks(db_conn)
+        except Exception as e:
+            print(f"Помилка читання черги з БД: {e}")
+            db_conn = None
             time.sleep(SLEEP_TIME)
             continue
-            
-        current_replicas = get_current_replicas(docker_client, SERVICE_TO_SCALE)
-        if current_replicas is None:
-            time.sleep(SLEEP_TIME)
-            continue
-        if queue_len == 0:
-            desired_replicas = MIN_REPLICAS
-        else:
-            desired_replicas = (queue_len // TASKS_PER_WORKER) + 1
 
-        new_replicas = max(MIN_REPLICAS, min(desired_replicas, MAX_REPLICAS))
+        for target in targets:
+            service, queue = target['service'], target['queue']
+            backlog_cost, running = get_backlog(active_tasks, queue)
+            rate = get_replica_throughput(completed_tasks, queue) * target['concurrency']
+            current_replicas = get_current_replicas(docker_client, service)
+            ready_workers, idle_nodes, nodes = get_worker_states(state_client, queue)
+            if current_replicas is None or ready_workers is None:
+                continue
+
+            # service.scale() сам обирає, яку репліку прибрати, і може вбити зайняту. Тому спершу зупиняємо
+            # конкретний вільний воркер і лише після його виходу зменшуємо репліки: Swarm при зменшенні
+            # першими прибирає задачі, що вже не виконуються.
+            draining = target.get('draining')
+            if draining:
+                if draining in nodes:
+                    print(f"[{service}] Очікуємо завершення воркера {draining}.")
+                    continue
+                target['draining'] = None
+                scale_service(docker_client, service, current_replicas - 1)
+                continue
+
+            new_replicas, expected_wait = target['policy'].decide(
+                time.monotonic(), current_replicas, ready_workers, len(idle_nodes), backlog_cost, running, rate
+            )
+            print(
+                f"[{service}] Беклог: {backlog_cost:.3e} (n^3), виконується: {running}, брокер: {get_queue_length(redis_client, queue)}. "
+                f"Швидкість репліки: {rate:.3e} n^3/c. Очікування: {expected_wait:.0f} c. "
+                f"Воркери: {current_replicas} (готові: {ready_workers}, вільні: {len(idle_nodes)}). Бажані: {new_replicas}."
+            )
+            if new_replicas > current_replicas:
+                scale_service(docker_client, service, new_replicas)
+            elif new_replicas < current_replicas and idle_nodes and shutdown_node(control_app, idle_nodes[0]):
+                target['draining'] = idle_nodes[0]
 
-        print(f"Черга: {queue_len} задач. Поточні воркери: {current_replicas}. Бажані: {new_replicas}.")
-        if new_replicas != current_replicas:
-            scale_service(docker_client, SERVICE_TO_SCALE, new_replicas)
-        
         time.sleep(SLEEP_TIME)
 
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if len(sys.argv) >= 3 and sys.argv[1] == "--simulate":
+        print(json.dumps(simulate(sys.argv[2]), indent=2, ensure_ascii=False))
+    else:
+        main()
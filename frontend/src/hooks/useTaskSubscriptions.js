@@ -0,0 +1,67 @@
+import { useState, useEffect, useRef } from 'react';
+import ReconnectingWebSocket from 'reconnecting-websocket';
+
+const useTaskSubscriptions = (taskUuids) => {
+  const [taskStates, setTaskStates] = useState({});
+  const [isConnected, setIsConnected] = useState(false);
+  const ws = useRef(null);
+  const subscribed = useRef(new Set());
+  const uuidsKey = [...(taskUuids || [])].sort().join(',');
+
+  useEffect(() => {
+    const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const wsHost = window.location.hostname;
+    ws.current = new ReconnectingWebSocket(`${protocol}://${wsHost}/ws/tasks/updates/`);
+
+    ws.current.onopen = () => {
+      setIsConnected(true);
+      if (subscribed.current.size > 0) {
+        ws.current.send(JSON.stringify({ action: 'subscribe', tasks: [...subscribed.current] }));
+      }
+    };
+
+    ws.current.onclose = () => setIsConnected(false);
+
+    ws.current.onerror = (err) => {
+      console.error('WebSocket error:', err);
+    };
+
+    ws.current.onmessage = (e) => {
+      const data = JSON.parse(e.data);
+      if (data.type === 'snapshot') {
+        setTaskStates((prev) => ({ ...prev, ...data.tasks }));
+      }
+      if (data.type === 'updates') {
+        setTaskStates((prev) => {
+          const next = { ...prev };
+          Object.entries(data.tasks).forEach(([uuid, changes]) => {
+            next[uuid] = { ...next[uuid], ...changes };
+          });
+          return next;
+        });
+      }
+      if (data.type === 'error') {
+        console.warn('WebSocket subscription error:', data.message);
+      }
+    };
+
+    return () => {
+      subscribed.current = new Set();
+      ws.current.close();
+    };
+  }, []);
+
+  useEffect(() => {
+    const wanted = new Set(uuidsKey ? uuidsKey.split(',') : []);
+    const added = [...wanted].filter((uuid) => !subscribed.current.has(uuid));
+    const removed = [...subscribed.current].filter((uuid) => !wanted.has(uuid));
+    subscribed.current = wanted;
+    if (!ws.current || ws.current.readyState !== WebSocket.OPEN) return;
+    if (added.length > 0) ws.current.send(JSON.stringify({ action: 'subscribe', tasks: added }));
+    if (removed.length > 0) ws.current.send(JSON.stringify({ action: 'unsubscribe', tasks: removed }));
+  }, [uuidsKey]);
+
+  return { taskStates, isConnected };
+};
+
+export default useTaskSubscriptions;
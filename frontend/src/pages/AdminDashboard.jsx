@@ -126,14 +126,14 @@ const AdminDashboard = () => {
 
   const fetchMetrics = async () => {
     try {
-      const response = await api.get('/monitoring/metrics/');
+      // Історію CPU/RAM збирає сервер разом зі знімком моніторингу.
+      const response = await api.get('/monitoring/metrics/', { params: { series: 1 } });
       const newMetrics = response.data;
       setMetrics(newMetrics);
 
-      const now = new Date().toLocaleTimeString();
-
-      setCpuHistory(prev => [...prev.slice(-20), { x: now, y: newMetrics.system.cpu_percent }]);
-      setRamHistory(prev => [...prev.slice(-20), { x: now, y: newMetrics.system.ram_percent }]);
+      const series = (newMetrics.series || []).slice(-60);
+      setCpuHistory(series.map(p => ({ x: new Date(p.ts * 1000).toLocaleTimeString(), y: p.cpu_percent })));
+      setRamHistory(series.map(p => ({ x: new Date(p.ts * 1000).toLocaleTimeString(), y: p.ram_percent })));
       setCurrentHostname(newMetrics.system.hostname); 
       setError(''); 
     } catch (err) {
@@ -146,7 +146,7 @@ const AdminDashboard = () => {
 
   useEffect(() => {
     fetchMetrics(); 
-    const interval = setInterval(fetchMetrics, 1000); 
+    const interval = setInterval(fetchMetrics, 5000); 
     return () => clearInterval(interval);
   }, []);
 
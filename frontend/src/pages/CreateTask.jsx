@@ -208,7 +208,7 @@ const CreateTask = () => {
                 <Form.Label>Файл (.txt)</Form.Label>
                 <Form.Control
                     type="file"
-                    accept=".txt, text/plain"
+                    accept=".txt, .gz, .zst, .xz, text/plain"
                     onChange={handleFileChange}
                     disabled={loading} 
                 />
@@ -5,11 +5,15 @@ import { Table, Button, Alert } from 'react-bootstrap';
 import { LinkContainer } from 'react-router-bootstrap';
 import TaskStatusBadge from '../components/TaskStatusBadge';
 import LoadingSpinner from '../components/LoadingSpinner';
+import useTaskSubscriptions from '../hooks/useTaskSubscriptions';
 
 const Dashboard = () => {
   const [tasks, setTasks] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
+  const { taskStates } = useTaskSubscriptions(
+    tasks.filter((task) => !['completed', 'failed', 'cancelled'].includes(task.status)).map((task) => task.uuid)
+  );
 
   useEffect(() => {
     const fetchTasks = async () => {
@@ -60,7 +64,7 @@ const Dashboard = () => {
                 <td>{task.id}</td>
                 <td>{task.name}</td>
                 <td>
-                  <TaskStatusBadge status={task.status} />
+                  <TaskStatusBadge status={taskStates[task.uuid]?.status || task.status} />
                 </td>
                 <td>{new Date(task.created_at).toLocaleString()}</td>
                 <td>{task.completed_at ? new Date(task.completed_at).toLocaleString() : '---'}</td>